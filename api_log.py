@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+HuifuSDKAPI 日志
+
+交互式脚本（main.py、refund_only.py、query_order.py）默认输出便于阅读的中文提示；
+服务端或批量场景开启安静模式（HUIFU_QUIET=1 或 HuifuSDKAPI(quiet=True)）后：
+- 不再打印请求参数、格式化响应、二维码，异常不再打印调用栈
+- 每个请求记录一条 "huifu.request" 日志，由后台线程格式化为一行紧凑JSON写入文件或标准错误输出
+- 日志级别低于配置级别时不构造日志内容；完整响应只在 DEBUG 级别记录
+
+日志行示例：
+    {"ts":1762409696.123,"level":"INFO","logger":"huifu.request","msg":"jspay","req_seq_id":"...","resp_code":"00000100","trans_stat":"P","elapsed_ms":182.4}
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+
+
+logger = logging.getLogger("huifu")
+logger.addHandler(logging.NullHandler())
+request_logger = logging.getLogger("huifu.request")
+
+# 记录到日志行中的请求 / 响应字段
+_REQUEST_FIELDS = ("req_seq_id", "req_date", "huifu_id", "hf_seq_id", "org_req_seq_id", "org_hf_seq_id",
+                   "party_order_id", "trans_amt", "ord_amt")
+_RESPONSE_FIELDS = ("resp_code", "resp_desc", "trans_stat", "hf_seq_id")
+
+
+class JsonLineFormatter(logging.Formatter):
+    """每条日志格式化为一行紧凑JSON（record.fields 中的字段合并到顶层）"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """原样放入队列：格式化、序列化都留给后台线程（标准 QueueHandler 会在调用方线程先格式化）"""
+
+    def prepare(self, record):
+        return record
+
+
+def log_request(endpoint, fields, response=None, elapsed=None, error=None):
+    """
+    记录一次请求（日志级别未开启时直接返回，不构造任何内容）
+
+    :param endpoint: 接口名称
+    :param fields: 请求字段（order_store.fields_of）
+    :param response: 响应字典
+    :param elapsed: 耗时（秒）
+    :param error: 发送异常
+    """
+    level = logging.ERROR if error is not None else logging.INFO
+    if not request_logger.isEnabledFor(level):
+        return
+    entry = {k: fields[k] for k in _REQUEST_FIELDS if fields.get(k)}
+    if isinstance(response, dict):
+        entry.update((k, response[k]) for k in _RESPONSE_FIELDS if response.get(k))
+        if request_logger.isEnabledFor(logging.DEBUG):
+            entry["response"] = response
+    if elapsed is not None:
+        entry["elapsed_ms"] = round(elapsed * 1000, 1)
+    if error is not None:
+        entry["error"] = repr(error)
+    request_logger.log(level, endpoint, extra={"fields": entry})
+
+
+_listener = None
+
+
+def setup_logging(level="INFO", path=None, stream=None):
+    """
+    开启安静模式的日志输出：huifu 日志经队列交给后台线程写出（重复调用只调整级别）
+
+    :param level: 日志级别（DEBUG / INFO / WARNING / ERROR）
+    :param path: 日志文件路径（追加写入），默认写到标准错误输出
+    :param stream: 不写文件时的输出流
+    :return: logging.handlers.QueueListener
+    """
+    global _listener
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    if _listener is not None:
+        return _listener
+
+    if path:
+        handler = logging.FileHandler(path, encoding='utf-8')
+    else:
+        handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonLineFormatter())
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+    _listener.start()
+    logger.addHandler(_DeferredQueueHandler(log_queue))
+    logger.propagate = False
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """写完队列中剩余的日志并停止后台线程"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in list(logger.handlers):
+        if isinstance(handler, _DeferredQueueHandler):
+            logger.removeHandler(handler)
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+批量验签
+
+cryptography 的RSA验签在计算期间会释放GIL，这里把大量 (原文, 签名) 按块分发到
+线程池并行验签，适合对账、重放一天的异步通知等场景：
+- verify_all：按输入顺序返回结果列表
+- iter_verify：流式返回 (序号, 是否有效)，ordered=False 时按完成顺序返回
+- 输入可以是任意可迭代对象（如逐行读取的文件），在途的块数有上限，不会一次性读入内存
+
+使用方法：
+    with BatchVerifier() as verifier:
+        results = verifier.verify_all([(resp_data, sign), ...])
+
+    # 校验保存的通知记录（每行一个JSON：{"resp_data": "...", "sign": "..."}）
+    python batch_verify.py notifies.jsonl --workers 8
+"""
+
+import argparse
+import collections
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from key_registry import default_registry, load_public_key, rsa_verify
+
+
+class BatchVerifier:
+    """线程池批量验签器（公钥来自 key_registry，只解析一次）"""
+
+    def __init__(self, public_key_pem=None, max_workers=None, chunk_size=64):
+        """
+        :param public_key_pem: 汇付公钥（PEM），默认使用 keys/public_key.txt（文件更新后自动重新加载）
+        :param max_workers: 线程数，默认CPU核数
+        :param chunk_size: 每个任务验签的条数（减少线程池调度开销）
+        """
+        if public_key_pem is None:
+            registry = default_registry()
+            self._get_public_key = lambda: registry.public_key
+        else:
+            public_key = load_public_key(public_key_pem)
+            self._get_public_key = lambda: public_key
+        self._get_public_key()
+
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="verify")
+
+    def _verify_chunk(self, start, chunk):
+        """验签一个块，返回 [(序号, 是否有效)]"""
+        public_key = self._get_public_key()
+        return [(start + i, rsa_verify(public_key, payload, sign)) for i, (payload, sign) in enumerate(chunk)]
+
+    def _chunks(self, pairs):
+        iterator = iter(pairs)
+        start = 0
+        while True:
+            chunk = list(itertools.islice(iterator, self.chunk_size))
+            if not chunk:
+                return
+            yield start, chunk
+            start += len(chunk)
+
+    def iter_verify(self, pairs, ordered=True):
+        """
+        流式批量验签
+
+        :param pairs: 可迭代的 (原文, base64签名)
+        :param ordered: True 按输入顺序返回；False 按完成顺序返回（首个结果更快）
+        :return: 生成器，逐条产出 (序号, 是否有效)
+        """
+        window = self.max_workers * 4
+        if ordered:
+            pending = collections.deque()
+            for start, chunk in self._chunks(pairs):
+                pending.append(self._executor.submit(self._verify_chunk, start, chunk))
+                if len(pending) >= window:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+            return
+
+        pending = set()
+        for start, chunk in self._chunks(pairs):
+            pending.add(self._executor.submit(self._verify_chunk, start, chunk))
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+    def verify_all(self, pairs):
+        """
+        批量验签
+
+        :param pairs: 可迭代的 (原文, base64签名)
+        :return: 与输入顺序一致的 [是否有效]
+        """
+        return [ok for _, ok in self.iter_verify(pairs)]
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _read_notifies(path):
+    """逐行读取通知记录：{"resp_data": "...", "sign": "..."}"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                yield record.get("resp_data", ""), record.get("sign", "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量校验保存的汇付通知签名")
+    parser.add_argument("file", help="通知记录文件（JSONL，每行包含 resp_data 和 sign）")
+    parser.add_argument("--public-key-file", help="验签公钥文件（默认 keys/public_key.txt）")
+    parser.add_argument("--workers", type=int, default=None, help="线程数（默认CPU核数）")
+    args = parser.parse_args()
+
+    public_key_pem = None
+    if args.public_key_file:
+        with open(args.public_key_file, 'r', encoding='utf-8') as f:
+            public_key_pem = f.read()
+
+    start = time.perf_counter()
+    total = 0
+    invalid = []
+    with BatchVerifier(public_key_pem, args.workers) as verifier:
+        for index, ok in verifier.iter_verify(_read_notifies(args.file)):
+            total += 1
+            if not ok:
+                invalid.append(index + 1)
+    elapsed = time.perf_counter() - start
+
+    print(f"共 {total} 条，验签通过 {total - len(invalid)} 条，耗时 {elapsed:.2f} 秒")
+    if invalid:
+        print(f"❌ 验签失败的行号: {', '.join(map(str, invalid[:50]))}{' ...' if len(invalid) > 50 else ''}")
+        sys.exit(1)
+    print("✅ 全部验签通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+批量订单查询 / 对账
+
+从文件或标准输入逐行读取订单标识，并发查询订单状态：
+- 每笔结果以 JSONL 流式输出（默认输出到标准输出）
+- 结束时按交易状态（S/P/F/C）汇总
+- 同时在途的订单数有上限，输入再长内存占用也不变
+
+输入格式（每行一个）：
+- 纯文本标识：默认自动识别（含 _YYYYMMDD_ 的视为 req_seq_id，其余视为 hf_seq_id），
+  也可以用 --id-type 指定
+- JSON：{"hf_seq_id": "...", "req_seq_id": "...", "party_order_id": "...", "req_date": "..."}
+
+使用方法：
+    python query_order.py --bulk hf_ids.txt --concurrency 16 > results.jsonl
+    cat ids.txt | python bulk_query.py --bulk - --id-type party_order_id --req-date 20251106
+"""
+
+import argparse
+import collections
+import contextlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_limit import TokenBucket
+
+
+ID_TYPES = ("hf_seq_id", "req_seq_id", "party_order_id")
+_REQ_SEQ_ID_PATTERN = re.compile(r"_\d{8}_")
+
+
+def parse_line(line, id_type="auto", req_date=None):
+    """
+    解析一行输入
+
+    :return: 查询参数字典（hf_seq_id / req_seq_id / party_order_id / req_date），空行返回 None
+    :raises ValueError: JSON 行格式错误
+    """
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith("{"):
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError("不是 JSON 对象")
+        query = {k: str(record[k]) for k in ID_TYPES + ("req_date",) if record.get(k)}
+    else:
+        if id_type == "auto":
+            id_type = "req_seq_id" if _REQ_SEQ_ID_PATTERN.search(line) else "hf_seq_id"
+        query = {id_type: line}
+    if req_date and "req_date" not in query:
+        query["req_date"] = req_date
+    return query
+
+
+def read_queries(lines, id_type="auto", req_date=None):
+    """逐行解析输入，返回生成器；格式错误的行产出 {"line": 行号, "invalid": 原因}，不中断整批查询"""
+    for lineno, line in enumerate(lines, 1):
+        try:
+            query = parse_line(line, id_type, req_date)
+        except ValueError as e:
+            yield {"line": lineno, "invalid": f"第 {lineno} 行格式错误: {e}"}
+            continue
+        if query is not None:
+            yield query
+
+
+class BulkQuery:
+    """批量订单查询执行器"""
+
+    def __init__(self, api, concurrency=16, rate=None, output=None, quiet=True):
+        """
+        :param api: HuifuSDKAPI 实例
+        :param concurrency: 同时在途的查询数
+        :param rate: 每秒最多发起的查询数（None 不限速）
+        :param output: 结果输出（文本文件对象，每笔一行JSON）
+        :param quiet: 是否屏蔽单笔查询的详细输出（api 为安静模式时本身不输出）
+        """
+        self.api = api
+        self.concurrency = concurrency
+        self.bucket = TokenBucket(rate, burst=1) if rate else None
+        self.output = output
+        self.quiet = quiet
+        self.summary = collections.Counter()
+        self._lock = threading.Lock()
+
+    def query_one(self, query):
+        """
+        查询一笔订单
+
+        :param query: 查询参数字典
+        :return: 结果字典
+        """
+        record = dict(query)
+        if "invalid" in record:
+            record["trans_stat"] = "invalid"
+            record["resp_desc"] = record.pop("invalid")
+            return record
+        built = self.api._build_query_request(
+            query.get("req_seq_id"), query.get("req_date"), query.get("hf_seq_id"), query.get("party_order_id"))
+        if built is None:
+            record["trans_stat"] = "invalid"
+            return record
+        if self.bucket is not None:
+            self.bucket.acquire()
+        try:
+            response = self.api._post(*built)
+        except Exception as e:
+            record["trans_stat"] = "error"
+            record["resp_desc"] = str(e)
+            return record
+
+        record["resp_code"] = response.get("resp_code", "")
+        record["resp_desc"] = response.get("resp_desc", "")
+        if record["resp_code"].startswith("0000"):
+            record["trans_stat"] = response.get("trans_stat", "") or "unknown"
+        else:
+            record["trans_stat"] = "failed_query"
+        for field in ("hf_seq_id", "trans_amt", "party_order_id"):
+            if response.get(field) and field not in record:
+                record[field] = response[field]
+        return record
+
+    def _emit(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.summary[record["trans_stat"]] += 1
+            if self.output is not None:
+                self.output.write(line)
+                self.output.flush()
+
+    def run(self, queries):
+        """
+        执行批量查询
+
+        :param queries: 可迭代的查询参数字典（见 read_queries）
+        :return: 各交易状态的数量（collections.Counter）
+        """
+        in_flight = threading.BoundedSemaphore(self.concurrency * 2)
+
+        def task(query):
+            try:
+                self._emit(self.query_one(query))
+            finally:
+                in_flight.release()
+
+        # 安静模式的 api 本身不输出；交互模式的 api 临时屏蔽标准输出
+        quiet = open(os.devnull, 'w') if self.quiet and self.api.console else None
+        try:
+            with contextlib.redirect_stdout(quiet) if quiet else contextlib.nullcontext(), \
+                    ThreadPoolExecutor(self.concurrency, thread_name_prefix="query") as executor:
+                for query in queries:
+                    in_flight.acquire()
+                    executor.submit(task, query)
+        finally:
+            if quiet:
+                quiet.close()
+        return self.summary
+
+
+STAT_NAMES = {
+    "S": "支付成功",
+    "P": "处理中",
+    "F": "支付失败",
+    "C": "已关闭",
+    "failed_query": "查询失败",
+    "error": "异常",
+    "invalid": "参数错误",
+    "unknown": "状态未知",
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="汇付批量订单查询（结果以JSONL输出）")
+    parser.add_argument("--bulk", required=True, metavar="FILE", help="订单标识文件，- 表示标准输入")
+    parser.add_argument("--id-type", default="auto", choices=("auto",) + ID_TYPES, help="纯文本行的标识类型")
+    parser.add_argument("--req-date", default=None, help="未提供日期的行使用的请求日期（YYYYMMDD）")
+    parser.add_argument("--concurrency", type=int, default=16, help="并发数（默认16）")
+    parser.add_argument("--rate", type=float, default=None, help="每秒最多发起的查询数（默认不限）")
+    parser.add_argument("--output", default=None, help="结果文件（默认标准输出）")
+    args = parser.parse_args(argv)
+
+    from huifu_sdk_api import HuifuSDKAPI
+    api = HuifuSDKAPI(quiet=True)
+
+    source = sys.stdin if args.bulk == "-" else open(args.bulk, 'r', encoding='utf-8')
+    output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    start = time.perf_counter()
+    try:
+        summary = BulkQuery(api, args.concurrency, args.rate, output).run(
+            read_queries(source, args.id_type, args.req_date))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start
+
+    total = sum(summary.values())
+    print(f"\n共查询 {total} 笔，耗时 {elapsed:.2f} 秒", file=sys.stderr)
+    for stat, count in summary.most_common():
+        print(f"  {stat} ({STAT_NAMES.get(stat, stat)}): {count}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n程序已中断", file=sys.stderr)
+        sys.exit(0)
@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+"""
+批量退款
+
+从 CSV / JSONL 文件逐行读取待退款订单，并发发起退款：
+- 并发数、每秒请求数可配置（令牌桶限速）
+- 断点文件：发送前先记录本笔退款的流水号，收到结果后记录完成。
+  中断后重新运行会跳过已完成的订单；已发送但没有结果的订单沿用原退款流水号重发，
+  由汇付按流水号防重，不会重复退款
+- 每笔结果以 JSONL 追加写入结果文件
+
+输入文件字段（CSV 表头或 JSONL 键）：
+    org_req_seq_id, org_req_date, org_hf_seq_id, party_order_id, refund_amt[, refund_key]
+至少需要一个原交易标识；org_req_date 为空时从 org_req_seq_id 中提取；
+同一订单需要多次部分退款时，用 refund_key 区分。没有 refund_key 时，同一订单、同一金额的
+重复行可能是两笔部分退款，也可能是误重复，不会退款，记为 duplicate 并在结果文件中提示。
+
+使用方法：
+    python refund_only.py --bulk orders.csv --concurrency 8 --rate 20
+    python bulk_refund.py --bulk orders.jsonl --checkpoint orders.ckpt --output results.jsonl --yes
+"""
+
+import argparse
+import contextlib
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rate_limit import TokenBucket
+from seq_id import req_date_of
+
+
+def read_orders(path):
+    """
+    逐行读取待退款订单（.csv 按表头解析，其他按 JSONL 解析）
+
+    :param path: 文件路径
+    :return: 生成器，逐个产出订单字典；格式错误的 JSONL 行产出 {"line": 行号, "invalid": 原因}，不中断整批退款
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if path.lower().endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = _jsonl_rows(f)
+        for row in rows:
+            if "invalid" in row:
+                yield row
+                continue
+            order = {k: (str(v).strip() if v is not None else "") for k, v in row.items() if k}
+            order.setdefault("refund_amt", "")
+            order["refund_amt"] = order["refund_amt"] or "1.00"
+            if not order.get("org_req_date") and order.get("org_req_seq_id"):
+                order["org_req_date"] = req_date_of(order["org_req_seq_id"]) or ""
+            yield order
+
+
+def _jsonl_rows(lines):
+    for lineno, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError("不是 JSON 对象")
+        except ValueError as e:
+            yield {"line": lineno, "invalid": f"第 {lineno} 行格式错误: {e}"}
+            continue
+        yield row
+
+
+def order_key(order):
+    """订单在断点文件中的唯一键"""
+    if order.get("refund_key"):
+        return order["refund_key"]
+    return "|".join(order.get(field, "") for field in ("org_hf_seq_id", "org_req_seq_id", "party_order_id", "refund_amt"))
+
+
+class Checkpoint:
+    """
+    断点文件（JSONL，只追加）：
+        {"key": ..., "state": "sent", "req_seq_id": ..., "req_date": ...}   发送前写入
+        {"key": ..., "state": "done", "status": "success" | "failed" | "invalid"}   收到结果后写入
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sent = {}   # key -> (req_seq_id, req_date)
+        self.done = {}   # key -> status
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # 中断时写了一半的行
+                    if record.get("state") == "sent":
+                        self.sent[record["key"]] = (record["req_seq_id"], record["req_date"])
+                    elif record.get("state") == "done":
+                        self.done[record["key"]] = record.get("status", "")
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def _append(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def mark_sent(self, key, req_seq_id, req_date):
+        self._append({"key": key, "state": "sent", "req_seq_id": req_seq_id, "req_date": req_date})
+
+    def mark_done(self, key, status):
+        self._append({"key": key, "state": "done", "status": status})
+
+    def close(self):
+        self._file.close()
+
+
+class BulkRefunder:
+    """批量退款执行器"""
+
+    def __init__(self, api, concurrency=8, rate=None, checkpoint_path=None, output=None, quiet=True):
+        """
+        :param api: HuifuSDKAPI 实例
+        :param concurrency: 同时在途的退款请求数
+        :param rate: 每秒最多发起的退款数（None 不限速）
+        :param checkpoint_path: 断点文件路径（None 不记录断点，无法续跑）
+        :param output: 结果输出（文本文件对象，每笔一行JSON）
+        :param quiet: 是否屏蔽单笔退款的详细输出（api 为安静模式时本身不输出）
+        """
+        self.api = api
+        self.concurrency = concurrency
+        # 桶容量为1：严格按 1/rate 的间隔放行，任何时间窗口内都不超过上限
+        self.bucket = TokenBucket(rate, burst=1) if rate else None
+        self.checkpoint = Checkpoint(checkpoint_path) if checkpoint_path else None
+        self.output = output
+        self.quiet = quiet
+        self._output_lock = threading.Lock()
+        self.stats = {"total": 0, "skipped": 0, "duplicate": 0, "resent": 0,
+                      "success": 0, "failed": 0, "invalid": 0, "error": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _emit(self, record):
+        if self.output is None:
+            return
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._output_lock:
+            self.output.write(line)
+            self.output.flush()
+
+    def refund_one(self, order):
+        """
+        退款一笔订单（断点记录 → 限速 → 发送 → 记录结果）
+
+        :return: 结果字典
+        """
+        api = self.api
+        key = order_key(order)
+        resent = self.checkpoint is not None and key in self.checkpoint.sent
+        if resent:
+            # 上次已发送但没有结果：沿用原流水号重发，汇付按流水号防重
+            req_seq_id, req_date = self.checkpoint.sent[key]
+            self._count("resent")
+        else:
+            req_seq_id = api.generate_req_seq_id("REFUND")
+            req_date = req_date_of(req_seq_id)
+
+        record = {"key": key, "req_seq_id": req_seq_id, "req_date": req_date, "refund_amt": order["refund_amt"]}
+        built = api._build_refund_request(
+            order.get("org_req_seq_id") or None, order.get("org_req_date") or None,
+            order.get("org_hf_seq_id") or None, order.get("party_order_id") or None,
+            order["refund_amt"], req_seq_id, req_date,
+        )
+        if built is None:
+            record["status"] = "invalid"
+            record["resp_desc"] = "缺少原交易标识或原交易日期"
+            self._finish(key, record)
+            return record
+
+        if self.checkpoint is not None and not resent:
+            self.checkpoint.mark_sent(key, req_seq_id, req_date)
+        if self.bucket is not None:
+            self.bucket.acquire()
+
+        start = time.perf_counter()
+        try:
+            # 结果未知或网关未受理时先沿用同一流水号重发（api.retry，见 retry.py）
+            response = api._send_with_retry(*built)
+        except Exception as e:
+            # 重试后结果仍未知：不记录完成，续跑时沿用流水号重发
+            record["status"] = "error"
+            record["resp_desc"] = str(e)
+            record["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            self._count("error")
+            self._emit(record)
+            return record
+
+        resp_code = response.get("resp_code", "")
+        record["status"] = "success" if resp_code.startswith("0000") else "failed"
+        record["resp_code"] = resp_code
+        record["resp_desc"] = response.get("resp_desc", "")
+        record["hf_seq_id"] = response.get("hf_seq_id", "")
+        record["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        self._finish(key, record)
+        return record
+
+    def _fail(self, order, error):
+        """退款过程中的意外异常（构造请求、写断点文件等）：记为结果未知，续跑时再处理"""
+        record = {"key": order_key(order), "status": "error", "refund_amt": order.get("refund_amt", ""),
+                  "resp_desc": f"{type(error).__name__}: {error}"}
+        self._count("error")
+        self._emit(record)
+        return record
+
+    def _invalid_line(self, order):
+        """格式错误的输入行：不退款、不写断点（修正后重新运行会正常处理）"""
+        record = {"key": f"line {order['line']}", "status": "invalid", "resp_desc": order["invalid"]}
+        self._count("invalid")
+        self._emit(record)
+        return record
+
+    def _duplicate(self, order):
+        """没有 refund_key 的重复行：无法区分部分退款与误重复，不退款"""
+        record = {"key": order_key(order), "status": "duplicate", "refund_amt": order.get("refund_amt", ""),
+                  "resp_desc": "同一订单、同一金额的重复行，未退款；多次部分退款请用 refund_key 区分"}
+        self._count("duplicate")
+        self._emit(record)
+        return record
+
+    def _finish(self, key, record):
+        if self.checkpoint is not None:
+            self.checkpoint.mark_done(key, record["status"])
+        self._count(record["status"])
+        self._emit(record)
+
+    def run(self, orders, progress=None):
+        """
+        执行批量退款
+
+        :param orders: 可迭代的订单字典（见 read_orders）
+        :param progress: 每完成一笔时的回调 progress(record, stats)
+        :return: 统计字典
+        """
+        in_flight = threading.BoundedSemaphore(self.concurrency * 2)
+        seen = set()
+
+        def report(record):
+            if progress is None:
+                return
+            try:
+                progress(record, self.stats)
+            except Exception as e:
+                print(f"⚠️ 进度回调异常: {e}", file=sys.stderr)
+
+        def task(order):
+            # 提交到线程池的任务没有人读取结果，异常必须在这里记录，否则这笔订单既不算完成也不算异常
+            try:
+                try:
+                    record = self.refund_one(order)
+                except Exception as e:
+                    record = self._fail(order, e)
+                report(record)
+            finally:
+                in_flight.release()
+
+        # 安静模式的 api 本身不输出；交互模式的 api 临时屏蔽标准输出
+        quiet = open(os.devnull, 'w') if self.quiet and self.api.console else None
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(quiet) if quiet else contextlib.nullcontext(), \
+                    ThreadPoolExecutor(self.concurrency, thread_name_prefix="refund") as executor:
+                for order in orders:
+                    self.stats["total"] += 1
+                    if "invalid" in order:
+                        report(self._invalid_line(order))
+                        continue
+                    key = order_key(order)
+                    if self.checkpoint is not None and key in self.checkpoint.done:
+                        self._count("skipped")
+                        continue
+                    if key in seen:
+                        if order.get("refund_key"):
+                            self._count("skipped")
+                        else:
+                            report(self._duplicate(order))
+                        continue
+                    seen.add(key)
+                    in_flight.acquire()
+                    executor.submit(task, order)
+        finally:
+            if quiet:
+                quiet.close()
+            if self.checkpoint is not None:
+                self.checkpoint.close()
+        self.stats["elapsed"] = round(time.perf_counter() - start, 3)
+        return self.stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="汇付批量退款（CSV/JSONL，支持断点续跑）")
+    parser.add_argument("--bulk", required=True, metavar="FILE", help="待退款订单文件（.csv 或 .jsonl）")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发数（默认8）")
+    parser.add_argument("--rate", type=float, default=None, help="每秒最多发起的退款数（默认不限）")
+    parser.add_argument("--checkpoint", default=None, help="断点文件（默认 FILE.checkpoint.jsonl）")
+    parser.add_argument("--output", default=None, help="结果文件（默认 FILE.results.jsonl，追加写入）")
+    parser.add_argument("--yes", action="store_true", help="跳过确认")
+    args = parser.parse_args(argv)
+
+    checkpoint_path = args.checkpoint or args.bulk + ".checkpoint.jsonl"
+    output_path = args.output or args.bulk + ".results.jsonl"
+
+    print(f"\n准备批量退款:")
+    print(f"  订单文件: {args.bulk}")
+    print(f"  并发数: {args.concurrency}")
+    print(f"  限速: {args.rate or '不限'} 笔/秒")
+    print(f"  断点文件: {checkpoint_path}{'（已存在，将续跑）' if os.path.exists(checkpoint_path) else ''}")
+    print(f"  结果文件: {output_path}")
+    if not args.yes:
+        confirm = input("\n确认执行批量退款？(y/n): ").strip().lower()
+        if confirm != 'y':
+            print("\n已取消退款操作")
+            return
+
+    from huifu_sdk_api import HuifuSDKAPI
+    api = HuifuSDKAPI(quiet=True)
+
+    def progress(record, stats):
+        done = stats["success"] + stats["failed"] + stats["invalid"] + stats["error"] + stats["duplicate"]
+        mark = {"success": "✅", "duplicate": "⚠️"}.get(record["status"], "❌")
+        print(f"[{done}] {mark} {record['key']} {record['status']} {record.get('resp_desc', '')}", file=sys.stderr)
+
+    with open(output_path, 'a', encoding='utf-8') as output:
+        refunder = BulkRefunder(api, args.concurrency, args.rate, checkpoint_path, output)
+        stats = refunder.run(read_orders(args.bulk), progress)
+
+    print("\n" + "="*60)
+    print(f"批量退款完成，耗时 {stats['elapsed']} 秒")
+    print(f"  成功: {stats['success']}  失败: {stats['failed']}  参数错误: {stats['invalid']}  异常: {stats['error']}")
+    print(f"  跳过（已完成/重复）: {stats['skipped']}  沿用原流水号重发: {stats['resent']}")
+    if stats["duplicate"]:
+        print(f"\n⚠️ 有 {stats['duplicate']} 行与前面的行是同一订单、同一金额，未退款（见结果文件中 status=duplicate 的行）；"
+              f"如需多次部分退款，请为每一行填写不同的 refund_key")
+    if stats["error"]:
+        print(f"\n⚠️ 有 {stats['error']} 笔结果未知，重新运行同一命令即可续跑（沿用原流水号，不会重复退款）")
+    print("="*60)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n\n程序已中断，重新运行同一命令即可从断点继续")
+        sys.exit(0)
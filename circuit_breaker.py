@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+熔断（circuit breaker）
+
+网关明显不可用（连续发送失败：超时、连接失败、HTTP 5xx）时，同一接口的后续请求立即失败（CircuitOpen），
+不再占用线程等待超时；reset_timeout 秒后放行一个试探请求，成功则恢复，失败则继续熔断。
+
+- 按接口分别计数（jspay / scanpay_query / scanpay_refund 互不影响）
+- 收到任何响应（包括业务错误码）都算成功；网关限流（HTTP 429）由 rate_limit 处理，不计入失败
+- 熔断期间请求不会发出：支付/退款被拒绝时不会产生结果未知的订单
+
+使用方法：
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=5)
+    breaker.allow("scanpay_query")              # 熔断中抛出 CircuitOpen
+    try:
+        response = send()
+    except Exception:
+        breaker.record_failure("scanpay_query")
+        raise
+    breaker.record_success("scanpay_query")
+"""
+
+import threading
+import time
+
+
+class CircuitOpen(Exception):
+    """接口熔断中，请求未发送"""
+
+
+class _Circuit:
+    __slots__ = ("failures", "retry_at")
+
+    def __init__(self):
+        self.failures = 0      # 连续失败次数
+        self.retry_at = 0.0    # 熔断中：下一次放行试探请求的时间
+
+
+class CircuitBreaker:
+    """按接口熔断（线程安全）"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=5.0):
+        """
+        :param failure_threshold: 连续失败多少次后熔断
+        :param reset_timeout: 熔断多少秒后放行一个试探请求
+        """
+        if failure_threshold < 1:
+            raise ValueError(f"failure_threshold 必须大于 0: {failure_threshold}")
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.opened = 0      # 熔断次数
+        self.rejected = 0    # 熔断期间拒绝的请求数
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        circuit = self._circuits.get(key)
+        if circuit is None:
+            with self._lock:
+                circuit = self._circuits.setdefault(key, _Circuit())
+        return circuit
+
+    def allow(self, key):
+        """
+        发送前检查
+
+        :param key: 接口名
+        :raises CircuitOpen: 熔断中（且还没到放行试探请求的时间）
+        """
+        circuit = self._circuits.get(key)
+        if circuit is None or circuit.failures < self.failure_threshold:
+            return
+        with self._lock:
+            if circuit.failures < self.failure_threshold:
+                return
+            now = time.monotonic()
+            if now < circuit.retry_at:
+                self.rejected += 1
+                raise CircuitOpen(f"接口 {key} 熔断中：连续 {circuit.failures} 次发送失败，"
+                                  f"{circuit.retry_at - now:.1f} 秒后重试")
+            # 放行一个试探请求；它没有结果之前，其余请求继续被拒绝
+            circuit.retry_at = now + self.reset_timeout
+
+    def record_success(self, key):
+        """收到响应：连续失败计数清零（熔断中的试探请求成功则恢复）"""
+        circuit = self._circuits.get(key)
+        if circuit is not None and circuit.failures:
+            with self._lock:
+                circuit.failures = 0
+
+    def record_failure(self, key):
+        """发送失败：连续失败达到阈值时熔断（试探请求失败则重新计时）"""
+        circuit = self._get(key)
+        with self._lock:
+            circuit.failures += 1
+            if circuit.failures >= self.failure_threshold:
+                if circuit.failures == self.failure_threshold:
+                    self.opened += 1
+                circuit.retry_at = time.monotonic() + self.reset_timeout
+
+    def state(self, key):
+        """接口状态：closed（正常）/ open（熔断中）/ half_open（可以放行试探请求）"""
+        circuit = self._circuits.get(key)
+        if circuit is None or circuit.failures < self.failure_threshold:
+            return "closed"
+        return "open" if time.monotonic() < circuit.retry_at else "half_open"
+
+    def stats(self):
+        """{接口: {"state": 状态, "failures": 连续失败次数}}"""
+        return {key: {"state": self.state(key), "failures": circuit.failures}
+                for key, circuit in list(self._circuits.items())}
@@ -1,28 +1,16 @@
 # -*- coding: utf-8 -*-
 """
 汇付商户考核配置文件
+
+导入本模块没有副作用：.env 文件、环境变量在第一次读取配置时才加载，密钥文件在第一次使用时才读取。
+- get_settings()：返回 Settings 对象（首次调用时加载 .env 并读取环境变量，之后复用同一个对象）
+- 模块属性仍然可用（config.HUIFU_BACKEND、from config import HUIFU_ID 等），取值来自 get_settings()
+- PRIVATE_KEY / HUIFU_PUBLIC_KEY 在首次访问时读取密钥文件
 """
 
 import os
 
-# 尝试加载 .env 文件（如果存在且安装了 python-dotenv）
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except ImportError:
-    # 如果没有安装 python-dotenv，跳过（不影响使用系统环境变量）
-    pass
-
-# 商户信息（从环境变量读取，如果未设置则使用默认值）
-HUIFU_ID = os.getenv("HUIFU_ID", "")  # 商户号
-SYS_ID = os.getenv("SYS_ID", "")  # 系统号
-PRODUCT_ID = os.getenv("PRODUCT_ID", "")  # 产品号
-USER_ID = os.getenv("USER_ID", "")  # 用户ID
-
-# 密钥文件路径
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-PRIVATE_KEY_FILE = os.path.join(BASE_DIR, "keys", "private_key.txt")
-PUBLIC_KEY_FILE = os.path.join(BASE_DIR, "keys", "public_key.txt")
 
 
 def load_key_file(file_path, key_type='private'):
@@ -67,31 +55,170 @@ def load_key_file(file_path, key_type='private'):
     return pem_content
 
 
-# RSA 私钥（sys_id 私钥）
-# 从文件 keys/private_key.txt 读取
-# 支持PEM格式或纯base64格式，程序会自动处理
-try:
-    PRIVATE_KEY = load_key_file(PRIVATE_KEY_FILE, key_type='private')
-except FileNotFoundError as e:
-    print(f"警告: {e}")
-    print("请将您的私钥内容保存到 keys/private_key.txt 文件中")
-    print("支持两种格式：")
-    print("  1. 完整PEM格式（包含 -----BEGIN/END----- 标记）")
-    print("  2. 纯base64字符串（程序会自动添加PEM格式标记）")
-    PRIVATE_KEY = ""
-
-# RSA 汇付公钥（sys_id 汇付公钥）
-# 从文件 keys/public_key.txt 读取
-# 支持PEM格式或纯base64格式，程序会自动处理
-try:
-    HUIFU_PUBLIC_KEY = load_key_file(PUBLIC_KEY_FILE, key_type='public')
-except FileNotFoundError as e:
-    print(f"警告: {e}")
-    print("请将汇付公钥内容保存到 keys/public_key.txt 文件中")
-    print("支持两种格式：")
-    print("  1. 完整PEM格式（包含 -----BEGIN/END----- 标记）")
-    print("  2. 纯base64字符串（程序会自动添加PEM格式标记）")
-    HUIFU_PUBLIC_KEY = ""
-
-# 注意：使用SDK版本时，API地址由SDK自动管理，无需手动配置
+class Settings:
+    """
+    环境变量中的配置（属性名与环境变量 / 原模块变量同名）
+
+    由 get_settings() 创建；创建之后修改环境变量不会影响已创建的对象。
+    """
+
+    def __init__(self, environ=None):
+        """
+        :param environ: 环境变量字典，默认 os.environ
+        """
+        env = os.environ if environ is None else environ
+        get = env.get
+
+        # 商户信息（从环境变量读取，如果未设置则使用默认值）
+        self.HUIFU_ID = get("HUIFU_ID", "")  # 商户号
+        self.SYS_ID = get("SYS_ID", "")  # 系统号
+        self.PRODUCT_ID = get("PRODUCT_ID", "")  # 产品号
+        self.USER_ID = get("USER_ID", "")  # 用户ID
+
+        # 密钥文件路径
+        # 可用环境变量指向其他文件（例如连接本地网关模拟器时使用模拟器的公钥，见 gateway_simulator.py）
+        self.PRIVATE_KEY_FILE = get("HUIFU_PRIVATE_KEY_FILE") or os.path.join(BASE_DIR, "keys", "private_key.txt")
+        self.PUBLIC_KEY_FILE = get("HUIFU_PUBLIC_KEY_FILE") or os.path.join(BASE_DIR, "keys", "public_key.txt")
+
+        # 请求发送后端：sdk（dg_sdk，默认）或 native（原生流水线，见 huifu_backend.py）
+        self.HUIFU_BACKEND = get("HUIFU_BACKEND", "sdk")
+
+        # 网关地址（两种后端都使用）：指向本地网关模拟器即可离线压测，如 http://127.0.0.1:8700
+        self.HUIFU_BASE_URL = get("HUIFU_BASE_URL", "https://api.huifu.com")
+
+        # 网关HTTP连接池（两种后端共用，见 http_pool.py）
+        self.HUIFU_HTTP_POOL_SIZE = int(get("HUIFU_HTTP_POOL_SIZE", "10"))  # 每个主机的最大连接数
+        self.HUIFU_CONNECT_TIMEOUT = float(get("HUIFU_CONNECT_TIMEOUT", "3.05"))  # 建立连接超时（秒）
+        self.HUIFU_READ_TIMEOUT = float(get("HUIFU_READ_TIMEOUT", "15"))  # 等待响应超时（秒）
+        self.HUIFU_HTTP_WARM_UP = int(get("HUIFU_HTTP_WARM_UP", "0"))  # 初始化时预建立的连接数，0 表示不预热
+
+        # 本地订单库（SQLite，见 order_store.py）：记录每笔支付/退款，退款和查询可只提供一个订单标识
+        # 设为空字符串则不记录
+        self.HUIFU_ORDER_STORE = get("HUIFU_ORDER_STORE", os.path.join(BASE_DIR, "orders.db"))
+
+        # 订单查询结果缓存（见 query_cache.py）：S/F/C 状态永久缓存，P 状态缓存 HUIFU_QUERY_CACHE_PENDING_TTL 秒
+        self.HUIFU_QUERY_CACHE_MB = float(get("HUIFU_QUERY_CACHE_MB", "16"))  # 内存上限（MB），0 表示不缓存
+        self.HUIFU_QUERY_CACHE_PENDING_TTL = float(get("HUIFU_QUERY_CACHE_PENDING_TTL", "2"))
+
+        # 安静模式（见 api_log.py）：不打印请求/响应，每个请求写一行JSON日志（后台线程写出）
+        self.HUIFU_QUIET = get("HUIFU_QUIET", "0") == "1"
+        self.HUIFU_LOG_LEVEL = get("HUIFU_LOG_LEVEL", "INFO")  # DEBUG 时日志中包含完整响应
+        self.HUIFU_LOG_FILE = get("HUIFU_LOG_FILE", "")  # 日志文件，默认写到标准错误输出
+
+        # 请求指标（见 metrics.py）：设置端口后在本机提供 Prometheus 文本格式的 /metrics，0 表示不启动HTTP服务
+        self.HUIFU_METRICS_PORT = int(get("HUIFU_METRICS_PORT", "0"))
+
+        # 发送限流（见 rate_limit.RequestLimiter）：按 (商户号, 接口) 的令牌桶 + 自适应并发窗口
+        self.HUIFU_RATE_LIMIT = float(get("HUIFU_RATE_LIMIT", "0"))  # 每秒最多发送的请求数，0 表示不限速
+        self.HUIFU_MAX_CONCURRENCY = int(get("HUIFU_MAX_CONCURRENCY", "32"))  # 并发窗口上限，0 表示不限制并发
+        # 获取发送许可最多等待的秒数，超过则立即失败（LimitExceeded）；留空表示一直等待
+        limit_timeout = get("HUIFU_LIMIT_TIMEOUT", "")
+        self.HUIFU_LIMIT_TIMEOUT = float(limit_timeout) if limit_timeout else None
+
+        # 熔断（见 circuit_breaker.py）：某个接口连续发送失败 HUIFU_BREAKER_FAILURES 次后立即拒绝该接口的请求，
+        # HUIFU_BREAKER_RESET 秒后放行一个试探请求；0 表示不熔断
+        self.HUIFU_BREAKER_FAILURES = int(get("HUIFU_BREAKER_FAILURES", "5"))
+        self.HUIFU_BREAKER_RESET = float(get("HUIFU_BREAKER_RESET", "5"))
+
+        # 支付/退款重试（见 retry.py）：结果未知或网关未受理时沿用同一流水号重发，最多发送 HUIFU_RETRY_ATTEMPTS 次（1 表示不重试）
+        self.HUIFU_RETRY_ATTEMPTS = int(get("HUIFU_RETRY_ATTEMPTS", "3"))
+        # 表示网关未受理、可以重发的响应码（逗号分隔）
+        self.HUIFU_RETRY_CODES = tuple(code.strip() for code in get("HUIFU_RETRY_CODES", "429").split(",") if code.strip())
+        # 结果未知时确认查询返回的、表示网关没有这笔交易的响应码（逗号分隔，以汇付文档为准）：只有这些响应码允许重发，
+        # 查询超时、出错或返回其他响应码时结果仍未知，退避后再次查询
+        self.HUIFU_RETRY_NOT_FOUND_CODES = tuple(
+            code.strip() for code in get("HUIFU_RETRY_NOT_FOUND_CODES", "23000001").split(",") if code.strip())
+        # 表示请求流水号重复（之前的发送已被受理）的响应码（逗号分隔，以汇付文档为准）：按结果未知处理，查询确认后返回原交易
+        self.HUIFU_RETRY_DUPLICATE_CODES = tuple(
+            code.strip() for code in get("HUIFU_RETRY_DUPLICATE_CODES", "23000004").split(",") if code.strip())
+
+        # 订单查询对冲（见 hedging.py）：查询超过近期 p95 耗时未返回时再发一次，取先返回的结果
+        self.HUIFU_QUERY_HEDGE = get("HUIFU_QUERY_HEDGE", "0") == "1"
+
+        # 紧凑结果（见 records.py）：1 时 aggregate_pay / query_order / refund 返回 OrderRecord 而不是响应字典，
+        # raw 时另外保留原始响应（JSON 字节）；长时间运行的轮询、对账可大幅减少内存
+        self.HUIFU_RECORDS = get("HUIFU_RECORDS", "0")
+
+        # 本地常驻服务（见 huifu_daemon.py）的 socket 路径；设为空字符串则命令行脚本不连接常驻服务
+        # 默认放在只有当前用户可写的 $XDG_RUNTIME_DIR 下，没有时退回 /tmp（客户端会校验 socket 属于当前用户）
+        if not hasattr(os, "getuid"):
+            default_socket = ""
+        elif get("XDG_RUNTIME_DIR"):
+            default_socket = os.path.join(get("XDG_RUNTIME_DIR"), "huifu_daemon.sock")
+        else:
+            default_socket = f"/tmp/huifu_daemon_{os.getuid()}.sock"
+        self.HUIFU_DAEMON_SOCKET = get("HUIFU_DAEMON_SOCKET", default_socket)
+
+    def __repr__(self):
+        return f"Settings(HUIFU_ID={self.HUIFU_ID!r}, HUIFU_BACKEND={self.HUIFU_BACKEND!r})"
+
+
+_settings = None
+
+
+def _load_dotenv():
+    """尝试加载 .env 文件（如果存在且安装了 python-dotenv）"""
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        # 如果没有安装 python-dotenv，跳过（不影响使用系统环境变量）
+        return
+    load_dotenv()
+
+
+def get_settings():
+    """当前配置（首次调用时加载 .env 并读取环境变量）"""
+    global _settings
+    if _settings is None:
+        _load_dotenv()
+        _settings = Settings()
+    return _settings
+
+
+def reload_settings():
+    """重新读取环境变量（修改环境变量后调用），返回新的 Settings"""
+    global _settings
+    _settings = None
+    _KEYS.clear()
+    return get_settings()
+
+
+# 密钥文本：首次访问 config.PRIVATE_KEY / config.HUIFU_PUBLIC_KEY 时读取
+_KEYS = {}
+_KEY_HINTS = {
+    "PRIVATE_KEY": ("PRIVATE_KEY_FILE", "private", "请将您的私钥内容保存到 keys/private_key.txt 文件中"),
+    "HUIFU_PUBLIC_KEY": ("PUBLIC_KEY_FILE", "public", "请将汇付公钥内容保存到 keys/public_key.txt 文件中"),
+}
+
+
+def _load_key(name):
+    """读取 PRIVATE_KEY（sys_id 私钥）/ HUIFU_PUBLIC_KEY（sys_id 汇付公钥），支持PEM格式或纯base64格式"""
+    file_attr, key_type, hint = _KEY_HINTS[name]
+    try:
+        return load_key_file(getattr(get_settings(), file_attr), key_type=key_type)
+    except FileNotFoundError as e:
+        print(f"警告: {e}")
+        print(hint)
+        print("支持两种格式：")
+        print("  1. 完整PEM格式（包含 -----BEGIN/END----- 标记）")
+        print("  2. 纯base64字符串（程序会自动添加PEM格式标记）")
+        return ""
+
+
+# from config import * 仍导出原来的模块变量（会触发配置加载和密钥读取）
+__all__ = ["BASE_DIR", "load_key_file", "Settings", "get_settings", "reload_settings",
+           "PRIVATE_KEY", "HUIFU_PUBLIC_KEY"] + list(vars(Settings({})))
+
 
+def __getattr__(name):
+    """模块属性按需取值（PEP 562）：配置项来自 get_settings()，密钥文本首次访问时读取"""
+    if name in _KEY_HINTS:
+        if name not in _KEYS:
+            _KEYS[name] = _load_key(name)
+        return _KEYS[name]
+    # __path__ 等导入机制会探测的属性直接返回，不触发配置加载
+    if name.isupper():
+        settings = get_settings()
+        if name in vars(settings):
+            return getattr(settings, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
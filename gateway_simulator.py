@@ -0,0 +1,554 @@
+# -*- coding: utf-8 -*-
+"""
+本地汇付网关模拟器（离线压测 / 联调）
+
+模拟 jspay（聚合正扫）、scanpay/query（订单查询）、scanpay/refund（交易退款）、scanpay/refundquery（退款查询）四个接口：
+- 响应用测试密钥对签名，客户端把模拟器的公钥配置为汇付公钥即可正常验签
+- 订单状态保存在内存中：下单后为 P，pay_delay 秒后变为 S（按 pay_fail_rate 变为 F）
+- 退款检查原订单状态和可退金额；同一流水号重复请求返回首次的结果（与汇付按流水号防重一致），
+  reject_duplicates 时改为以“流水号重复”拒绝（验证客户端不会把已受理的交易当作失败）
+- 可配置延迟分布、故障注入（超时、HTTP 5xx、业务错误码）和限流（超出速率返回 HTTP 429）
+
+模拟器自定义的错误码（真实网关的错误码以汇付文档为准）：
+    21000000  参数校验失败 / 订单标识不足
+    23000001  订单不存在
+    23000002  原交易状态不允许退款
+    23000003  退款金额超过可退金额
+    23000004  请求流水号重复（reject_duplicates 时）
+    10000000  请求验签失败（提供了商户公钥时校验请求签名）
+
+使用方法：
+1. 启动模拟器（首次运行生成测试密钥 keys/simulator_private.pem / keys/simulator_public.pem）：
+   python gateway_simulator.py --port 8700 --latency lognormal:30:0.5 --pay-delay 5 \\
+       --timeout-rate 0.01 --error-rate 0.01 --biz-error-rate 0.01 --rps 200
+
+2. 客户端指向模拟器（两种发送后端都支持）：
+   HUIFU_BASE_URL=http://127.0.0.1:8700 HUIFU_PUBLIC_KEY_FILE=keys/simulator_public.pem python main.py
+
+3. 代码中使用（基准测试、压测脚本）：
+   with GatewaySimulator(SimulatorProfile(latency="fixed:20"), private_key_pem) as simulator:
+       api = HuifuSDKAPI(...)   # base_url=simulator.url
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import math
+import os
+import random
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from huifu_backend import ENDPOINTS, canonical_json, sort_dict
+from key_registry import load_private_key, load_public_key, rsa_sign, rsa_verify
+from rate_limit import TokenBucket
+
+
+# 接口路径 -> 接口名称
+_PATHS = {path: endpoint for endpoint, (path, _, _) in ENDPOINTS.items()}
+
+BAD_REQUEST = ("21000000", "参数校验失败")
+ORDER_NOT_FOUND = ("23000001", "订单不存在")
+REFUND_NOT_ALLOWED = ("23000002", "原交易状态不允许退款")
+REFUND_EXCEEDS = ("23000003", "退款金额超过可退金额")
+DUPLICATE_SEQ = ("23000004", "请求流水号重复")
+SIGN_ERROR = ("10000000", "请求验签失败")
+
+
+class LatencyModel:
+    """
+    响应延迟分布（毫秒）：
+        fixed:20            固定 20ms
+        uniform:5:50        5~50ms 均匀分布
+        normal:30:10        均值 30ms、标准差 10ms（不小于 0）
+        lognormal:30:0.5    中位数 30ms、对数标准差 0.5（长尾）
+    """
+
+    KINDS = ("fixed", "uniform", "normal", "lognormal")
+
+    def __init__(self, spec="fixed:0"):
+        kind, _, params = str(spec).partition(":")
+        if kind not in self.KINDS:
+            raise ValueError(f"未知的延迟分布: {spec}（可选 {' / '.join(self.KINDS)}）")
+        values = [float(v) for v in params.split(":") if v]
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}[kind]
+        if len(values) != expected:
+            raise ValueError(f"延迟分布 {kind} 需要 {expected} 个参数: {spec}")
+        self.spec = spec
+        self.kind = kind
+        self.params = values
+
+    def sample(self, rng):
+        """抽样一次延迟（秒）"""
+        kind, p = self.kind, self.params
+        if kind == "fixed":
+            ms = p[0]
+        elif kind == "uniform":
+            ms = rng.uniform(p[0], p[1])
+        elif kind == "normal":
+            ms = rng.gauss(p[0], p[1])
+        else:
+            ms = p[0] * math.exp(rng.gauss(0.0, p[1]))
+        return max(0.0, ms) / 1000
+
+    def __repr__(self):
+        return f"LatencyModel({self.spec!r})"
+
+
+class SimulatorProfile:
+    """模拟器行为配置"""
+
+    def __init__(self, latency="fixed:0", endpoint_latency=None, pay_delay=5.0, pay_fail_rate=0.0,
+                 timeout_rate=0.0, timeout_delay=30.0, error_rate=0.0, biz_error_rate=0.0,
+                 biz_error=BAD_REQUEST, rps=0, burst=None, reject_duplicates=False, seed=None):
+        """
+        :param latency: 默认响应延迟分布（见 LatencyModel）
+        :param endpoint_latency: 按接口覆盖的延迟分布 {"scanpay_query": "fixed:5"}
+        :param pay_delay: 下单后经过多少秒支付完成（P → S/F），负数表示永远处理中
+        :param pay_fail_rate: 支付最终失败（F）的比例
+        :param timeout_rate: 模拟超时的比例：请求照常处理，timeout_delay 秒后才响应（客户端通常已超时，结果未知）
+        :param timeout_delay: 模拟超时的响应延迟（秒），应大于客户端的读取超时
+        :param error_rate: 返回 HTTP 5xx 的比例（请求未处理）
+        :param biz_error_rate: 返回业务错误码的比例（请求未处理）
+        :param biz_error: 注入的业务错误 (resp_code, resp_desc)
+        :param rps: 每秒最多处理的请求数，超出返回 HTTP 429；0 表示不限流
+        :param burst: 限流的突发容量，默认与 rps 相同
+        :param reject_duplicates: 同一流水号的重复支付/退款返回 DUPLICATE_SEQ（默认返回首次的结果）
+        :param seed: 随机数种子（故障注入、延迟抽样可复现）
+        """
+        self.latency = LatencyModel(latency)
+        self.endpoint_latency = {k: LatencyModel(v) for k, v in (endpoint_latency or {}).items()}
+        self.pay_delay = pay_delay
+        self.pay_fail_rate = pay_fail_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_delay = timeout_delay
+        self.error_rate = error_rate
+        self.biz_error_rate = biz_error_rate
+        self.biz_error = tuple(biz_error)
+        self.rps = rps
+        self.burst = burst
+        self.reject_duplicates = reject_duplicates
+        self.seed = seed
+
+    def latency_for(self, endpoint):
+        return self.endpoint_latency.get(endpoint, self.latency)
+
+
+class _Order:
+    __slots__ = ("huifu_id", "req_seq_id", "req_date", "hf_seq_id", "party_order_id", "trans_amt",
+                 "created_at", "final_stat", "refunded", "response")
+
+    def __init__(self, fields, hf_seq_id, party_order_id, trans_amt, final_stat):
+        self.huifu_id = fields.get("huifu_id", "")
+        self.req_seq_id = fields["req_seq_id"]
+        self.req_date = fields.get("req_date", "")
+        self.hf_seq_id = hf_seq_id
+        self.party_order_id = party_order_id
+        self.trans_amt = trans_amt
+        self.created_at = time.monotonic()
+        self.final_stat = final_stat
+        self.refunded = Decimal("0")
+        self.response = None
+
+
+def _amount(value):
+    """金额字符串 -> Decimal（两位小数、大于0），不合法时返回 None"""
+    try:
+        amount = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return None
+    if not amount.is_finite() or amount <= 0 or amount != amount.quantize(Decimal("0.01")):
+        return None
+    return amount
+
+
+class GatewayState:
+    """模拟器的订单状态（线程安全，可脱离HTTP服务单独使用）"""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self._orders = {}    # req_seq_id / hf_seq_id / party_order_id -> _Order
+        self._refunds = {}   # 退款 req_seq_id -> 响应
+        self._lock = threading.Lock()
+        self._sequence = itertools.count(1)
+        self._rng = random.Random(profile.seed)
+
+    def _new_hf_seq_id(self, kind):
+        stamp = datetime.datetime.now().strftime("%y%m%d%H%M%S")
+        return f"002900TOP{kind}{stamp}{next(self._sequence):012d}"
+
+    def trans_stat(self, order):
+        """订单当前的交易状态（到达 pay_delay 后由 P 变为终态）"""
+        delay = self.profile.pay_delay
+        if delay < 0 or time.monotonic() - order.created_at < delay:
+            return "P"
+        return order.final_stat
+
+    def _find(self, *identifiers):
+        for identifier in identifiers:
+            order = self._orders.get(identifier) if identifier else None
+            if order is not None:
+                return order
+        return None
+
+    def handle(self, endpoint, data):
+        """
+        处理一次业务请求
+
+        :param endpoint: 接口名称（huifu_backend.ENDPOINTS 的键）
+        :param data: 请求的 data 字典
+        :return: 响应 data 字典
+        """
+        if endpoint == "jspay":
+            return self.pay(data)
+        if endpoint == "scanpay_query":
+            return self.query(data)
+        if endpoint == "scanpay_refundquery":
+            return self.refund_query(data)
+        return self.refund(data)
+
+    def pay(self, data):
+        missing = [f for f in ("req_seq_id", "req_date", "huifu_id", "trade_type", "trans_amt") if not data.get(f)]
+        amount = _amount(data.get("trans_amt"))
+        if missing or amount is None:
+            return _error(BAD_REQUEST, f"缺少字段或金额不合法: {', '.join(missing) or 'trans_amt'}")
+        with self._lock:
+            order = self._orders.get(data["req_seq_id"])
+            if order is not None:
+                if self.profile.reject_duplicates:
+                    return _error(DUPLICATE_SEQ)
+                return dict(order.response)
+            final_stat = "F" if self._rng.random() < self.profile.pay_fail_rate else "S"
+            hf_seq_id = self._new_hf_seq_id("1A")
+            party_order_id = f"{datetime.datetime.now():%m%d}{next(self._sequence):016d}"
+            order = _Order(data, hf_seq_id, party_order_id, amount, final_stat)
+            order.response = {
+                "resp_code": "00000100",
+                "resp_desc": "下单成功",
+                "req_seq_id": order.req_seq_id,
+                "req_date": order.req_date,
+                "huifu_id": order.huifu_id,
+                "hf_seq_id": hf_seq_id,
+                "party_order_id": party_order_id,
+                "trade_type": data["trade_type"],
+                "trans_amt": data["trans_amt"],
+                "trans_stat": "P",
+                "qr_code": f"https://qr.alipay.com/sim{hf_seq_id[-16:]}",
+            }
+            for key in (order.req_seq_id, hf_seq_id, party_order_id):
+                self._orders[key] = order
+            return dict(order.response)
+
+    def query(self, data):
+        req_seq_id = data.get("org_req_seq_id") or data.get("req_seq_id")
+        hf_seq_id = data.get("org_hf_seq_id") or data.get("hf_seq_id")
+        party_order_id = data.get("out_ord_id") or data.get("party_order_id")
+        if not (hf_seq_id or party_order_id or (req_seq_id and (data.get("org_req_date") or data.get("req_date")))):
+            return _error(BAD_REQUEST, "订单标识不足，请提供 hf_seq_id 或 party_order_id")
+        with self._lock:
+            order = self._find(hf_seq_id, party_order_id, req_seq_id)
+            if order is None:
+                return _error(ORDER_NOT_FOUND)
+            trans_stat = self.trans_stat(order)
+            return {
+                "resp_code": "00000000",
+                "resp_desc": "查询成功",
+                "huifu_id": order.huifu_id,
+                "org_req_seq_id": order.req_seq_id,
+                "org_req_date": order.req_date,
+                "org_hf_seq_id": order.hf_seq_id,
+                "hf_seq_id": order.hf_seq_id,
+                "party_order_id": order.party_order_id,
+                "trans_amt": str(order.trans_amt),
+                "trans_stat": trans_stat,
+                "trans_resp_desc": {"S": "支付成功", "F": "支付失败", "P": "处理中"}[trans_stat],
+            }
+
+    def refund(self, data):
+        missing = [f for f in ("req_seq_id", "req_date", "huifu_id", "ord_amt", "org_req_date") if not data.get(f)]
+        amount = _amount(data.get("ord_amt"))
+        if missing or amount is None:
+            return _error(BAD_REQUEST, f"缺少字段或金额不合法: {', '.join(missing) or 'ord_amt'}")
+        with self._lock:
+            previous = self._refunds.get(data["req_seq_id"])
+            if previous is not None:
+                if self.profile.reject_duplicates:
+                    return _error(DUPLICATE_SEQ)
+                return dict(previous)
+            order = self._find(data.get("org_hf_seq_id"), data.get("party_order_id"), data.get("org_req_seq_id"))
+            if order is None:
+                return _error(ORDER_NOT_FOUND, "原交易不存在")
+            if self.trans_stat(order) != "S":
+                return _error(REFUND_NOT_ALLOWED)
+            if order.refunded + amount > order.trans_amt:
+                return _error(REFUND_EXCEEDS, f"可退金额 {order.trans_amt - order.refunded}")
+            order.refunded += amount
+            response = {
+                "resp_code": "00000000",
+                "resp_desc": "交易成功",
+                "req_seq_id": data["req_seq_id"],
+                "req_date": data["req_date"],
+                "huifu_id": order.huifu_id,
+                "hf_seq_id": self._new_hf_seq_id("2R"),
+                "org_req_seq_id": order.req_seq_id,
+                "org_req_date": order.req_date,
+                "org_hf_seq_id": order.hf_seq_id,
+                "ord_amt": data["ord_amt"],
+                "trans_stat": "S",
+            }
+            # 只记录成功的退款：失败后可以用同一流水号重试
+            self._refunds[data["req_seq_id"]] = response
+            return dict(response)
+
+    def refund_query(self, data):
+        req_seq_id = data.get("org_req_seq_id")
+        hf_seq_id = data.get("org_hf_seq_id")
+        if not (hf_seq_id or (req_seq_id and data.get("org_req_date"))):
+            return _error(BAD_REQUEST, "退款标识不足，请提供退款流水号和退款日期")
+        with self._lock:
+            refund = self._refunds.get(req_seq_id) if req_seq_id else None
+            if refund is None and hf_seq_id:
+                refund = next((r for r in self._refunds.values() if r["hf_seq_id"] == hf_seq_id), None)
+            if refund is None:
+                return _error(ORDER_NOT_FOUND, "退款不存在")
+            return {
+                "resp_code": "00000000",
+                "resp_desc": "查询成功",
+                "huifu_id": refund["huifu_id"],
+                "org_req_seq_id": refund["req_seq_id"],
+                "org_req_date": refund["req_date"],
+                "org_hf_seq_id": refund["hf_seq_id"],
+                "hf_seq_id": refund["hf_seq_id"],
+                "ord_amt": refund["ord_amt"],
+                "trans_stat": refund["trans_stat"],
+            }
+
+    def order_count(self):
+        with self._lock:
+            return len({id(order) for order in self._orders.values()})
+
+
+def _error(code, detail=None):
+    resp_code, resp_desc = code
+    return {"resp_code": resp_code, "resp_desc": f"{resp_desc}（{detail}）" if detail else resp_desc}
+
+
+class GatewaySimulator:
+    """本地汇付网关模拟器（HTTP，每个连接一个线程，支持长连接）"""
+
+    def __init__(self, profile=None, private_key_pem=None, merchant_public_key_pem=None,
+                 host="127.0.0.1", port=0):
+        """
+        :param profile: SimulatorProfile，默认无延迟、无故障
+        :param private_key_pem: 响应签名私钥（客户端用对应公钥验签）
+        :param merchant_public_key_pem: 商户公钥；提供时校验请求签名
+        :param host: 监听地址
+        :param port: 端口（0 表示随机端口，启动后见 url）
+        """
+        if not private_key_pem:
+            raise ValueError("需要提供响应签名私钥（python gateway_simulator.py --gen-keys 生成测试密钥）")
+        self.profile = profile or SimulatorProfile()
+        self.state = GatewayState(self.profile)
+        self._private_key = load_private_key(private_key_pem)
+        self._merchant_key = load_public_key(merchant_public_key_pem) if merchant_public_key_pem else None
+        self._bucket = TokenBucket(self.profile.rps, self.profile.burst) if self.profile.rps else None
+        self._rng = random.Random(self.profile.seed)
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+        self.host = host
+        self.port = port
+        self.server = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] = self._stats.get(key, 0) + 1
+
+    def stats(self):
+        """各接口请求数与注入的故障数：{"jspay": n, "timeout": n, "http_5xx": n, "biz_error": n, "throttled": n, ...}"""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _sign(self, data):
+        return rsa_sign(self._private_key, json.dumps(sort_dict(data), ensure_ascii=False, separators=(',', ':')))
+
+    def process(self, path, body):
+        """
+        处理一次HTTP请求（与网络无关，便于直接调用）
+
+        :return: (HTTP状态码, 响应体 bytes, 响应前等待的秒数)
+        """
+        endpoint = _PATHS.get(path.split("?")[0])
+        if endpoint is None:
+            return 404, b'{"resp_code":"404","resp_desc":"not found"}', 0.0
+        self._count(endpoint)
+        if self._bucket is not None and not self._bucket.try_acquire():
+            self._count("throttled")
+            return 429, b'{"resp_code":"429","resp_desc":"too many requests"}', 0.0
+
+        profile, rng = self.profile, self._rng
+        delay = profile.latency_for(endpoint).sample(rng)
+        roll = rng.random()
+        if roll < profile.error_rate:
+            self._count("http_5xx")
+            return rng.choice((500, 502, 503)), b'{"resp_code":"500","resp_desc":"internal error"}', delay
+        roll -= profile.error_rate
+
+        try:
+            request = json.loads(body)
+            data = request["data"]
+        except (ValueError, KeyError, TypeError):
+            return 200, self._reply(_error(BAD_REQUEST, "请求报文格式错误")), delay
+        if self._merchant_key is not None and not rsa_verify(self._merchant_key, canonical_json(sort_dict(data)), request.get("sign", "")):
+            return 200, self._reply(_error(SIGN_ERROR)), delay
+
+        if roll < profile.biz_error_rate:
+            self._count("biz_error")
+            return 200, self._reply(_error(profile.biz_error, "模拟故障")), delay
+        roll -= profile.biz_error_rate
+
+        response = self.state.handle(endpoint, data)
+        if roll < profile.timeout_rate:
+            # 请求已处理（订单已创建 / 已退款），但迟迟不返回：客户端看到的是结果未知
+            self._count("timeout")
+            delay = profile.timeout_delay
+        return 200, self._reply(response), delay
+
+    def _reply(self, data):
+        return json.dumps({"data": data, "sign": self._sign(data)}, ensure_ascii=False).encode('utf-8')
+
+    def start(self):
+        """在后台线程启动HTTP服务"""
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _reply(self, status, payload):
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json;charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status, payload, delay = simulator.process(self.path, body)
+                if delay:
+                    time.sleep(delay)
+                try:
+                    self._reply(status, payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # 模拟超时时客户端通常已经断开
+                    self.close_connection = True
+
+            def do_HEAD(self):
+                self._reply(200, b"")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="gateway-simulator", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def ensure_key_pair(prefix):
+    """
+    读取测试密钥对 {prefix}_private.pem / {prefix}_public.pem，不存在时生成
+
+    :return: (私钥PEM, 公钥PEM)
+    """
+    private_file, public_file = f"{prefix}_private.pem", f"{prefix}_public.pem"
+    if not (os.path.exists(private_file) and os.path.exists(public_file)):
+        from notify_sender import generate_key_pair
+        os.makedirs(os.path.dirname(private_file) or ".", exist_ok=True)
+        generate_key_pair(prefix)
+    with open(private_file, encoding='utf-8') as f:
+        private_pem = f.read()
+    with open(public_file, encoding='utf-8') as f:
+        public_pem = f.read()
+    return private_pem, public_pem
+
+
+def main():
+    from config import BASE_DIR, load_key_file
+
+    parser = argparse.ArgumentParser(description="本地汇付网关模拟器（jspay / scanpay query / scanpay refund / scanpay refundquery）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8700)
+    parser.add_argument("--keys", default=os.path.join(BASE_DIR, "keys", "simulator"),
+                        help="测试密钥前缀（{keys}_private.pem / {keys}_public.pem，不存在时生成）")
+    parser.add_argument("--merchant-public-key-file", help="商户公钥文件；提供时校验请求签名")
+    parser.add_argument("--latency", default="fixed:0", help="响应延迟分布，如 fixed:20、uniform:5:50、lognormal:30:0.5（毫秒）")
+    parser.add_argument("--query-latency", help="查询接口单独的延迟分布")
+    parser.add_argument("--pay-delay", type=float, default=5.0, help="下单后多少秒支付完成（负数表示永远处理中）")
+    parser.add_argument("--pay-fail-rate", type=float, default=0.0, help="支付失败（F）的比例")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="模拟超时的比例（请求已处理，迟迟不响应）")
+    parser.add_argument("--timeout-delay", type=float, default=30.0, help="模拟超时的响应延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="HTTP 5xx 的比例")
+    parser.add_argument("--biz-error-rate", type=float, default=0.0, help="业务错误码的比例")
+    parser.add_argument("--biz-error-code", default=BAD_REQUEST[0], help="注入的业务错误码")
+    parser.add_argument("--rps", type=float, default=0, help="每秒最多处理的请求数，超出返回 HTTP 429（0 不限流）")
+    parser.add_argument("--reject-duplicates", action="store_true", help="同一流水号的重复支付/退款返回流水号重复错误")
+    parser.add_argument("--seed", type=int, help="随机数种子")
+    args = parser.parse_args()
+
+    private_pem, _ = ensure_key_pair(args.keys)
+    merchant_public_pem = None
+    if args.merchant_public_key_file:
+        merchant_public_pem = load_key_file(args.merchant_public_key_file, key_type='public')
+
+    profile = SimulatorProfile(
+        latency=args.latency,
+        endpoint_latency={"scanpay_query": args.query_latency} if args.query_latency else None,
+        pay_delay=args.pay_delay,
+        pay_fail_rate=args.pay_fail_rate,
+        timeout_rate=args.timeout_rate,
+        timeout_delay=args.timeout_delay,
+        error_rate=args.error_rate,
+        biz_error_rate=args.biz_error_rate,
+        biz_error=(args.biz_error_code, "模拟业务错误"),
+        rps=args.rps,
+        reject_duplicates=args.reject_duplicates,
+        seed=args.seed,
+    )
+    simulator = GatewaySimulator(profile, private_pem, merchant_public_pem, args.host, args.port).start()
+    print(f"✅ 网关模拟器已启动: {simulator.url}")
+    print(f"   延迟: {args.latency}  支付完成: {args.pay_delay}秒  限流: {args.rps or '不限'}")
+    print(f"\n客户端配置：")
+    print(f"   HUIFU_BASE_URL={simulator.url} HUIFU_PUBLIC_KEY_FILE={args.keys}_public.pem")
+    try:
+        while True:
+            time.sleep(10)
+            stats = simulator.stats()
+            if stats:
+                print(f"📊 订单 {simulator.state.order_count()} 笔  " + "  ".join(f"{k}={v}" for k, v in sorted(stats.items())))
+    except KeyboardInterrupt:
+        simulator.stop()
+        print("\n网关模拟器已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+对冲请求（hedged requests）
+
+只用于幂等的订单查询：第一次请求超过近期 p95 耗时仍未返回时，再发送一次相同的请求，
+取先返回的结果。少数慢响应（网关长尾、连接卡住）不再拖住 wait_for_payment 和排在后面的调用方。
+
+- 对冲延迟：最近 window 次成功请求耗时的 percentile 分位数（样本不足 min_samples 时不对冲）
+- 对冲预算：每个请求积累 max_ratio 次对冲额度，网关整体变慢时最多多发 max_ratio 比例的请求，不会把负载翻倍
+- 对冲延迟从第一次请求真正开始发送时计时：发送线程全部占用时，排队等待的请求不会被对冲
+- 落后的请求不取消（HTTP请求无法中途撤回），它的结果照常写入订单库、查询缓存
+- 支付、退款不是幂等的，绝不能对冲（HuifuSDKAPI 只对 scanpay_query 使用）
+
+使用方法：
+    hedger = QueryHedger()
+    response = hedger.call(send_query, request)
+"""
+
+import threading
+import time
+from collections import deque
+
+# 对冲额度上限：长时间没有慢请求时积累的额度不超过这个数
+BUDGET_CAP = 10.0
+
+
+class QueryHedger:
+    """查询对冲（线程安全）"""
+
+    def __init__(self, percentile=0.95, window=200, min_samples=20, min_delay=0.005, max_ratio=0.1, max_workers=16):
+        """
+        :param percentile: 以最近耗时的哪个分位数作为对冲延迟
+        :param window: 参与统计的最近请求数
+        :param min_samples: 至少有多少个样本才开始对冲
+        :param min_delay: 对冲延迟下限（秒）
+        :param max_ratio: 对冲请求占全部请求的最大比例
+        :param max_workers: 发送线程数（第一次请求和对冲请求都在这些线程中发送，占满时后到的请求排队）
+        """
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self.max_workers = max_workers
+        self.calls = 0       # 请求数
+        self.hedged = 0      # 发出对冲请求的次数
+        self.hedge_wins = 0  # 对冲请求先返回的次数
+        self._samples = deque(maxlen=window)
+        self._refresh_every = max(1, window // 10)
+        self._pending_samples = 0
+        self._delay = None
+        self._budget = 0.0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def delay(self):
+        """当前的对冲延迟（秒），样本不足时为 None"""
+        return self._delay
+
+    def _observe(self, seconds):
+        """记录一次成功请求的耗时；每 window/10 个样本重新计算一次分位数"""
+        with self._lock:
+            samples = self._samples
+            samples.append(seconds)
+            self._pending_samples += 1
+            if len(samples) < self.min_samples or self._pending_samples < self._refresh_every:
+                return
+            self._pending_samples = 0
+            ordered = sorted(samples)
+            self._delay = max(self.min_delay, ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))])
+
+    def _timed(self, func, args, kwargs, started=None):
+        if started is not None:
+            started.set()
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        self._observe(time.perf_counter() - start)
+        return result
+
+    def _take_budget(self):
+        with self._lock:
+            if self._budget < 1.0:
+                return False
+            self._budget -= 1.0
+            self.hedged += 1
+            return True
+
+    def _get_executor(self):
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="huifu-hedge")
+        return self._executor
+
+    def call(self, func, *args, **kwargs):
+        """
+        执行 func(*args, **kwargs)，超过对冲延迟未返回时再执行一次，返回先成功的结果
+
+        :return: func 的返回值
+        :raises: 两次都失败时抛出先结束那次的异常
+        """
+        with self._lock:
+            self.calls += 1
+            self._budget = min(BUDGET_CAP, self._budget + self.max_ratio)
+        delay = self._delay
+        if delay is None:
+            return self._timed(func, args, kwargs)
+
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        executor = self._get_executor()
+        started = threading.Event()
+        first = executor.submit(self._timed, func, args, kwargs, started)
+        # 排队等待发送线程的时间不计入对冲延迟（请求还没发出，对冲只会让队列更长）
+        while not started.wait(delay) and not first.done():
+            pass
+        done, _ = wait((first,), delay)
+        if done or not self._take_budget():
+            return first.result()
+
+        second = executor.submit(self._timed, func, args, kwargs)
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def stats(self):
+        """{"calls": 请求数, "hedged": 对冲次数, "hedge_wins": 对冲请求先返回的次数, "delay_ms": 当前对冲延迟}"""
+        delay = self._delay
+        return {"calls": self.calls, "hedged": self.hedged, "hedge_wins": self.hedge_wins,
+                "delay_ms": round(delay * 1000, 1) if delay is not None else None}
+
+    def close(self):
+        """关闭发送线程（落后的请求继续执行完）"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
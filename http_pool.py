@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+网关HTTP连接池
+
+HuifuSDKAPI 的所有网关请求共用一个 requests.Session：
+- 每个主机的连接池大小可配置，连接保持长连接（keep-alive），
+  复用的连接无需再次进行 TCP 握手和 TLS 握手
+- 连接超时、读取超时分开配置
+- 可选预热：初始化时提前建立连接，第一笔支付请求不用等待握手
+
+dg_sdk 每次请求都会新建 Session，SDKBackend 发送时会让 SDK 改用这里的连接池。
+requests 在创建连接池时才导入（导入约需 0.1 秒，命令行工具只显示帮助时不需要）。
+"""
+
+import threading
+import time
+
+from api_log import logger
+
+
+class HttpPool:
+    """可配置的 HTTP 连接池（线程安全）"""
+
+    def __init__(self, base_url, pool_size=10, connect_timeout=3.05, read_timeout=15,
+                 keep_alive=True, pool_block=False, verify=True):
+        """
+        :param base_url: 网关地址（预热时连接该地址）
+        :param pool_size: 每个主机保留的最大连接数
+        :param connect_timeout: 建立连接超时（秒）
+        :param read_timeout: 等待响应超时（秒）
+        :param keep_alive: 是否保持长连接；关闭后每次请求都重新握手
+        :param pool_block: 连接数达到 pool_size 时是否阻塞等待（否则临时新建连接，用完即关闭）
+        :param verify: TLS证书校验（True 或 CA证书文件路径）
+        """
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.keep_alive = keep_alive
+        # 每次请求显式传入：Session.verify 会被 REQUESTS_CA_BUNDLE 等环境变量覆盖
+        self.verify = verify
+
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.session = requests.Session()
+        if not keep_alive:
+            self.session.headers["Connection"] = "close"
+        # 与 dg_sdk 一致：仅对建立连接失败重试
+        self.adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=pool_size,
+            pool_block=pool_block,
+            max_retries=Retry(connect=3, backoff_factor=0.5),
+        )
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+
+    def post(self, url, **kwargs):
+        """
+        发送 POST 请求（超时使用连接池配置）
+
+        :param url: 完整请求地址
+        :return: requests.Response
+        """
+        kwargs["timeout"] = self.timeout
+        kwargs.setdefault("verify", self.verify)
+        return self.session.post(url, **kwargs)
+
+    def get(self, url, **kwargs):
+        kwargs["timeout"] = self.timeout
+        kwargs.setdefault("verify", self.verify)
+        return self.session.get(url, **kwargs)
+
+    def warm_up(self, connections=1, console=True):
+        """
+        预热：并发建立 connections 个连接并放回连接池
+
+        :param connections: 预建立的连接数（不超过 pool_size）
+        :param console: 交互式打印结果；False 时写入日志（安静模式的 HuifuSDKAPI、常驻服务、批量任务）
+        :return: 成功建立的连接数
+        """
+        import requests
+
+        connections = max(1, min(connections, self.pool_size))
+        succeeded = []
+
+        def connect():
+            try:
+                # 任意响应都说明连接（含TLS握手）已建立；读完响应后连接回到池中
+                self.session.head(self.base_url + "/", timeout=self.timeout, verify=self.verify,
+                                  allow_redirects=False).close()
+                succeeded.append(1)
+            except requests.RequestException as e:
+                if console:
+                    print(f"⚠️ 连接预热失败: {e}")
+                else:
+                    logger.warning("连接预热失败 base_url=%s error=%s", self.base_url, e)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=connect) for _ in range(connections)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if succeeded:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if console:
+                print(f"🔥 已预热 {len(succeeded)} 个连接: {self.base_url}（{elapsed_ms:.0f} ms）")
+            else:
+                logger.info("已预热连接 connections=%d base_url=%s elapsed_ms=%.0f", len(succeeded), self.base_url, elapsed_ms)
+        return len(succeeded)
+
+    def connections_opened(self):
+        """累计新建的连接数（即握手次数，用于观察连接复用情况）"""
+        pools = self.adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def close(self):
+        self.session.close()
+
+
+class _PooledSession:
+    """交给 dg_sdk 的 Session 替身：请求走共享连接池，SDK 挂载的一次性 adapter 被忽略"""
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def post(self, url, **kwargs):
+        return self._pool.post(url, **kwargs)
+
+    def get(self, url, params=None, **kwargs):
+        return self._pool.get(url, params=params, **kwargs)
+
+
+class RequestsShim:
+    """替换 dg_sdk 内部引用的 requests 模块，使 requests.Session() 返回共享连接池"""
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def Session(self):
+        return _PooledSession(self._pool)
+
+    def __getattr__(self, name):
+        import requests
+        return getattr(requests, name)
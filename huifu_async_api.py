@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+汇付支付异步API客户端（asyncio）
+
+与 HuifuSDKAPI 参数、返回值完全一致，可逐个调用点迁移：
+    api = AsyncHuifuAPI()
+    result = await api.aggregate_pay(amount="1.00")
+
+请求构造、签名、响应检查全部复用 HuifuSDKAPI 的同一套逻辑，
+这些步骤（包括订单库查询、打印二维码）和阻塞的网络发送都交给独立的线程池执行，事件循环本身不会被阻塞。
+
+默认使用原生后端（backend="native"），最多 max_concurrency 个请求同时在途：
+新建的 HuifuSDKAPI 的并发窗口上限跟随 max_concurrency（而不是 HUIFU_MAX_CONCURRENCY）；
+传入的 HuifuSDKAPI 保留自己的限流设置，同一商户同一接口的在途请求数不超过它的并发窗口上限。
+dg_sdk 内部使用类级全局状态，SDK 后端的发送在进程内是串行的（网络并发度为 1）：
+传入 SDK 后端的 HuifuSDKAPI 时只是不阻塞事件循环，并发数量再多也不会提高吞吐。
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from huifu_backend import SDKBackend
+from config import get_settings
+from huifu_sdk_api import HuifuSDKAPI
+from order_store import fields_of
+from rate_limit import RequestLimiter
+from single_flight import AsyncSingleFlight
+
+
+class AsyncHuifuAPI:
+    """汇付支付异步API客户端"""
+
+    def __init__(self, api=None, max_concurrency=64, backend="native"):
+        """
+        初始化异步客户端
+
+        :param api: 复用的 HuifuSDKAPI 实例（可选，默认按 backend 新建）
+        :param max_concurrency: 同时在途的网络请求上限（发送线程数；新建 HuifuSDKAPI 时也是并发窗口的上限）
+        :param backend: 新建 HuifuSDKAPI 时的发送后端，默认 native（SDK 后端的发送是串行的）
+        """
+        if api is None:
+            api = HuifuSDKAPI(backend=backend, limiter=self._default_limiter(max_concurrency))
+        else:
+            window = api.limiter.max_concurrency if api.limiter is not None else 0
+            if 0 < window < max_concurrency:
+                api._warn(f"⚠️ 传入客户端的并发窗口上限为 {window}，同一商户同一接口最多 {window} 个请求同时在途"
+                         f"（max_concurrency={max_concurrency}）")
+        self.api = api
+        self.max_concurrency = max_concurrency
+        # SDK 后端经由进程级锁串行发送，线程池只保证不阻塞事件循环
+        self.serialized = isinstance(self.api.backend, SDKBackend)
+        if self.serialized:
+            self.api._say("⚠️ 异步客户端使用 SDK 后端：发送是串行的，需要并发请使用 backend=\"native\"")
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix="huifu-async"
+        )
+        # 同一订单的并发查询合并为一次请求（等待方挂起在同一个 Future 上，不占用发送线程）
+        self.query_flights = AsyncSingleFlight()
+
+    @staticmethod
+    def _default_limiter(max_concurrency):
+        """新建客户端的发送限流：速率与等待时间沿用配置，并发窗口上限为 max_concurrency（配置不限制并发时返回 None）"""
+        settings = get_settings()
+        if settings.HUIFU_MAX_CONCURRENCY <= 0:
+            return None
+        return RequestLimiter(rate=settings.HUIFU_RATE_LIMIT or None, max_concurrency=max_concurrency,
+                              timeout=settings.HUIFU_LIMIT_TIMEOUT)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """关闭发送线程池（等待在途请求完成）"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._executor.shutdown, True)
+
+    async def _run(self, func, *args):
+        """在发送线程池中执行同步步骤（请求构造、响应检查），不阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _checked(self, check, response):
+        """响应检查 + 结果类型转换（在发送线程池中执行）"""
+        return self.api._as_result(check(response))
+
+    async def _post(self, request, extend_infos):
+        """
+        异步发送请求
+
+        :param request: 请求对象（由 HuifuSDKAPI 构造）
+        :param extend_infos: 非必填字段字典
+        :return: 响应字典
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.api._post, request, extend_infos)
+
+    async def _send_with_retry(self, request, extend_infos, confirm=None):
+        """异步发送支付/退款，结果未知或网关未受理时沿用同一流水号重发（见 HuifuSDKAPI._send_with_retry）"""
+        retry = self.api.retry
+        if retry is None:
+            return await self._post(request, extend_infos)
+        return await retry.call_async(lambda: self._post(request, extend_infos), confirm, self.api._on_retry(request))
+
+    async def _confirm_pay(self, request):
+        """结果未知的支付：按请求流水号查询网关是否已受理（见 HuifuSDKAPI._confirm_pay）"""
+        self.api._say(f"\n🔎 支付结果未知，查询网关是否已受理: {request.req_seq_id}")
+        built = await self._run(self.api._build_query_request, request.req_seq_id, request.req_date)
+        if built is None:
+            raise RuntimeError("无法构造确认查询请求")
+        return self.api._confirmed(request, await self._post(*built), "支付（查询结果中没有二维码）")
+
+    async def _confirm_refund(self, request):
+        """结果未知的退款：按退款流水号查询网关是否已受理（见 HuifuSDKAPI._confirm_refund）"""
+        self.api._say(f"\n🔎 退款结果未知，查询网关是否已受理: {request.req_seq_id}")
+        built = await self._run(self.api._build_refund_query_request, request.req_seq_id, request.req_date)
+        if built is None:
+            raise RuntimeError("无法构造退款查询请求")
+        return self.api._confirmed(request, await self._post(*built), "退款")
+
+    async def aggregate_pay(self, amount="1.00", auth_code=None):
+        """
+        聚合正扫支付（支付宝NATIVE扫码支付）- 异步版本
+
+        :param amount: 支付金额（元），默认1.00
+        :param auth_code: 支付授权码（可选，NATIVE支付不需要）
+        :return: 支付结果
+        """
+        request, extend_infos = await self._run(self.api._build_pay_request, amount, auth_code)
+
+        try:
+            response = await self._send_with_retry(request, extend_infos, lambda: self._confirm_pay(request))
+            return await self._run(self._checked, self.api._check_pay_response, response)
+        except Exception as e:
+            self.api._report_exception("SDK调用异常", e)
+            return None
+
+    async def query_order(self, req_seq_id=None, req_date=None, hf_seq_id=None, party_order_id=None):
+        """
+        查询订单状态 - 异步版本
+
+        :param req_seq_id: 请求流水号（可选，但需要至少提供一个标识）
+        :param req_date: 请求日期（YYYYMMDD格式），如果不提供则从req_seq_id中提取
+        :param hf_seq_id: 汇付流水号（推荐使用）
+        :param party_order_id: 商户单号（支付宝/微信订单号）
+        :return: 订单查询结果
+        """
+        try:
+            built = await self._run(self.api._build_query_request, req_seq_id, req_date, hf_seq_id, party_order_id)
+            if built is None:
+                return None
+            request, extend_infos = built
+
+            # 合并键取自构造好的请求（订单库补全后的标识），与同步客户端一致
+            key = self.api.flight_key(*self.api._query_ids(fields_of(request, extend_infos)))
+            response = await self.query_flights.do(key, self._post, request, extend_infos)
+            return await self._run(self._checked, self.api._check_query_response, response)
+        except Exception as e:
+            self.api._report_exception("查询订单异常", e)
+            return None
+
+    async def query_refund(self, req_seq_id, req_date=None):
+        """
+        查询退款状态 - 异步版本
+
+        :param req_seq_id: 退款请求流水号
+        :param req_date: 退款请求日期（YYYYMMDD格式），如果不提供则从流水号中提取
+        :return: 退款查询结果
+        """
+        try:
+            built = await self._run(self.api._build_refund_query_request, req_seq_id, req_date)
+            if built is None:
+                return None
+            response = await self._post(*built)
+            self.api._say(f"  退款查询: [{response.get('resp_code', '')}] 交易状态 {response.get('trans_stat', '')}")
+            return self.api._as_result(response)
+        except Exception as e:
+            self.api._report_exception("查询退款异常", e)
+            return None
+
+    async def wait_for_payment(self, req_seq_id=None, req_date=None, hf_seq_id=None, party_order_id=None, max_wait_time=300, poll_interval=3):
+        """
+        轮询等待支付完成 - 异步版本（等待期间不占用线程）
+
+        参数与 HuifuSDKAPI.wait_for_payment 相同
+
+        :return: 支付结果，如果超时或失败返回None
+        """
+        # 接入异步通知后，轮询只作为兜底
+        if self.api.notify_hub is not None:
+            poll_interval = max(poll_interval, self.api.notify_hub.fallback_poll_interval)
+
+        self.api._say(f"\n开始轮询支付状态...")
+        self.api._say(f"  最大等待时间: {max_wait_time}秒")
+        self.api._say(f"  轮询间隔: {poll_interval}秒")
+
+        start_time = time.time()
+        poll_count = 0
+        interval = poll_interval
+
+        while True:
+            poll_count += 1
+            elapsed_time = time.time() - start_time
+
+            if elapsed_time >= max_wait_time:
+                self.api._say(f"\n⏰ 等待超时（已等待 {int(elapsed_time)} 秒）")
+                return self.api._record_wait(None, poll_count - 1)
+
+            self.api._say(f"\n[第 {poll_count} 次查询] 已等待 {int(elapsed_time)} 秒...")
+            result = await self.query_order(req_seq_id, req_date, hf_seq_id, party_order_id)
+            interval = self.api._next_poll_interval(interval, poll_interval, result)
+
+            if not result:
+                notified = await self._sleep_until_notified(interval, req_seq_id, hf_seq_id, party_order_id)
+                if notified:
+                    return self.api._record_wait(notified, poll_count)
+                continue
+
+            resp_code = result.get("resp_code", "")
+            trans_stat = result.get("trans_stat", "")
+
+            # 如果返回21000000错误，说明参数不足，尝试只使用hf_seq_id
+            if resp_code == "21000000" and hf_seq_id:
+                self.api._say(f"  尝试仅使用汇付流水号查询...")
+                result = await self.query_order(hf_seq_id=hf_seq_id, req_date=req_date)
+                if result:
+                    resp_code = result.get("resp_code", "")
+                    trans_stat = result.get("trans_stat", "")
+
+            if self.api._report_poll_result(result, resp_code, trans_stat):
+                return self.api._record_wait(result, poll_count)
+
+            notified = await self._sleep_until_notified(interval, req_seq_id, hf_seq_id, party_order_id)
+            if notified:
+                return self.api._record_wait(notified, poll_count)
+
+    async def _sleep_until_notified(self, timeout, *identifiers):
+        """
+        等待下一次轮询；接入异步通知时，收到终态通知会立即返回
+
+        :return: 终态通知字典，未收到通知返回 None
+        """
+        hub = self.api.notify_hub
+        if hub is None:
+            await asyncio.sleep(timeout)
+            return None
+        notified = await hub.wait_async(identifiers, timeout)
+        if notified:
+            self.api._say(f"\n📩 收到异步通知")
+            self.api._report_poll_result(notified, "00000000", notified.get("trans_stat", ""))
+        return notified
+
+    async def refund(self, org_req_seq_id=None, org_req_date=None, org_hf_seq_id=None, party_order_id=None, refund_amt="1.00",
+                     req_seq_id=None, req_date=None):
+        """
+        交易退款 - 异步版本
+
+        :param org_req_seq_id: 原交易请求流水号
+        :param org_req_date: 原交易请求日期（YYYYMMDD格式）
+        :param org_hf_seq_id: 原交易汇付流水号（可选）
+        :param party_order_id: 原交易微信/支付宝商户单号（可选）
+        :param refund_amt: 退款金额（元）
+        :param req_seq_id: 退款流水号（可选，重发同一笔退款时传入原流水号）
+        :param req_date: 退款请求日期（可选）
+        :return: 退款结果
+        """
+        built = await self._run(self.api._build_refund_request, org_req_seq_id, org_req_date, org_hf_seq_id, party_order_id,
+                                refund_amt, req_seq_id, req_date)
+        if built is None:
+            return None
+        request, extend_infos = built
+
+        try:
+            response = await self._send_with_retry(request, extend_infos, lambda: self._confirm_refund(request))
+            return await self._run(self._checked, self.api._check_refund_response, response)
+        except Exception as e:
+            self.api._report_exception("SDK调用异常", e)
+            return None
@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+"""
+请求发送后端
+
+HuifuSDKAPI 通过后端构造请求对象并发送，支持两种实现：
+
+- SDKBackend（默认，HUIFU_BACKEND=sdk）：使用 dg_sdk 的 V3TradePayment*Request 对象，
+  签名、序列化、HTTP、验签全部由 SDK 完成
+- NativeBackend（HUIFU_BACKEND=native）：按与 dg_sdk 相同的规则自行完成
+  组装 → 签名 → 序列化 → HTTP → 验签，每一步可观测、可调优：
+    * 请求字段来自预置模板（与 SDK 请求类的必填字段一致）
+    * 使用 key_registry 缓存的密钥对象签名（SDK 每次调用都会重新解析密钥）
+    * 有 orjson 时用 orjson 生成签名原文并解析响应
+    * 复用 http_pool 连接池
+    * 记录每个阶段的耗时
+
+两种后端发出的请求体逐字节一致（python benchmark.py native_pipeline 会校验）。
+"""
+
+import datetime
+import json
+import random
+import threading
+import time
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+# 与 dg_sdk 2.0.10 保持一致的接口地址、必填字段与请求头
+DEFAULT_BASE_URL = "https://api.huifu.com"
+SDK_VERSION = "2.0.10"
+
+ENDPOINTS = {
+    # 名称: (接口路径, 请求对象的必填字段, dg_sdk 请求类名)
+    "jspay": (
+        "/v3/trade/payment/jspay",
+        ("req_date", "req_seq_id", "huifu_id", "goods_desc", "trade_type", "trans_amt"),
+        "V3TradePaymentJspayRequest",
+    ),
+    "scanpay_query": (
+        "/v3/trade/payment/scanpay/query",
+        ("huifu_id", "org_req_date", "out_ord_id", "org_hf_seq_id", "org_req_seq_id"),
+        "V3TradePaymentScanpayQueryRequest",
+    ),
+    "scanpay_refund": (
+        "/v3/trade/payment/scanpay/refund",
+        ("req_date", "req_seq_id", "huifu_id", "ord_amt", "org_req_date"),
+        "V3TradePaymentScanpayRefundRequest",
+    ),
+    "scanpay_refundquery": (
+        "/v3/trade/payment/scanpay/refundquery",
+        ("huifu_id", "org_req_date", "org_hf_seq_id", "org_req_seq_id", "mer_ord_id"),
+        "V3TradePaymentScanpayRefundqueryRequest",
+    ),
+}
+
+STAGES = ("build", "sign", "serialize", "network", "verify")
+
+# dg_sdk 的 ApiRequest 把每次请求的参数、密钥保存在类属性上（build 后再 post），
+# 多线程并发调用会互相覆盖，因此经由 SDK 的发送必须串行
+_SDK_LOCK = threading.Lock()
+
+
+def pop_empty_value(params):
+    """去掉值为 None / '' / {} / [] 的字段（与 dg_sdk.core.param_handler 一致）"""
+    return {k: v for k, v in params.items() if not (v is None or v == '' or v == {} or v == [])}
+
+
+def sort_dict(params):
+    """按key排序第一层，去掉 None 和空列表（与 dg_sdk.core.param_handler.sort_dict 一致）"""
+    result = {}
+    for key in sorted(params):
+        value = params[key]
+        if isinstance(value, list) and not value:
+            continue
+        if value is not None:
+            result[key] = value
+    return result
+
+
+def canonical_json(params):
+    """签名原文：紧凑JSON、不转义中文（与 json.dumps(ensure_ascii=False, separators=(',', ':')) 一致）"""
+    if ORJSON_AVAILABLE and all(type(v) is str for v in params.values()):
+        # 全部为字符串时 orjson 输出与标准库逐字节一致
+        return orjson.dumps(params).decode('utf-8')
+    return json.dumps(params, ensure_ascii=False, separators=(',', ':'))
+
+
+def loads(text):
+    """解析响应JSON"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def generate_mer_order_id():
+    """请求未带 req_seq_id 时自动补全（与 dg_sdk.core.common_util 格式一致）"""
+    timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
+    return timestamp + str(random.randint(100000, 9999999))
+
+
+def endpoint_of(request):
+    """请求对象对应的接口名称（ENDPOINTS 的键），无法识别时返回 None"""
+    endpoint = getattr(request, "_endpoint", None)
+    if endpoint is not None:
+        return endpoint
+    class_name = type(request).__name__
+    for endpoint, (_, _, sdk_class) in ENDPOINTS.items():
+        if sdk_class == class_name:
+            return endpoint
+    return None
+
+
+class SDKBackend:
+    """使用 dg_sdk 发送请求"""
+
+    name = "sdk"
+
+    def __init__(self, merchant, pool=None, base_url=DEFAULT_BASE_URL):
+        """
+        :param merchant: merchant.MerchantConfig（发送时写入 DGClient.mer_config）
+        :param pool: http_pool.HttpPool；提供时 SDK 的请求改走该连接池（SDK 默认每次新建 Session）
+        :param base_url: 网关地址（发送时写入 DGClient.BASE_URL，例如指向本地网关模拟器）
+        """
+        self._modules = None
+        self.merchant = merchant
+        self.pool = pool
+        self.base_url = base_url.rstrip("/")
+        if pool is not None:
+            from http_pool import RequestsShim
+            self._requests_shim = RequestsShim(pool)
+
+    @property
+    def _sdk(self):
+        """dg_sdk 模块（导入约需 0.2 秒，首次创建请求对象时才导入）"""
+        return self._load()[0]
+
+    @property
+    def _api_request(self):
+        return self._load()[1]
+
+    def _load(self):
+        modules = self._modules
+        if modules is None:
+            import dg_sdk
+            from dg_sdk.core import api_request
+            modules = self._modules = (dg_sdk, api_request)
+        return modules
+
+    def supports(self, endpoint):
+        return hasattr(self._sdk, ENDPOINTS[endpoint][2])
+
+    def new_request(self, endpoint):
+        """创建 dg_sdk 请求对象"""
+        return getattr(self._sdk, ENDPOINTS[endpoint][2])()
+
+    def _mer_config(self):
+        """
+        本商户的 dg_sdk.MerConfig（密钥文本取自 key_registry，密钥文件更新后自动生效）
+
+        文档示例：MerConfig(private_key, public_key, sys_id, product_id, huifu_id)
+        但如果报错说参数太多，尝试只传4个：private_key, public_key, sys_id, product_id
+        huifu_id 会在请求对象上单独设置
+        """
+        merchant = self.merchant
+        keys = merchant.keys
+        try:
+            # 先尝试5个参数（按文档）
+            return self._sdk.MerConfig(keys.private_key_pem, keys.public_key_pem,
+                                       merchant.sys_id, merchant.product_id, merchant.huifu_id)
+        except TypeError:
+            # 如果5个参数失败，尝试4个参数
+            return self._sdk.MerConfig(keys.private_key_pem, keys.public_key_pem,
+                                       merchant.sys_id, merchant.product_id)
+
+    def post(self, request, extend_infos):
+        """SDK会自动处理签名、HTTP请求、验签等"""
+        mer_config = self._mer_config()
+        with _SDK_LOCK:
+            # DGClient.mer_config / BASE_URL 是进程全局的，持锁期间切换为本商户配置
+            self._sdk.DGClient.mer_config = mer_config
+            self._sdk.DGClient.BASE_URL = self.base_url
+            if self.pool is None:
+                response = request.post(extend_infos)
+            else:
+                # 仅在持有锁期间替换 SDK 引用的 requests 模块
+                original = self._api_request.requests
+                self._api_request.requests = self._requests_shim
+                try:
+                    response = request.post(extend_infos)
+                finally:
+                    self._api_request.requests = original
+        if not isinstance(response, dict):
+            # 非 200 响应（如限流 429）SDK 原样返回 requests.Response，无法解析的响应返回文本；与原生后端一致改为抛出异常
+            status = getattr(response, "status_code", 200)
+            raise RuntimeError(f"HTTP {status}: {str(getattr(response, 'text', response))[:200]}")
+        return response
+
+
+class NativeRequest:
+    """
+    原生请求对象：与 dg_sdk 请求对象用法相同（逐个设置属性后 post），
+    但只有模板中的必填字段会进入请求报文，其余字段需通过 extend_infos 传递
+    """
+
+    def __init__(self, backend, endpoint):
+        self._backend = backend
+        self._endpoint = endpoint
+        for field in ENDPOINTS[endpoint][1]:
+            setattr(self, field, "")
+
+    def required_params(self):
+        return {field: getattr(self, field) for field in ENDPOINTS[self._endpoint][1]}
+
+    def post(self, extend_infos):
+        return self._backend.post(self, extend_infos)
+
+
+class NativeBackend:
+    """自行完成 组装 → 签名 → 序列化 → HTTP → 验签 的发送后端（线程安全）"""
+
+    name = "native"
+
+    def __init__(self, keys, sys_id, product_id, base_url=DEFAULT_BASE_URL, pool=None):
+        """
+        :param keys: key_registry.KeyRegistry 实例（商户私钥 + 汇付公钥）
+        :param sys_id: 系统号
+        :param product_id: 产品号
+        :param base_url: 网关地址
+        :param pool: http_pool.HttpPool（默认按 base_url 新建）
+        """
+        self.keys = keys
+        self.sys_id = sys_id
+        self.product_id = product_id
+        self.base_url = base_url.rstrip("/")
+        self.headers = {
+            "Content-Type": "application/json;charset=utf-8",
+            "sdk_version": "python_" + SDK_VERSION,
+        }
+        if pool is None:
+            from http_pool import HttpPool
+            pool = HttpPool(self.base_url)
+        self.pool = pool
+
+        # 各阶段累计耗时：stage -> [次数, 总秒数]
+        self._stats_lock = threading.Lock()
+        self._stage_stats = {stage: [0, 0.0] for stage in STAGES}
+        self._local = threading.local()
+
+    def supports(self, endpoint):
+        return endpoint in ENDPOINTS
+
+    def new_request(self, endpoint):
+        """创建原生请求对象"""
+        return NativeRequest(self, endpoint)
+
+    # ------------------------------------------------------------------
+    # 流水线各阶段
+    # ------------------------------------------------------------------
+
+    def build(self, request, extend_infos):
+        """组装请求参数：模板必填字段 + extend_infos，补全流水号/日期，去空值并排序"""
+        params = request.required_params()
+        params.update(extend_infos)
+        if not params.get('req_seq_id'):
+            params['req_seq_id'] = generate_mer_order_id()
+        if not params.get('req_date'):
+            params['req_date'] = datetime.datetime.now().strftime('%Y%m%d')
+        return sort_dict(pop_empty_value(params))
+
+    def sign(self, params):
+        """生成签名原文并用缓存的私钥签名"""
+        return self.keys.sign(canonical_json(params))
+
+    def serialize(self, params, sign):
+        """请求体（与 requests 的 json= 参数序列化结果一致）"""
+        body = {"sys_id": self.sys_id, "product_id": self.product_id, "sign": sign, "data": params}
+        return json.dumps(body, allow_nan=False).encode('utf-8')
+
+    def send(self, endpoint, body):
+        """发送HTTP请求，返回响应文本"""
+        url = self.base_url + ENDPOINTS[endpoint][0]
+        resp = self.pool.post(url, data=body, headers=self.headers)
+        if resp.status_code != 200:
+            raise RuntimeError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+        return resp.text
+
+    def verify(self, text):
+        """解析响应并用汇付公钥验签，返回 data 字典"""
+        resp_json = loads(text)
+        data = resp_json.get('data', '')
+        resp_sign = resp_json.get('sign', '')
+        # 如果没有签名字段，直接返回内容（与 SDK 一致）
+        if not resp_sign:
+            return resp_json
+        if not self.keys.verify(json.dumps(sort_dict(data), ensure_ascii=False, separators=(',', ':')), resp_sign):
+            raise RuntimeError("check signature error: 响应验签失败")
+        return data
+
+    def post(self, request, extend_infos):
+        """
+        执行完整流水线
+
+        :param request: NativeRequest
+        :param extend_infos: 非必填字段字典
+        :return: 响应 data 字典
+        """
+        timings = {}
+        clock = time.perf_counter
+        t0 = clock()
+        params = self.build(request, extend_infos)
+        t1 = clock()
+        sign = self.sign(params)
+        t2 = clock()
+        body = self.serialize(params, sign)
+        t3 = clock()
+        text = self.send(request._endpoint, body)
+        t4 = clock()
+        data = self.verify(text)
+        t5 = clock()
+
+        timings["build"] = t1 - t0
+        timings["sign"] = t2 - t1
+        timings["serialize"] = t3 - t2
+        timings["network"] = t4 - t3
+        timings["verify"] = t5 - t4
+        self._local.timings = timings
+        with self._stats_lock:
+            for stage, seconds in timings.items():
+                entry = self._stage_stats[stage]
+                entry[0] += 1
+                entry[1] += seconds
+        return data
+
+    # ------------------------------------------------------------------
+    # 耗时统计
+    # ------------------------------------------------------------------
+
+    @property
+    def last_timings(self):
+        """当前线程最近一次请求各阶段耗时（秒）"""
+        return getattr(self._local, "timings", {})
+
+    def stage_stats(self):
+        """各阶段平均耗时（毫秒）：{stage: {"count": n, "avg_ms": x}}"""
+        with self._stats_lock:
+            return {
+                stage: {"count": count, "avg_ms": round(total / count * 1000, 3) if count else 0.0}
+                for stage, (count, total) in self._stage_stats.items()
+            }
+
+
+def create_backend(name, merchant=None, base_url=DEFAULT_BASE_URL, pool=None):
+    """
+    按名称创建发送后端
+
+    :param name: "sdk" 或 "native"
+    :param merchant: merchant.MerchantConfig，默认使用 config.py 中的商户
+    :param pool: http_pool.HttpPool（两种后端共用的连接池）
+    :return: 后端实例
+    """
+    if merchant is None:
+        from merchant import default_merchant
+        merchant = default_merchant()
+    if name == "sdk":
+        return SDKBackend(merchant, pool, base_url)
+    if name == "native":
+        return NativeBackend(merchant.keys, merchant.sys_id, merchant.product_id, base_url, pool)
+    raise ValueError(f"未知的发送后端: {name}（可选 sdk / native）")
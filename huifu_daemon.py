@@ -0,0 +1,465 @@
+# -*- coding: utf-8 -*-
+"""
+本地常驻服务（Unix domain socket）
+
+每次运行 main.py / query_order.py / refund_only.py 都要导入SDK、读取并解析密钥、建立新连接，
+然后才发出第一个请求。常驻服务在后台保持一个已初始化的 HuifuSDKAPI（密钥已解析、连接已建立），
+命令行脚本只把 支付/查询/退款 调用转发给它，单次命令的耗时从进程启动时间降为一次本地往返。
+
+- 协议：每行一个JSON。请求 {"method": "query_order", "kwargs": {...}}；
+  服务端先逐行返回调用期间的输出 {"output": "..."}，最后返回 {"result": ...} 或 {"error": "...", "type": "..."}
+- 调用期间 HuifuSDKAPI 打印的内容（请求参数、响应、二维码、轮询进度）实时转发给客户端显示
+- socket 文件权限为 0600，只有启动服务的用户可以发起调用
+- 客户端只连接属于当前用户的 socket（文件类型、属主，支持 SO_PEERCRED 时再核对对端进程的用户），
+  避免其他本地用户抢先创建同名 socket 截获支付/退款参数、返回伪造结果
+- get_api()：常驻服务在运行时返回 DaemonClient，否则在本进程内创建 HuifuSDKAPI（与之前一致）；
+  指定了客户端参数时不转发（常驻服务使用它自己的商户、后端配置）
+
+使用方法：
+    python huifu_daemon.py                  # 前台运行（Ctrl+C 停止）
+    python huifu_daemon.py --status         # 查看是否在运行
+    python huifu_daemon.py --stop           # 停止
+    python query_order.py --id "..."        # 服务运行时自动转发，未运行时在本进程内执行
+
+socket 路径默认读取 HUIFU_DAEMON_SOCKET；设为空字符串则脚本不连接常驻服务。
+"""
+
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+import threading
+
+from config import get_settings
+
+
+# 允许远程调用的方法（"order_store.pending" 表示 api.order_store.pending）
+METHODS = ("aggregate_pay", "query_order", "wait_for_payment", "refund", "resolve_order", "print_qr_code",
+           "order_store.pending")
+
+# 连接常驻服务的超时（秒）：服务未运行时应立即回退到本进程内执行
+CONNECT_TIMEOUT = 0.5
+
+
+class DaemonError(Exception):
+    """常驻服务中执行调用时抛出的异常（type 为原异常类名）"""
+
+    def __init__(self, message, type_name="Exception"):
+        super().__init__(message)
+        self.type = type_name
+
+
+class _ThreadOutput:
+    """
+    按线程转发的标准输出
+
+    常驻服务同时处理多个连接，contextlib.redirect_stdout 是进程全局的不能使用；
+    这里替换 sys.stdout，正在处理调用的线程写入的内容按行发给对应的客户端，其他线程照常输出。
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def bind(self, send):
+        """当前线程的输出改为 send(text)；send=None 恢复"""
+        self._local.send = send
+        self._local.buffer = []
+
+    def write(self, text):
+        send = getattr(self._local, "send", None)
+        if send is None:
+            return self._stream.write(text)
+        buffer = self._local.buffer
+        buffer.append(text)
+        if "\n" in text:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        send = getattr(self._local, "send", None)
+        if send is None:
+            return self._stream.flush()
+        if self._local.buffer:
+            send("".join(self._local.buffer))
+            self._local.buffer = []
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _encode(message):
+    return (json.dumps(message, ensure_ascii=False, default=_jsonable) + "\n").encode("utf-8")
+
+
+def _jsonable(value):
+    """OrderRecord（HUIFU_RECORDS=1）按字典返回给客户端，其他对象转为字符串"""
+    to_dict = getattr(value, "to_dict", None)
+    return to_dict() if to_dict is not None else str(value)
+
+
+def check_socket_owner(path):
+    """
+    确认 socket 文件由当前用户创建（连接前调用）
+
+    :raises PermissionError: 不是 socket 文件或属于其他用户
+    """
+    info = os.lstat(path)
+    if not stat.S_ISSOCK(info.st_mode):
+        raise PermissionError(f"不是 socket 文件: {path}")
+    if info.st_uid != os.getuid():
+        raise PermissionError(f"socket 属于其他用户（uid {info.st_uid}）: {path}")
+
+
+def check_peer(sock):
+    """
+    确认已连接的对端进程属于当前用户（Linux SO_PEERCRED；其他平台只依赖连接前的属主检查）
+
+    :raises PermissionError: 对端进程属于其他用户
+    """
+    peercred = getattr(socket, "SO_PEERCRED", None)
+    if peercred is None:
+        return
+    _, uid, _ = struct.unpack("3i", sock.getsockopt(socket.SOL_SOCKET, peercred, struct.calcsize("3i")))
+    if uid != os.getuid():
+        raise PermissionError(f"常驻服务进程属于其他用户（uid {uid}）")
+
+
+def default_socket_path():
+    """HUIFU_DAEMON_SOCKET（空字符串表示不使用常驻服务）"""
+    return get_settings().HUIFU_DAEMON_SOCKET
+
+
+class HuifuDaemon:
+    """在 Unix socket 上提供已初始化的 HuifuSDKAPI"""
+
+    def __init__(self, api=None, socket_path=None):
+        """
+        :param api: HuifuSDKAPI 实例，默认按 config 创建
+        :param socket_path: socket 文件路径，默认 HUIFU_DAEMON_SOCKET
+        """
+        if not hasattr(socket, "AF_UNIX"):
+            raise RuntimeError("当前平台不支持 Unix domain socket，无法启动常驻服务")
+        if api is None:
+            from huifu_sdk_api import HuifuSDKAPI
+            api = HuifuSDKAPI()
+        self.api = api
+        self.socket_path = socket_path or default_socket_path()
+        if not self.socket_path:
+            raise ValueError("未配置 socket 路径（HUIFU_DAEMON_SOCKET）")
+        self.calls = 0
+        self._server = None
+        self._thread = None
+        self._output = None
+
+    def warm_up(self):
+        """提前完成首个请求前的准备：解析密钥、导入 dg_sdk（SDK 后端）"""
+        keys = self.api.merchant.keys
+        try:
+            keys.private_key
+            keys.public_key
+        except (FileNotFoundError, ValueError) as e:
+            print(f"⚠️ 密钥未能预先加载: {e}")
+        if self.api.backend.name == "sdk":
+            # 导入 dg_sdk 并确认下单接口可用（接口名见 huifu_backend.ENDPOINTS）
+            self.api.backend.supports("jspay")
+
+    def _resolve(self, method):
+        if method not in METHODS:
+            raise DaemonError(f"不支持的方法: {method}", "ValueError")
+        target = self.api
+        for name in method.split("."):
+            target = getattr(target, name) if target is not None else None
+        if target is None:
+            raise DaemonError(f"常驻服务未启用: {method.split('.')[0]}", "RuntimeError")
+        return target
+
+    def handle(self, message, send):
+        """
+        执行一次调用
+
+        :param message: {"method": ..., "kwargs": {...}}
+        :param send: 发送一行消息（dict）给客户端
+        """
+        method = message.get("method")
+        if method == "ping":
+            send({"result": {"pid": os.getpid(), "calls": self.calls, "huifu_id": self.api.huifu_id,
+                             "backend": self.api.backend.name, "order_store": self.api.order_store is not None}})
+            return
+        if method == "shutdown":
+            send({"result": True})
+            threading.Thread(target=self.stop, daemon=True).start()
+            return
+
+        def forward(text):
+            try:
+                send({"output": text})
+            except OSError:
+                pass   # 客户端已断开：调用照常完成，输出丢弃
+
+        self.calls += 1
+        self._output.bind(forward)
+        try:
+            result = self._resolve(method)(**(message.get("kwargs") or {}))
+        except DaemonError as e:
+            response = {"error": str(e), "type": e.type}
+        except Exception as e:
+            response = {"error": str(e), "type": type(e).__name__}
+        else:
+            response = {"result": result}
+        finally:
+            self._output.flush()
+            self._output.bind(None)
+        send(response)
+
+    def _serve_connection(self, conn):
+        lock = threading.Lock()
+
+        def send(message):
+            with lock:
+                conn.sendall(_encode(message))
+
+        with conn, conn.makefile("rb") as reader:
+            for line in reader:
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    send({"error": "无效的请求（需要一行JSON）", "type": "ValueError"})
+                    continue
+                self.handle(message, send)
+
+    def _bind(self):
+        """绑定 socket 文件；已有服务在运行时报错，残留的 socket 文件直接删除"""
+        if os.path.exists(self.socket_path):
+            if ping(self.socket_path) is not None:
+                raise RuntimeError(f"常驻服务已在运行: {self.socket_path}")
+            os.unlink(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # 先收紧 umask 再绑定：socket 文件从创建起就只有当前用户可以连接
+        umask = os.umask(0o177)
+        try:
+            server.bind(self.socket_path)
+        finally:
+            os.umask(umask)
+        server.listen(64)
+        return server
+
+    def start(self):
+        """在后台线程中开始服务，返回 self"""
+        self._server = self._bind()
+        if not isinstance(sys.stdout, _ThreadOutput):
+            sys.stdout = _ThreadOutput(sys.stdout)
+        self._output = sys.stdout
+        self._thread = threading.Thread(target=self._accept_loop, name="huifu-daemon", daemon=True)
+        self._thread.start()
+        return self
+
+    def _accept_loop(self):
+        server = self._server
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return   # stop() 关闭了监听 socket
+            threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def serve_forever(self):
+        if self._thread is None:
+            self.start()
+        self._thread.join()
+
+    def stop(self):
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        server.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class DaemonClient:
+    """
+    常驻服务的客户端：用法与 HuifuSDKAPI 相同（api.query_order(...)、api.refund(...) 等）
+
+    调用期间服务端的输出实时打印到本进程的标准输出。一个客户端对象使用一个连接，不要跨线程共用。
+    """
+
+    def __init__(self, socket_path=None, timeout=None):
+        """
+        :param socket_path: socket 文件路径，默认 HUIFU_DAEMON_SOCKET
+        :param timeout: 连接超时（秒），默认 CONNECT_TIMEOUT；调用本身不限时（wait_for_payment 可能等待数分钟）
+        """
+        self.socket_path = socket_path or default_socket_path()
+        check_socket_owner(self.socket_path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(CONNECT_TIMEOUT if timeout is None else timeout)
+        try:
+            self._sock.connect(self.socket_path)
+            check_peer(self._sock)
+        except OSError:
+            self._sock.close()
+            raise
+        self._sock.settimeout(None)
+        self._reader = self._sock.makefile("rb")
+        self.info = self.call("ping")
+        self.huifu_id = self.info["huifu_id"]
+        self.order_store = _RemoteOrderStore(self) if self.info.get("order_store") else None
+
+    def call(self, method, **kwargs):
+        """
+        在常驻服务中执行 api.<method>(**kwargs)
+
+        :return: 调用结果（JSON 可表示的值）
+        :raises DaemonError: 服务端执行时抛出异常
+        """
+        self._sock.sendall(_encode({"method": method, "kwargs": kwargs}))
+        while True:
+            line = self._reader.readline()
+            if not line:
+                raise ConnectionError("常驻服务已断开连接")
+            message = json.loads(line)
+            if "output" in message:
+                sys.stdout.write(message["output"])
+                continue
+            sys.stdout.flush()
+            if "error" in message:
+                raise DaemonError(message["error"], message.get("type", "Exception"))
+            return message.get("result")
+
+    def __getattr__(self, name):
+        if name in METHODS:
+            return lambda **kwargs: self.call(name, **kwargs)
+        raise AttributeError(name)
+
+    def aggregate_pay(self, amount="1.00", auth_code=None):
+        return self.call("aggregate_pay", amount=amount, auth_code=auth_code)
+
+    def print_qr_code(self, url):
+        return self.call("print_qr_code", url=url)
+
+    def resolve_order(self, identifier):
+        return self.call("resolve_order", identifier=identifier)
+
+    def close(self):
+        self._reader.close()
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _RemoteOrderStore:
+    """常驻服务中的本地订单库（只提供脚本用到的查询）"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def pending(self, kind="pay", limit=100):
+        return self._client.call("order_store.pending", kind=kind, limit=limit)
+
+
+def connect(socket_path=None):
+    """
+    连接常驻服务
+
+    :return: DaemonClient；未配置、不支持 Unix socket、服务未运行或 socket 不属于当前用户时返回 None
+    """
+    socket_path = socket_path if socket_path is not None else default_socket_path()
+    if not socket_path or not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+    try:
+        return DaemonClient(socket_path)
+    except PermissionError as e:
+        print(f"⚠️ 忽略不可信的常驻服务: {e}", file=sys.stderr)
+        return None
+    except (OSError, ValueError):
+        return None
+
+
+def ping(socket_path=None):
+    """常驻服务的状态（pid、已处理调用数等），未运行时返回 None"""
+    client = connect(socket_path)
+    if client is None:
+        return None
+    with client:
+        return client.info
+
+
+def get_api(socket_path=None, **kwargs):
+    """
+    命令行脚本使用的客户端：常驻服务在运行时转发给它，否则在本进程内创建 HuifuSDKAPI
+
+    :param kwargs: 传给 HuifuSDKAPI；指定了参数时不转发给常驻服务（常驻服务使用它自己的配置），总在本进程内创建
+    """
+    if kwargs:
+        path = socket_path if socket_path is not None else default_socket_path()
+        if path and os.path.exists(path):
+            print("ℹ️ 指定了客户端参数，不转发给常驻服务（常驻服务使用它自己的配置）")
+        client = None
+    else:
+        client = connect(socket_path)
+    if client is not None:
+        print(f"⚡ 已连接常驻服务: {client.socket_path}（pid {client.info['pid']}）")
+        return client
+    from huifu_sdk_api import HuifuSDKAPI
+    return HuifuSDKAPI(**kwargs)
+
+
+def main():
+    """命令行启动/查看/停止常驻服务"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="汇付客户端本地常驻服务（Unix domain socket）")
+    parser.add_argument("--socket", default=None, help="socket 文件路径（默认 HUIFU_DAEMON_SOCKET）")
+    parser.add_argument("--status", action="store_true", help="查看常驻服务是否在运行")
+    parser.add_argument("--stop", action="store_true", help="停止常驻服务")
+    parser.add_argument("--warm-up", type=int, default=None, help="启动时预建立的网关连接数（默认 HUIFU_HTTP_WARM_UP）")
+    args = parser.parse_args()
+    socket_path = args.socket or default_socket_path()
+
+    if args.status or args.stop:
+        client = connect(socket_path)
+        if client is None:
+            print(f"常驻服务未运行: {socket_path}")
+            sys.exit(1)
+        with client:
+            if args.stop:
+                client.call("shutdown")
+                print(f"✅ 常驻服务已停止（pid {client.info['pid']}）")
+            else:
+                info = client.info
+                print(f"✅ 常驻服务运行中: {socket_path}")
+                print(f"   pid: {info['pid']}  商户号: {info['huifu_id']}  发送后端: {info['backend']}  已处理调用: {info['calls']}")
+        return
+
+    from huifu_sdk_api import HuifuSDKAPI
+
+    daemon = HuifuDaemon(HuifuSDKAPI(warm_up=args.warm_up), socket_path)
+    daemon.warm_up()
+    daemon.start()
+    print(f"✅ 常驻服务已启动: {socket_path}（pid {os.getpid()}）")
+    print("   main.py / query_order.py / refund_only.py 将自动转发到此服务，Ctrl+C 停止")
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        daemon.stop()
+    print("\n常驻服务已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,62 +8,159 @@ SDK名称: dg-sdk
 import json
 import time
 from datetime import datetime
+from importlib.util import find_spec
 
-try:
-    import dg_sdk
-    SDK_AVAILABLE = True
-except ImportError:
-    SDK_AVAILABLE = False
-    print("警告: 汇付SDK未安装，请运行: pip install dg-sdk==v2.0.10")
+# dg_sdk（连同 requests、pycryptodome 等）导入较慢，这里只检查是否安装，SDK 后端首次发送时才导入
+# （qrcode 同样在首次打印二维码时才导入，见 qr_render.py）
+SDK_AVAILABLE = find_spec("dg_sdk") is not None
 
-try:
-    import qrcode
-    QRCODE_AVAILABLE = True
-except ImportError:
-    QRCODE_AVAILABLE = False
-
-from config import *
+from circuit_breaker import CircuitBreaker, CircuitOpen
+from config import get_settings
+from api_log import log_request, logger, setup_logging
+from hedging import QueryHedger
+from http_pool import HttpPool
+from huifu_backend import create_backend, endpoint_of
+from merchant import default_merchant
+from metrics import default_metrics, start_http_server
+from order_store import fields_of, get_store
+from qr_render import QRCODE_AVAILABLE, render_terminal
+from query_cache import QueryCache
+from rate_limit import RequestLimiter
+from records import OrderRecord
+from retry import REASONS, RetryPolicy
+from single_flight import SingleFlight
+from seq_id import get_generator, req_date_of
 
 
 class HuifuSDKAPI:
     """汇付支付SDK API客户端"""
     
-    def __init__(self):
-        """初始化SDK客户端"""
-        if not SDK_AVAILABLE:
+    def __init__(self, backend=None, http_pool=None, warm_up=None, merchant=None, order_store=None, query_cache=None,
+                 quiet=None, metrics=None, base_url=None, limiter=None, breaker=None, hedge=None,
+                 retry=None, records=None):
+        """
+        初始化SDK客户端
+        
+        :param backend: 发送后端，"sdk"（dg_sdk）或 "native"（原生流水线），默认读取 HUIFU_BACKEND
+        :param http_pool: 网关连接池（http_pool.HttpPool），默认按 config 中的 HUIFU_HTTP_* 配置创建
+        :param warm_up: 初始化时预建立的连接数，默认读取 HUIFU_HTTP_WARM_UP（0 不预热）
+        :param merchant: 商户配置（merchant.MerchantConfig），默认使用 config.py / 环境变量中的商户
+        :param order_store: 本地订单库（order_store.OrderStore），默认按 HUIFU_ORDER_STORE 打开，传 False 不记录
+        :param query_cache: 查询结果缓存（query_cache.QueryCache），默认按 HUIFU_QUERY_CACHE_* 创建，传 False 不缓存
+        :param quiet: 安静模式（不打印请求/响应，每个请求记录一行JSON日志，见 api_log.py），默认读取 HUIFU_QUIET
+        :param metrics: 请求指标（metrics.RequestMetrics），默认记录到进程内共用的指标，传 False 不记录
+        :param base_url: 网关地址，默认读取 HUIFU_BASE_URL（可指向本地网关模拟器，见 gateway_simulator.py）
+        :param limiter: 发送限流（rate_limit.RequestLimiter），默认按 HUIFU_RATE_LIMIT / HUIFU_MAX_CONCURRENCY 创建，传 False 不限流
+        :param breaker: 熔断（circuit_breaker.CircuitBreaker），默认按 HUIFU_BREAKER_* 创建，传 False 不熔断
+        :param hedge: 订单查询对冲（hedging.QueryHedger），传 True 或 HUIFU_QUERY_HEDGE=1 时按默认参数创建，默认不对冲
+        :param retry: 支付/退款重试（retry.RetryPolicy），默认按 HUIFU_RETRY_* 创建，传 False 不重试
+        :param records: 结果类型，False 返回响应字典（默认，读取 HUIFU_RECORDS），True 返回 records.OrderRecord，
+                        "raw" 返回同时保留原始响应的 OrderRecord
+        """
+        settings = get_settings()
+        
+        # 交互式输出；安静模式下改为结构化日志（后台线程写出）
+        self.console = not (settings.HUIFU_QUIET if quiet is None else quiet)
+        if not self.console:
+            setup_logging(settings.HUIFU_LOG_LEVEL, settings.HUIFU_LOG_FILE or None)
+        
+        backend = backend or settings.HUIFU_BACKEND
+        if backend == "sdk" and not SDK_AVAILABLE:
             raise ImportError("汇付SDK未安装，请运行: pip install dg-sdk==v2.0.10")
         
-        self.huifu_id = HUIFU_ID
-        self.sys_id = SYS_ID
-        self.product_id = PRODUCT_ID
-        self.user_id = USER_ID
+        # 每个实例持有自己的商户配置，同一进程内的多个商户互不影响
+        self.merchant = merchant or default_merchant()
+        self.huifu_id = self.merchant.huifu_id
+        self.sys_id = self.merchant.sys_id
+        self.product_id = self.merchant.product_id
+        self.user_id = self.merchant.user_id
         
-        # 根据文档初始化SDK
-        # 使用 dg_sdk.MerConfig 配置商户参数（位置参数）
-        # 文档示例：MerConfig(private_key, public_key, sys_id, product_id, huifu_id)
-        # 但如果报错说参数太多，尝试只传4个：private_key, public_key, sys_id, product_id
-        # huifu_id 会在请求对象上单独设置
-        try:
-            # 先尝试5个参数（按文档）
-            dg_sdk.DGClient.mer_config = dg_sdk.MerConfig(
-                PRIVATE_KEY,
-                HUIFU_PUBLIC_KEY,
-                SYS_ID,
-                PRODUCT_ID,
-                HUIFU_ID
-            )
-        except TypeError:
-            # 如果5个参数失败，尝试4个参数
-            dg_sdk.DGClient.mer_config = dg_sdk.MerConfig(
-                PRIVATE_KEY,
-                HUIFU_PUBLIC_KEY,
-                SYS_ID,
-                PRODUCT_ID
+        # 请求流水号生成器（节点号按租约领取，跨线程/进程唯一；多机部署请为每台主机配置 HUIFU_WORKER_ID 范围；同一用户ID的实例共用）
+        self.seq_generator = get_generator(self.user_id)
+        
+        # 异步通知分发中心（notify_server.NotifyHub），接入后 wait_for_payment 由通知直接唤醒
+        self.notify_hub = None
+        
+        # 网关连接池：长连接复用，避免每次请求重新握手
+        self.base_url = base_url or settings.HUIFU_BASE_URL
+        if http_pool is None:
+            http_pool = HttpPool(
+                self.base_url,
+                pool_size=settings.HUIFU_HTTP_POOL_SIZE,
+                connect_timeout=settings.HUIFU_CONNECT_TIMEOUT,
+                read_timeout=settings.HUIFU_READ_TIMEOUT,
             )
+        self.http_pool = http_pool
+        
+        # 发送后端：组装 → 签名 → HTTP → 验签
+        # SDK 后端在发送时才把本商户配置写入 dg_sdk.DGClient.mer_config（见 huifu_backend.SDKBackend）
+        self.backend = create_backend(backend, merchant=self.merchant, base_url=self.base_url, pool=self.http_pool)
+        
+        # 本地订单库：记录每笔支付/退款的请求与响应，退款、查询时按任意一个订单标识补全原交易
+        if order_store is None and settings.HUIFU_ORDER_STORE:
+            order_store = get_store(settings.HUIFU_ORDER_STORE)
+        self.order_store = order_store or None
+        
+        # 查询结果缓存：S/F/C 状态的订单不再重复查询网关，P 状态短时间缓存
+        if query_cache is None and settings.HUIFU_QUERY_CACHE_MB > 0:
+            query_cache = QueryCache(int(settings.HUIFU_QUERY_CACHE_MB * 1024 * 1024), settings.HUIFU_QUERY_CACHE_PENDING_TTL)
+        self.query_cache = query_cache or None
+        
+        # 同一订单的并发查询合并为一次网关请求
+        self.query_flights = SingleFlight()
+        
+        # 请求指标：各接口各阶段耗时、响应码/交易状态计数（Prometheus 文本格式，见 metrics.py）
+        if metrics is None:
+            metrics = default_metrics()
+            if settings.HUIFU_METRICS_PORT:
+                start_http_server(settings.HUIFU_METRICS_PORT, metrics=metrics)
+        self.metrics = metrics or None
         
-        print("✅ 汇付SDK已初始化")
-        print(f"   商户号: {HUIFU_ID}")
-        print(f"   系统号: {SYS_ID}")
+        # 发送限流：按 (商户号, 接口) 的令牌桶 + 自适应并发窗口，网关限流或变慢时自动降低并发
+        if limiter is None and (settings.HUIFU_RATE_LIMIT > 0 or settings.HUIFU_MAX_CONCURRENCY > 0):
+            limiter = RequestLimiter(rate=settings.HUIFU_RATE_LIMIT or None, max_concurrency=settings.HUIFU_MAX_CONCURRENCY,
+                                     timeout=settings.HUIFU_LIMIT_TIMEOUT)
+        self.limiter = limiter or None
+        
+        # 熔断：网关明显不可用时立即失败，不再堆积等待超时的线程
+        if breaker is None and settings.HUIFU_BREAKER_FAILURES > 0:
+            breaker = CircuitBreaker(settings.HUIFU_BREAKER_FAILURES, settings.HUIFU_BREAKER_RESET)
+        self.breaker = breaker or None
+        
+        # 查询对冲：只用于幂等的订单查询，支付/退款绝不重复发送
+        # （SDK 后端的发送是串行的，对冲请求要等第一次请求结束，只有原生后端能从中获益）
+        if hedge is None:
+            hedge = settings.HUIFU_QUERY_HEDGE
+        if hedge is True:
+            # 发送线程够同一商户并发窗口内的查询各发一次对冲，窗口占满时也不必排队
+            window = self.limiter.max_concurrency if self.limiter is not None else 0
+            hedge = QueryHedger(max_workers=max(16, 2 * window))
+        self.hedger = hedge or None
+        
+        # 支付/退款重试：结果未知或网关未受理时沿用同一流水号重发，不会重复扣款/退款
+        if retry is None and settings.HUIFU_RETRY_ATTEMPTS > 1:
+            retry = RetryPolicy(settings.HUIFU_RETRY_ATTEMPTS, retry_codes=settings.HUIFU_RETRY_CODES,
+                                not_found_codes=settings.HUIFU_RETRY_NOT_FOUND_CODES,
+                                duplicate_codes=settings.HUIFU_RETRY_DUPLICATE_CODES)
+        self.retry = retry or None
+        
+        # 结果类型：长时间运行的轮询、对账用紧凑的 OrderRecord 代替响应字典
+        if records is None:
+            records = {"1": True, "raw": "raw"}.get(settings.HUIFU_RECORDS, False)
+        self.records = records
+        
+        if self.console:
+            print("✅ 汇付SDK已初始化")
+            print(f"   商户号: {self.huifu_id}")
+            print(f"   系统号: {self.sys_id}")
+            if backend != "sdk":
+                print(f"   发送后端: {backend}")
+        else:
+            logger.info("汇付SDK已初始化 huifu_id=%s sys_id=%s backend=%s", self.huifu_id, self.sys_id, backend)
+        
+        warm_up = settings.HUIFU_HTTP_WARM_UP if warm_up is None else warm_up
+        if warm_up:
+            self.http_pool.warm_up(warm_up, console=self.console)
     
     def print_qr_code(self, url):
         """
@@ -76,24 +173,9 @@ class HuifuSDKAPI:
         
         if QRCODE_AVAILABLE:
             try:
-                # 创建二维码对象
-                qr = qrcode.QRCode(
-                    version=1,
-                    error_correction=qrcode.constants.ERROR_CORRECT_L,
-                    box_size=1,
-                    border=1,
-                )
-                qr.add_data(url)
-                qr.make(fit=True)
-                
-                # 生成矩阵，使用两个半角字符确保可扫描
-                matrix = qr.get_matrix()
+                # 编码结果按链接缓存；半块字符每行显示两行模块（见 qr_render.py）
                 print()  # 空行
-                for row in matrix:
-                    # 使用两个半角字符表示一个模块
-                    line = ''.join(['██' if cell else '  ' for cell in row])
-                    print(line)
-                
+                print(render_terminal(url))
                 print()  # 空行
                 
                 print("="*60)
@@ -110,31 +192,53 @@ class HuifuSDKAPI:
     def generate_req_seq_id(self, prefix="PAY"):
         """
         生成请求流水号
-        格式: 用户ID_日期_时间戳_前缀
+        格式: 用户ID_日期_当日毫秒+节点号+序号_前缀（详见 seq_id.py）
         """
-        date_str = datetime.now().strftime("%Y%m%d")
-        timestamp = str(int(time.time() * 1000))[-6:]
-        req_seq_id = f"{self.user_id}_{date_str}_{timestamp}_{prefix}"
-        return req_seq_id
+        return self.seq_generator.next_id(prefix)
     
-    def aggregate_pay(self, amount="1.00", auth_code=None):
+    def _say(self, *args):
+        """交互式输出（安静模式下不输出）"""
+        if self.console:
+            print(*args)
+    
+    def _warn(self, message):
+        """参数错误等提示：交互式打印，安静模式记录 WARNING 日志"""
+        if self.console:
+            print(message)
+        else:
+            logger.warning(message)
+    
+    def _report_exception(self, title, error):
+        """调用异常：交互式打印调用栈；安静模式下请求日志已记录异常，调用栈只在 DEBUG 级别记录"""
+        if isinstance(error, CircuitOpen):
+            # 熔断是预期内的快速失败，不打印调用栈
+            self._warn(f"⚡ {title}: {error}")
+            return
+        if self.console:
+            print(f"\n❌ {title}: {str(error)}")
+            import traceback
+            traceback.print_exc()
+        else:
+            logger.debug(title, exc_info=error)
+    
+    def _build_pay_request(self, amount="1.00", auth_code=None):
         """
-        聚合正扫支付（支付宝NATIVE扫码支付）- 使用dg-sdk
+        构造聚合正扫请求对象（同步/异步客户端共用）
         
-        :param amount: 支付金额（元），默认1.00
+        :param amount: 支付金额（元）
         :param auth_code: 支付授权码（可选，NATIVE支付不需要）
-        :return: 支付结果
+        :return: (request, extend_infos)
         """
-        print("\n" + "="*50)
-        print("开始执行聚合正扫支付（支付宝NATIVE扫码支付）...")
-        print("="*50)
+        self._say("\n" + "="*50)
+        self._say("开始执行聚合正扫支付（支付宝NATIVE扫码支付）...")
+        self._say("="*50)
         
         # 生成请求流水号
         req_seq_id = self.generate_req_seq_id("PAY")
-        req_date = datetime.now().strftime("%Y%m%d")
+        req_date = req_date_of(req_seq_id)  # 与流水号中的日期保持一致（跨零点时不会错开）
         
         # 根据文档，使用对象方法：创建请求对象
-        request = dg_sdk.V3TradePaymentJspayRequest()
+        request = self.backend.new_request("jspay")
         
         # 设置请求参数
         request.req_seq_id = req_seq_id
@@ -148,148 +252,424 @@ class HuifuSDKAPI:
         if auth_code:
             request.auth_code = auth_code
         
-        print(f"\n请求参数:")
-        print(f"  req_seq_id: {req_seq_id}")
-        print(f"  请求日期: {req_date}")
-        print(f"  商户号: {self.huifu_id}")
-        print(f"  交易类型: A_NATIVE (支付宝NATIVE扫码支付)")
-        print(f"  支付金额: {amount} 元")
-        if auth_code:
-            print(f"  授权码: {auth_code} (已提供，但NATIVE支付不需要)")
+        if self.console:
+            print(f"\n请求参数:")
+            print(f"  req_seq_id: {req_seq_id}")
+            print(f"  请求日期: {req_date}")
+            print(f"  商户号: {self.huifu_id}")
+            print(f"  交易类型: A_NATIVE (支付宝NATIVE扫码支付)")
+            print(f"  支付金额: {amount} 元")
+            if auth_code:
+                print(f"  授权码: {auth_code} (已提供，但NATIVE支付不需要)")
+            else:
+                print(f"  授权码: 无需（NATIVE支付会返回二维码）")
+        
+        # extend_infos 是所有非必填字段字典，如果不需要可传空字典
+        extend_infos = {}  # 空字典表示没有非必填字段
+        return request, extend_infos
+    
+    def _check_pay_response(self, response):
+        """
+        分析聚合正扫响应（同步/异步客户端共用）
+        
+        :param response: SDK返回的响应字典
+        :return: 原样返回响应
+        """
+        if not self.console:
+            return response
+        
+        print(f"\n响应结果:")
+        print(json.dumps(response, indent=2, ensure_ascii=False))
+        
+        # 检查响应（汇付响应码：0000开头表示成功）
+        resp_code = response.get("resp_code", "")
+        resp_desc = response.get("resp_desc", "")
+        trans_stat = response.get("trans_stat", "")
+        
+        print(f"\n响应分析:")
+        print(f"  响应码: {resp_code}")
+        print(f"  响应描述: {resp_desc}")
+        print(f"  交易状态: {trans_stat}")
+        
+        # 检查是否有二维码（需要用户扫码支付）
+        qr_code = response.get("qr_code", "")
+        if qr_code:
+            # 在终端显示二维码
+            self.print_qr_code(qr_code)
+        
+        # 判断交易状态
+        # P = 处理中, S = 成功, F = 失败, C = 关闭
+        if trans_stat == "S":
+            print("\n✅ 支付成功！（交易已完成）")
+            print(f"   汇付流水号: {response.get('hf_seq_id', 'N/A')}")
+        elif trans_stat == "P":
+            # 订单处理中，直接返回响应
+            pass
+        elif resp_code.startswith("0000"):
+            print("\n✅ 下单成功！")
+            print(f"   汇付流水号: {response.get('hf_seq_id', 'N/A')}")
+            if trans_stat:
+                print(f"   交易状态: {trans_stat} (需要等待支付完成)")
         else:
-            print(f"  授权码: 无需（NATIVE支付会返回二维码）")
+            error_code = resp_code or "未知"
+            error_msg = resp_desc or "未知错误"
+            print(f"\n❌ 支付失败: [{error_code}] {error_msg}")
+        return response
+    
+    def _post(self, request, extend_infos):
+        """
+        发送请求（所有接口的唯一出口）
+        
+        由发送后端完成签名、HTTP请求、验签等（见 huifu_backend.py）
+        
+        :param request: backend.new_request() 创建的请求对象
+        :param extend_infos: 非必填字段字典
+        :return: 响应字典
+        """
+        endpoint = endpoint_of(request)
+        fields = fields_of(request, extend_infos)
         
+        if endpoint != "scanpay_query":
+            return self._send(endpoint, fields, request, extend_infos)
+        
+        # 已结束的订单直接使用缓存的查询结果，不再请求网关
+        ids = self._query_ids(fields)
+        if self.query_cache is not None:
+            cached = self.query_cache.get(*ids)
+            if cached is not None:
+                self._say("  （使用缓存的查询结果）")
+                return cached
+        
+        # 同一订单的并发查询只发送一次，其余调用方共享结果；启用对冲时慢请求由对冲请求兜底
+        if self.hedger is not None:
+            return self.query_flights.do(self.flight_key(*ids), self.hedger.call,
+                                         self._send, endpoint, fields, request, extend_infos)
+        return self.query_flights.do(self.flight_key(*ids), self._send, endpoint, fields, request, extend_infos)
+    
+    def _send(self, endpoint, fields, request, extend_infos):
+        """经由发送后端发送，并写入订单库、查询缓存"""
+        # 接口熔断中立即失败（CircuitOpen），请求不会发出
+        breaker = self.breaker
+        if breaker is not None:
+            breaker.allow(endpoint)
+        # 再取得发送许可（可能等待；截止时间内拿不到时抛出 LimitExceeded，请求不会发出）
+        limiter = self.limiter
+        permit = limiter.acquire(self.huifu_id, endpoint) if limiter is not None else None
+        # 发送前先记录请求并等待落库：进程在发送后立即退出（包括崩溃），重启后仍能查到这笔订单
+        store = self.order_store
+        if store is not None:
+            try:
+                store.record_request(endpoint, fields)
+            except Exception:
+                # 没有落库就不发送（OrderStoreError）
+                if permit is not None:
+                    permit.release(False, completed=False)
+                raise
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.begin(endpoint)
+        start = time.perf_counter()
         try:
-            # 根据文档，调用 request.post() 发送请求
-            # extend_infos 是所有非必填字段字典，如果不需要可传空字典
-            extend_infos = {}  # 空字典表示没有非必填字段
-            # SDK会自动处理签名、HTTP请求、验签等
-            response = request.post(extend_infos)
-            
-            print(f"\n响应结果:")
-            print(json.dumps(response, indent=2, ensure_ascii=False))
-            
-            # 检查响应（汇付响应码：0000开头表示成功）
-            resp_code = response.get("resp_code", "")
-            resp_desc = response.get("resp_desc", "")
-            trans_stat = response.get("trans_stat", "")
-            
-            print(f"\n响应分析:")
-            print(f"  响应码: {resp_code}")
-            print(f"  响应描述: {resp_desc}")
-            print(f"  交易状态: {trans_stat}")
-            
-            # 检查是否有二维码（需要用户扫码支付）
-            qr_code = response.get("qr_code", "")
-            if qr_code:
-                # 在终端显示二维码
-                self.print_qr_code(qr_code)
-            
-            # 判断交易状态
-            # P = 处理中, S = 成功, F = 失败, C = 关闭
-            if trans_stat == "S":
-                print("\n✅ 支付成功！（交易已完成）")
-                print(f"   汇付流水号: {response.get('hf_seq_id', 'N/A')}")
-                return response
-            elif trans_stat == "P":
-                # 订单处理中，直接返回响应
-                return response
-            elif resp_code.startswith("0000"):
-                print("\n✅ 下单成功！")
-                print(f"   汇付流水号: {response.get('hf_seq_id', 'N/A')}")
-                if trans_stat:
-                    print(f"   交易状态: {trans_stat} (需要等待支付完成)")
-                return response
-            else:
-                error_code = resp_code or "未知"
-                error_msg = resp_desc or "未知错误"
-                print(f"\n❌ 支付失败: [{error_code}] {error_msg}")
-                return response
+            response = self.backend.post(request, extend_infos)
+        except Exception as e:
+            elapsed = time.perf_counter() - start
+            throttled = limiter is not None and limiter.is_throttled(error=e)
+            if permit is not None:
+                permit.release(throttled, completed=False)
+            if breaker is not None and not throttled:
+                breaker.record_failure(endpoint)
+            if metrics is not None:
+                metrics.end(endpoint, elapsed, None, "error")
+            log_request(endpoint, fields, elapsed=elapsed, error=e)
+            raise
+        elapsed = time.perf_counter() - start
+        if permit is not None:
+            permit.release(limiter.is_throttled(response))
+        if breaker is not None:
+            breaker.record_success(endpoint)
+        if metrics is not None:
+            # 原生后端提供各阶段耗时（本线程最近一次请求），SDK 后端只记录总耗时
+            metrics.end(endpoint, elapsed, getattr(self.backend, "last_timings", None),
+                        response.get("resp_code"), response.get("trans_stat"))
+        log_request(endpoint, fields, response, elapsed)
+        if store is not None:
+            store.record_response(endpoint, fields, response)
+        if endpoint == "scanpay_query" and self.query_cache is not None:
+            self.query_cache.put(response, *self._query_ids(fields))
+        return response
+    
+    @staticmethod
+    def flight_key(req_seq_id=None, hf_seq_id=None, party_order_id=None):
+        """并发查询的合并键：按 汇付流水号 > 请求流水号 > 商户单号 取第一个（去掉首尾空白）"""
+        for name, value in (("hf_seq_id", hf_seq_id), ("req_seq_id", req_seq_id), ("party_order_id", party_order_id)):
+            if value and str(value).strip():
+                return name, str(value).strip()
+        return None
+    
+    @staticmethod
+    def _query_ids(fields):
+        """查询请求中的订单标识：(req_seq_id, hf_seq_id, party_order_id)"""
+        return (fields.get("req_seq_id") or fields.get("org_req_seq_id"),
+                fields.get("hf_seq_id") or fields.get("org_hf_seq_id"),
+                fields.get("party_order_id") or fields.get("out_ord_id"))
+    
+    def resolve_order(self, identifier):
+        """
+        在本地订单库中按任意一个订单标识查找原支付订单
+        
+        :param identifier: req_seq_id / hf_seq_id / party_order_id
+        :return: 订单字典（字段见 order_store.COLUMNS），没有记录或未启用订单库时返回 None
+        """
+        if self.order_store is None:
+            return None
+        return self.order_store.find(identifier, kind="pay")
+    
+    def _complete_identifiers(self, req_seq_id, req_date, hf_seq_id, party_order_id):
+        """
+        用本地订单库补全原交易的标识和日期（只提供了一个标识时，其余从库里取）
+        
+        :return: (req_seq_id, req_date, hf_seq_id, party_order_id)
+        """
+        if self.order_store is None or all((req_seq_id, req_date, hf_seq_id, party_order_id)):
+            return req_seq_id, req_date, hf_seq_id, party_order_id
+        order = None
+        for identifier in (req_seq_id, hf_seq_id, party_order_id):
+            order = self.resolve_order(identifier)
+            if order is not None:
+                break
+        if order is None:
+            return req_seq_id, req_date, hf_seq_id, party_order_id
+        
+        self._say(f"📒 已从本地订单库补全原交易: {order['req_seq_id']}")
+        return (req_seq_id or order["req_seq_id"], req_date or order["req_date"],
+                hf_seq_id or order["hf_seq_id"], party_order_id or order["party_order_id"])
+    
+    def aggregate_pay(self, amount="1.00", auth_code=None):
+        """
+        聚合正扫支付（支付宝NATIVE扫码支付）- 使用dg-sdk
+        
+        :param amount: 支付金额（元），默认1.00
+        :param auth_code: 支付授权码（可选，NATIVE支付不需要）
+        :return: 支付结果
+        """
+        request, extend_infos = self._build_pay_request(amount, auth_code)
+        
+        try:
+            # 根据文档，调用 request.post() 发送请求；结果未知时先查询确认，再沿用同一流水号重发
+            response = self._send_with_retry(request, extend_infos, lambda: self._confirm_pay(request))
+            return self._as_result(self._check_pay_response(response))
                 
         except Exception as e:
-            print(f"\n❌ SDK调用异常: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            self._report_exception("SDK调用异常", e)
             return None
     
-    def query_order(self, req_seq_id=None, req_date=None, hf_seq_id=None, party_order_id=None):
+    def _as_result(self, response):
+        """返回给调用方的结果：records 模式下转换为 OrderRecord（同步/异步客户端共用）"""
+        if self.records and isinstance(response, dict):
+            return OrderRecord.from_response(response, keep_raw=self.records == "raw")
+        return response
+    
+    def _send_with_retry(self, request, extend_infos, confirm=None):
         """
-        查询订单状态
+        发送支付/退款，结果未知或网关未受理时沿用同一流水号重发（见 retry.py）
         
-        :param req_seq_id: 请求流水号（可选，但需要至少提供一个标识）
-        :param req_date: 请求日期（YYYYMMDD格式），如果不提供则从req_seq_id中提取
-        :param hf_seq_id: 汇付流水号（推荐使用）
-        :param party_order_id: 商户单号（支付宝/微信订单号）
-        :return: 订单查询结果
+        :param confirm: 结果未知时确认网关是否已受理的函数（返回响应字典或 None）
+        :return: 响应字典
         """
-        # 至少需要提供一个订单标识
-        if not req_seq_id and not hf_seq_id and not party_order_id:
-            print("❌ 错误：至少需要提供一个订单标识（req_seq_id、hf_seq_id 或 party_order_id）")
+        if self.retry is None:
+            return self._post(request, extend_infos)
+        return self.retry.call(lambda: self._post(request, extend_infos), confirm, self._on_retry(request))
+    
+    def _on_retry(self, request):
+        """重发提示（同步/异步客户端共用）"""
+        def report(attempt, outcome, detail, delay):
+            when = f"{delay:.2f} 秒后" if delay else "查询确认网关没有这笔交易，立即"
+            self._warn(f"🔁 第 {attempt} 次发送{REASONS[outcome]}（{detail}），{when}沿用流水号 {request.req_seq_id} 重发")
+        return report
+    
+    def _confirm_pay(self, request):
+        """结果未知的支付：按请求流水号查询网关是否已受理（返回值见 _confirmed）"""
+        self._say(f"\n🔎 支付结果未知，查询网关是否已受理: {request.req_seq_id}")
+        built = self._build_query_request(req_seq_id=request.req_seq_id, req_date=request.req_date)
+        if built is None:
+            raise RuntimeError("无法构造确认查询请求")
+        return self._confirmed(request, self._post(*built), "支付（查询结果中没有二维码）")
+    
+    def _confirm_refund(self, request):
+        """结果未知的退款：按退款流水号查询网关是否已受理（返回值见 _confirmed）"""
+        self._say(f"\n🔎 退款结果未知，查询网关是否已受理: {request.req_seq_id}")
+        built = self._build_refund_query_request(request.req_seq_id, request.req_date)
+        if built is None:
+            raise RuntimeError("无法构造退款查询请求")
+        return self._confirmed(request, self._post(*built), "退款")
+    
+    def _confirmed(self, request, result, what):
+        """
+        把确认查询的结果整理为支付/退款响应（同步/异步客户端共用）
+        
+        :param result: 按请求流水号查询的响应字典
+        :param what: 提示中的交易类型
+        :return: 网关已受理时返回响应字典，网关没有这笔交易时返回 None（可以重发）
+        :raises RuntimeError: 查询结果无法确认（结果仍未知，不能重发）
+        """
+        resp_code = result.get("resp_code", "")
+        if resp_code.startswith("0000") and result.get("trans_stat"):
+            response = dict(result)
+            response["req_seq_id"] = request.req_seq_id
+            response["req_date"] = request.req_date
+            self._say(f"  ✅ 网关已受理这笔{what}，不再重发")
+            return response
+        if self.retry is not None and resp_code in self.retry.not_found_codes:
             return None
+        raise RuntimeError(f"确认查询失败，结果仍未知: [{resp_code}] {result.get('resp_desc', '')}")
+    
+    def _resolve_query_date(self, req_seq_id=None, req_date=None):
+        """
+        提取或设置查询请求日期
         
-        # 提取或设置请求日期
-        if req_seq_id and not req_date:
+        :param req_seq_id: 请求流水号（格式：user_id_YYYYMMDD_xxx）
+        :param req_date: 显式指定的请求日期
+        :return: 请求日期（YYYYMMDD）
+        """
+        if req_date:
+            return req_date
+        if req_seq_id:
             # 从req_seq_id中提取日期，格式：user_id_YYYYMMDD_xxx
             parts = req_seq_id.split("_")
             if len(parts) >= 2:
-                req_date = parts[1]
-            else:
-                # 如果无法提取，使用当前日期
-                req_date = datetime.now().strftime("%Y%m%d")
-        elif not req_date:
-            # 如果只有hf_seq_id或party_order_id，使用当前日期
-            req_date = datetime.now().strftime("%Y%m%d")
+                return parts[1]
+        # 如果无法提取，或只有hf_seq_id/party_order_id，使用当前日期
+        return datetime.now().strftime("%Y%m%d")
+    
+    def _build_query_request(self, req_seq_id=None, req_date=None, hf_seq_id=None, party_order_id=None):
+        """
+        构造订单查询请求对象（同步/异步客户端共用）
+        
+        :return: (request, extend_infos)；参数不足或SDK不支持时返回 None
+        """
+        # 至少需要提供一个订单标识
+        if not req_seq_id and not hf_seq_id and not party_order_id:
+            self._warn("❌ 错误：至少需要提供一个订单标识（req_seq_id、hf_seq_id 或 party_order_id）")
+            return None
+        
+        req_seq_id, req_date, hf_seq_id, party_order_id = self._complete_identifiers(
+            req_seq_id, req_date, hf_seq_id, party_order_id)
+        req_date = self._resolve_query_date(req_seq_id, req_date)
+        
+        if self.console:
+            print(f"\n查询订单状态...")
+            if req_seq_id:
+                print(f"  请求流水号: {req_seq_id}")
+            if hf_seq_id:
+                print(f"  汇付流水号: {hf_seq_id}")
+            if party_order_id:
+                print(f"  商户单号: {party_order_id}")
+            print(f"  请求日期: {req_date}")
         
-        print(f"\n查询订单状态...")
+        # 检查是否有查询接口
+        if not self.backend.supports("scanpay_query"):
+            self._warn("⚠️ SDK中没有找到订单查询接口")
+            return None
+        
+        request = self.backend.new_request("scanpay_query")
+        request.huifu_id = self.huifu_id
+        # 查询接口的原交易字段是 org_req_date / org_req_seq_id（请求对象上的 req_* 属性不会进入报文）
+        request.org_req_date = req_date
+        
+        # 设置必填字段（至少一个）
         if req_seq_id:
-            print(f"  请求流水号: {req_seq_id}")
+            request.org_req_seq_id = req_seq_id
+        
+        # 通过 extend_infos 传递其他标识
+        extend_infos = {}
         if hf_seq_id:
-            print(f"  汇付流水号: {hf_seq_id}")
+            extend_infos["hf_seq_id"] = hf_seq_id
         if party_order_id:
-            print(f"  商户单号: {party_order_id}")
-        print(f"  请求日期: {req_date}")
+            extend_infos["party_order_id"] = party_order_id
         
+        return request, extend_infos
+    
+    def _check_query_response(self, response):
+        """
+        分析订单查询响应（同步/异步客户端共用）
+        
+        :param response: SDK返回的响应字典
+        :return: 原样返回响应
+        """
+        if not self.console:
+            return response
+        
+        resp_code = response.get("resp_code", "")
+        trans_stat = response.get("trans_stat", "")
+        
+        print(f"  响应码: {resp_code}")
+        if resp_code == "21000000":
+            print(f"  ⚠️ 错误：订单标识不足，请提供 hf_seq_id 或 party_order_id")
+        print(f"  交易状态: {trans_stat}")
+        if resp_code.startswith("0000"):
+            print(f"  ✅ 查询成功")
+            if trans_stat == "S":
+                print(f"  💰 支付已完成（成功）")
+        
+        return response
+    
+    def query_order(self, req_seq_id=None, req_date=None, hf_seq_id=None, party_order_id=None):
+        """
+        查询订单状态
+        
+        :param req_seq_id: 请求流水号（可选，但需要至少提供一个标识）
+        :param req_date: 请求日期（YYYYMMDD格式），如果不提供则从req_seq_id中提取
+        :param hf_seq_id: 汇付流水号（推荐使用）
+        :param party_order_id: 商户单号（支付宝/微信订单号）
+        :return: 订单查询结果
+        """
         try:
-            # 检查是否有查询接口
-            if not hasattr(dg_sdk, 'V3TradePaymentScanpayQueryRequest'):
-                print("⚠️ SDK中没有找到订单查询接口")
+            built = self._build_query_request(req_seq_id, req_date, hf_seq_id, party_order_id)
+            if built is None:
                 return None
+            request, extend_infos = built
             
-            request = dg_sdk.V3TradePaymentScanpayQueryRequest()
-            request.huifu_id = self.huifu_id
-            request.req_date = req_date
-            
-            # 设置必填字段（至少一个）
-            if req_seq_id:
-                request.req_seq_id = req_seq_id
-            
-            # 通过 extend_infos 传递其他标识
-            extend_infos = {}
-            if hf_seq_id:
-                extend_infos["hf_seq_id"] = hf_seq_id
-            if party_order_id:
-                extend_infos["party_order_id"] = party_order_id
-            
-            response = request.post(extend_infos)
-            
-            resp_code = response.get("resp_code", "")
-            trans_stat = response.get("trans_stat", "")
-            
-            print(f"  响应码: {resp_code}")
-            if resp_code == "21000000":
-                print(f"  ⚠️ 错误：订单标识不足，请提供 hf_seq_id 或 party_order_id")
-            print(f"  交易状态: {trans_stat}")
-            if resp_code.startswith("0000"):
-                print(f"  ✅ 查询成功")
-                if trans_stat == "S":
-                    print(f"  💰 支付已完成（成功）")
-            
-            return response
+            response = self._post(request, extend_infos)
+            return self._as_result(self._check_query_response(response))
             
         except Exception as e:
-            print(f"\n❌ 查询订单异常: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            self._report_exception("查询订单异常", e)
+            return None
+    
+    def _build_refund_query_request(self, req_seq_id, req_date=None):
+        """
+        构造退款查询请求对象（同步/异步客户端共用）
+        
+        :param req_seq_id: 退款请求流水号
+        :param req_date: 退款请求日期（默认取流水号中的日期）
+        :return: (request, extend_infos)；SDK不支持时返回 None
+        """
+        if not self.backend.supports("scanpay_refundquery"):
+            self._warn("⚠️ SDK中没有找到退款查询接口")
+            return None
+        request = self.backend.new_request("scanpay_refundquery")
+        request.huifu_id = self.huifu_id
+        request.org_req_date = req_date or self._resolve_query_date(req_seq_id)
+        request.org_req_seq_id = req_seq_id
+        return request, {}
+    
+    def query_refund(self, req_seq_id, req_date=None):
+        """
+        查询退款状态
+        
+        :param req_seq_id: 退款请求流水号
+        :param req_date: 退款请求日期（YYYYMMDD格式），如果不提供则从流水号中提取
+        :return: 退款查询结果（trans_stat：P 处理中 / S 成功 / F 失败）
+        """
+        try:
+            built = self._build_refund_query_request(req_seq_id, req_date)
+            if built is None:
+                return None
+            response = self._post(*built)
+            self._say(f"  退款查询: [{response.get('resp_code', '')}] 交易状态 {response.get('trans_stat', '')}")
+            return self._as_result(response)
+        except Exception as e:
+            self._report_exception("查询退款异常", e)
             return None
     
     def wait_for_payment(self, req_seq_id=None, req_date=None, hf_seq_id=None, party_order_id=None, max_wait_time=300, poll_interval=3):
@@ -304,26 +684,34 @@ class HuifuSDKAPI:
         :param poll_interval: 轮询间隔（秒），默认3秒
         :return: 支付结果，如果超时或失败返回None
         """
-        print(f"\n开始轮询支付状态...")
-        print(f"  最大等待时间: {max_wait_time}秒")
-        print(f"  轮询间隔: {poll_interval}秒")
+        # 接入异步通知后，轮询只作为兜底
+        if self.notify_hub is not None:
+            poll_interval = max(poll_interval, self.notify_hub.fallback_poll_interval)
+        
+        self._say(f"\n开始轮询支付状态...")
+        self._say(f"  最大等待时间: {max_wait_time}秒")
+        self._say(f"  轮询间隔: {poll_interval}秒")
         
         start_time = time.time()
         poll_count = 0
+        interval = poll_interval
         
         while True:
             poll_count += 1
             elapsed_time = time.time() - start_time
             
             if elapsed_time >= max_wait_time:
-                print(f"\n⏰ 等待超时（已等待 {int(elapsed_time)} 秒）")
-                return None
+                self._say(f"\n⏰ 等待超时（已等待 {int(elapsed_time)} 秒）")
+                return self._record_wait(None, poll_count - 1)
             
-            print(f"\n[第 {poll_count} 次查询] 已等待 {int(elapsed_time)} 秒...")
+            self._say(f"\n[第 {poll_count} 次查询] 已等待 {int(elapsed_time)} 秒...")
             result = self.query_order(req_seq_id, req_date, hf_seq_id, party_order_id)
+            interval = self._next_poll_interval(interval, poll_interval, result)
             
             if not result:
-                time.sleep(poll_interval)
+                notified = self._sleep_until_notified(interval, req_seq_id, hf_seq_id, party_order_id)
+                if notified:
+                    return self._record_wait(notified, poll_count)
                 continue
             
             resp_code = result.get("resp_code", "")
@@ -331,62 +719,102 @@ class HuifuSDKAPI:
             
             # 如果返回21000000错误，说明参数不足，尝试只使用hf_seq_id
             if resp_code == "21000000" and hf_seq_id:
-                print(f"  尝试仅使用汇付流水号查询...")
+                self._say(f"  尝试仅使用汇付流水号查询...")
                 result = self.query_order(hf_seq_id=hf_seq_id, req_date=req_date)
                 if result:
                     resp_code = result.get("resp_code", "")
                     trans_stat = result.get("trans_stat", "")
             
-            if resp_code.startswith("0000"):
-                if trans_stat == "S":
-                    print(f"\n✅ 支付成功！")
-                    print(f"   汇付流水号: {result.get('hf_seq_id', 'N/A')}")
-                    print(f"   支付金额: {result.get('trans_amt', 'N/A')} 元")
-                    return result
-                elif trans_stat == "F":
-                    print(f"\n❌ 支付失败")
-                    print(f"   失败原因: {result.get('resp_desc', '未知')}")
-                    return result
-                elif trans_stat == "C":
-                    print(f"\n⚠️ 订单已关闭")
-                    return result
-                elif trans_stat == "P":
-                    # 仍在处理中，继续轮询
-                    print(f"   交易状态: P (处理中，继续等待...)")
-                    time.sleep(poll_interval)
-                    continue
-                else:
-                    # 未知状态，继续轮询
-                    print(f"   交易状态: {trans_stat} (继续等待...)")
-                    time.sleep(poll_interval)
-                    continue
+            if self._report_poll_result(result, resp_code, trans_stat):
+                return self._record_wait(result, poll_count)
+            
+            notified = self._sleep_until_notified(interval, req_seq_id, hf_seq_id, party_order_id)
+            if notified:
+                return self._record_wait(notified, poll_count)
+    
+    def _next_poll_interval(self, interval, poll_interval, result):
+        """下一次轮询的间隔：查询失败或被网关限流时加倍（最多 poll_interval 的 8 倍），恢复后回到 poll_interval"""
+        if not result or (self.limiter is not None and self.limiter.is_throttled(result)):
+            return min(interval * 2, poll_interval * 8)
+        return poll_interval
+    
+    def _record_wait(self, result, polls):
+        """记录一次等待的查询次数（同步/异步轮询共用）"""
+        if self.metrics is not None:
+            self.metrics.record_polls(polls, (result.get("trans_stat") or "unknown") if result else "timeout")
+        return result
+    
+    def _sleep_until_notified(self, timeout, *identifiers):
+        """
+        等待下一次轮询；接入异步通知时，收到终态通知会立即返回
+        
+        :return: 终态通知字典，未收到通知返回 None
+        """
+        if self.notify_hub is None:
+            time.sleep(timeout)
+            return None
+        notified = self.notify_hub.wait(identifiers, timeout)
+        if notified:
+            self._say(f"\n📩 收到异步通知")
+            self._report_poll_result(notified, "00000000", notified.get("trans_stat", ""))
+        return notified
+    
+    def _report_poll_result(self, result, resp_code, trans_stat):
+        """
+        输出一次轮询结果（同步/异步轮询共用）
+        
+        :return: 订单是否已进入终态（S/F/C）
+        """
+        if resp_code.startswith("0000"):
+            if trans_stat == "S":
+                self._say(f"\n✅ 支付成功！")
+                self._say(f"   汇付流水号: {result.get('hf_seq_id', 'N/A')}")
+                self._say(f"   支付金额: {result.get('trans_amt', 'N/A')} 元")
+                return True
+            elif trans_stat == "F":
+                self._say(f"\n❌ 支付失败")
+                self._say(f"   失败原因: {result.get('resp_desc', '未知')}")
+                return True
+            elif trans_stat == "C":
+                self._say(f"\n⚠️ 订单已关闭")
+                return True
+            elif trans_stat == "P":
+                # 仍在处理中，继续轮询
+                self._say(f"   交易状态: P (处理中，继续等待...)")
             else:
-                # 查询失败，继续尝试
-                print(f"   查询异常，继续尝试...")
-                time.sleep(poll_interval)
-                continue
+                # 未知状态，继续轮询
+                self._say(f"   交易状态: {trans_stat} (继续等待...)")
+        else:
+            # 查询失败，继续尝试
+            self._say(f"   查询异常，继续尝试...")
+        return False
     
-    def refund(self, org_req_seq_id=None, org_req_date=None, org_hf_seq_id=None, party_order_id=None, refund_amt="1.00"):
+    def _build_refund_request(self, org_req_seq_id=None, org_req_date=None, org_hf_seq_id=None, party_order_id=None, refund_amt="1.00",
+                              req_seq_id=None, req_date=None):
         """
-        交易退款 - 使用dg-sdk
+        构造交易退款请求对象（同步/异步客户端共用）
         
-        :param org_req_seq_id: 原交易请求流水号
-        :param org_req_date: 原交易请求日期（YYYYMMDD格式）
-        :param org_hf_seq_id: 原交易汇付流水号（可选）
-        :param party_order_id: 原交易微信/支付宝商户单号（可选）
-        :param refund_amt: 退款金额（元）
-        :return: 退款结果
+        :param req_seq_id: 指定退款流水号（重发同一笔退款时使用，默认新生成）
+        :param req_date: 指定退款请求日期（默认取流水号中的日期）
+        :return: (request, extend_infos)；参数校验失败时返回 None
         """
-        print("\n" + "="*50)
-        print("开始执行交易退款（使用汇付dg-sdk）...")
-        print("="*50)
+        self._say("\n" + "="*50)
+        self._say("开始执行交易退款（使用汇付dg-sdk）...")
+        self._say("="*50)
+        
+        # 只提供了部分原交易信息时，从本地订单库补全
+        if org_req_seq_id or org_hf_seq_id or party_order_id:
+            org_req_seq_id, org_req_date, org_hf_seq_id, party_order_id = self._complete_identifiers(
+                org_req_seq_id, org_req_date, org_hf_seq_id, party_order_id)
         
-        # 生成退款流水号
-        req_seq_id = self.generate_req_seq_id("REFUND")
-        req_date = datetime.now().strftime("%Y%m%d")
+        # 生成退款流水号（重发时沿用原流水号，汇付按流水号防重）
+        if not req_seq_id:
+            req_seq_id = self.generate_req_seq_id("REFUND")
+        if not req_date:
+            req_date = req_date_of(req_seq_id) or datetime.now().strftime("%Y%m%d")
         
         # 根据文档，使用对象方法：创建退款请求对象
-        request = dg_sdk.V3TradePaymentScanpayRefundRequest()
+        request = self.backend.new_request("scanpay_refund")
         
         # 设置基础请求参数
         request.req_seq_id = req_seq_id
@@ -411,60 +839,85 @@ class HuifuSDKAPI:
         
         # 验证必需参数：至少需要一个原交易标识，且必须有原交易日期
         if not org_req_date:
-            print("❌ 错误：原交易请求日期（org_req_date）是必需的")
+            self._warn("❌ 错误：原交易请求日期（org_req_date）是必需的")
             return None
         
         if not org_req_seq_id and not org_hf_seq_id and not party_order_id:
-            print("❌ 错误：至少需要提供一个原交易标识（org_req_seq_id、org_hf_seq_id 或 party_order_id）")
+            self._warn("❌ 错误：至少需要提供一个原交易标识（org_req_seq_id、org_hf_seq_id 或 party_order_id）")
             return None
         
-        print(f"\n请求参数:")
-        print(f"  req_seq_id: {req_seq_id}")
-        print(f"  请求日期: {req_date}")
-        print(f"  商户号: {self.huifu_id}")
-        if org_req_date:
-            print(f"  原交易日期: {org_req_date}")
-        print(f"  退款金额: {refund_amt} 元")
-        print(f"\nextend_infos (原交易标识):")
-        if extend_infos:
-            for k, v in extend_infos.items():
-                print(f"  {k}: {v}")
+        if self.console:
+            print(f"\n请求参数:")
+            print(f"  req_seq_id: {req_seq_id}")
+            print(f"  请求日期: {req_date}")
+            print(f"  商户号: {self.huifu_id}")
+            if org_req_date:
+                print(f"  原交易日期: {org_req_date}")
+            print(f"  退款金额: {refund_amt} 元")
+            print(f"\nextend_infos (原交易标识):")
+            if extend_infos:
+                for k, v in extend_infos.items():
+                    print(f"  {k}: {v}")
+            else:
+                print("  无")
+        
+        return request, extend_infos
+    
+    def _check_refund_response(self, response):
+        """
+        分析交易退款响应（同步/异步客户端共用）
+        
+        :param response: SDK返回的响应字典
+        :return: 原样返回响应
+        """
+        if not self.console:
+            return response
+        
+        print(f"\n响应结果:")
+        print(json.dumps(response, indent=2, ensure_ascii=False))
+        
+        # 检查响应（汇付响应码：0000开头表示成功）
+        resp_code = response.get("resp_code", "")
+        resp_desc = response.get("resp_desc", "")
+        
+        if resp_code.startswith("0000"):
+            print("\n✅ 退款成功！")
+            print(f"   响应码: {resp_code}")
+            print(f"   响应描述: {resp_desc}")
+            print(f"   汇付流水号: {response.get('hf_seq_id', 'N/A')}")
         else:
-            print("  无")
+            error_code = resp_code or "未知"
+            error_msg = resp_desc or "未知错误"
+            print(f"\n❌ 退款失败: [{error_code}] {error_msg}")
+        return response
+    
+    def refund(self, org_req_seq_id=None, org_req_date=None, org_hf_seq_id=None, party_order_id=None, refund_amt="1.00",
+               req_seq_id=None, req_date=None):
+        """
+        交易退款 - 使用dg-sdk
+        
+        :param org_req_seq_id: 原交易请求流水号
+        :param org_req_date: 原交易请求日期（YYYYMMDD格式）
+        :param org_hf_seq_id: 原交易汇付流水号（可选）
+        :param party_order_id: 原交易微信/支付宝商户单号（可选）
+        :param refund_amt: 退款金额（元）
+        :param req_seq_id: 退款流水号（可选，重发同一笔退款时传入原流水号）
+        :param req_date: 退款请求日期（可选）
+        :return: 退款结果
+        """
+        built = self._build_refund_request(org_req_seq_id, org_req_date, org_hf_seq_id, party_order_id, refund_amt,
+                                           req_seq_id, req_date)
+        if built is None:
+            return None
+        request, extend_infos = built
         
         try:
             # 根据文档，调用 request.post() 发送请求
             # extend_infos 包含原交易标识等非必填字段
-            # SDK会自动处理签名、HTTP请求、验签等
-            response = request.post(extend_infos)
-            
-            print(f"\n响应结果:")
-            print(json.dumps(response, indent=2, ensure_ascii=False))
-            
-            # 检查响应（汇付响应码：0000开头表示成功）
-            resp_code = response.get("resp_code", "")
-            resp_desc = response.get("resp_desc", "")
-            
-            if resp_code.startswith("0000"):
-                print("\n✅ 退款成功！")
-                print(f"   响应码: {resp_code}")
-                print(f"   响应描述: {resp_desc}")
-                print(f"   汇付流水号: {response.get('hf_seq_id', 'N/A')}")
-                return response
-            else:
-                error_code = resp_code or "未知"
-                error_msg = resp_desc or "未知错误"
-                print(f"\n❌ 退款失败: [{error_code}] {error_msg}")
-                return response
+            # 结果未知时先按退款流水号查询确认，再沿用同一退款流水号重发
+            response = self._send_with_retry(request, extend_infos, lambda: self._confirm_refund(request))
+            return self._as_result(self._check_refund_response(response))
                 
         except Exception as e:
-            print(f"\n❌ SDK调用异常: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            self._report_exception("SDK调用异常", e)
             return None
-
-
-# 如果SDK不可用，提示安装
-if not SDK_AVAILABLE:
-    raise ImportError("汇付SDK未安装，请运行: pip install dg-sdk==v2.0.10")
-
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+RSA密钥注册表
+
+解析RSA密钥的开销远大于一次签名，这里把 PRIVATE_KEY / HUIFU_PUBLIC_KEY
+只解析一次成 cryptography 的密钥对象，之后所有签名、验签直接复用：
+- 线程安全：读取无锁，重新加载时加锁
+- 密钥文件的修改时间（mtime）变化后才重新加载，检查频率受 check_interval 限制
+
+使用方法：
+    registry = default_registry()
+    sign = registry.sign("待签名字符串")
+    ok = registry.verify("待验签字符串", sign)
+"""
+
+import base64
+import functools
+import os
+import threading
+import time
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+
+from config import get_settings, load_key_file
+
+
+def _default_files(private_key_file, public_key_file):
+    """未指定的密钥文件路径取 config 中的 PRIVATE_KEY_FILE / PUBLIC_KEY_FILE"""
+    if private_key_file is None or public_key_file is None:
+        settings = get_settings()
+        private_key_file = private_key_file or settings.PRIVATE_KEY_FILE
+        public_key_file = public_key_file or settings.PUBLIC_KEY_FILE
+    return private_key_file, public_key_file
+
+
+@functools.lru_cache(maxsize=1024)
+def load_private_key(private_key_pem):
+    """
+    解析PEM私钥（按PEM文本缓存，同一密钥只解析一次）
+
+    :param private_key_pem: PEM格式私钥
+    :return: cryptography 私钥对象
+    """
+    try:
+        return serialization.load_pem_private_key(private_key_pem.encode('utf-8'), password=None)
+    except ValueError as e:
+        error_msg = str(e)
+        if "Could not deserialize key data" in error_msg or "unsupported" in error_msg.lower():
+            raise ValueError("私钥格式错误：无法解析私钥数据。请检查密钥格式是否正确。") from e
+        elif "password" in error_msg.lower():
+            raise ValueError("私钥可能需要密码，但当前不支持密码保护的私钥。") from e
+        else:
+            raise ValueError(f"私钥解析失败：{error_msg}") from e
+    except TypeError as e:
+        raise ValueError("私钥可能需要密码，但当前不支持密码保护的私钥。") from e
+
+
+@functools.lru_cache(maxsize=1024)
+def load_public_key(public_key_pem):
+    """
+    解析PEM公钥（按PEM文本缓存，同一密钥只解析一次）
+
+    :param public_key_pem: PEM格式公钥
+    :return: cryptography 公钥对象
+    """
+    try:
+        return serialization.load_pem_public_key(public_key_pem.encode('utf-8'))
+    except ValueError as e:
+        raise ValueError(f"公钥解析失败：{str(e)}") from e
+
+
+def rsa_sign(private_key, data):
+    """
+    SHA256withRSA 签名
+
+    :param private_key: cryptography 私钥对象
+    :param data: 待签名字符串
+    :return: base64 签名
+    """
+    signature = private_key.sign(data.encode('utf-8'), padding.PKCS1v15(), hashes.SHA256())
+    return base64.b64encode(signature).decode('utf-8')
+
+
+def rsa_verify(public_key, data, signature):
+    """
+    SHA256withRSA 验签
+
+    :param public_key: cryptography 公钥对象
+    :param data: 待验签字符串
+    :param signature: base64 签名
+    :return: 签名是否有效
+    """
+    try:
+        public_key.verify(base64.b64decode(signature), data.encode('utf-8'), padding.PKCS1v15(), hashes.SHA256())
+        return True
+    except (InvalidSignature, ValueError):
+        return False
+
+
+class _KeyEntry:
+    """单个密钥文件的缓存：(mtime_ns, PEM文本, 密钥对象)"""
+
+    def __init__(self, path, key_type, check_interval, pem=None):
+        self.path = path
+        self.key_type = key_type
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        if pem is not None:
+            # 直接提供的PEM文本，不关联文件，永不重新加载
+            self._state = (None, pem, self._parse(pem))
+            self._next_check = float("inf")
+        else:
+            self._state = None
+
+    def _parse(self, pem):
+        if self.key_type == 'private':
+            return load_private_key(pem)
+        return load_public_key(pem)
+
+    def get(self):
+        """返回 (PEM文本, 密钥对象)；文件 mtime 变化时重新加载"""
+        state = self._state
+        now = time.monotonic()
+        if state is not None and now < self._next_check:
+            return state[1], state[2]
+
+        with self._lock:
+            state = self._state
+            if state is not None and now < self._next_check:
+                return state[1], state[2]
+            mtime_ns = os.stat(self.path).st_mtime_ns
+            if state is None or state[0] != mtime_ns:
+                pem = load_key_file(self.path, key_type=self.key_type)
+                state = (mtime_ns, pem, self._parse(pem))
+                self._state = state
+            self._next_check = now + self.check_interval
+        return state[1], state[2]
+
+
+class KeyRegistry:
+    """商户私钥 + 汇付公钥的解析缓存（线程安全）"""
+
+    def __init__(self, private_key_file=None, public_key_file=None,
+                 check_interval=1.0, private_key_pem=None, public_key_pem=None):
+        """
+        :param private_key_file: 商户私钥文件路径，默认读取 config 中的 PRIVATE_KEY_FILE
+        :param public_key_file: 汇付公钥文件路径，默认读取 config 中的 PUBLIC_KEY_FILE
+        :param check_interval: 检查文件 mtime 的最小间隔（秒）
+        :param private_key_pem: 直接提供私钥PEM（优先于文件，不会重新加载）
+        :param public_key_pem: 直接提供公钥PEM（优先于文件，不会重新加载）
+        """
+        if private_key_pem is None or public_key_pem is None:
+            private_key_file, public_key_file = _default_files(private_key_file, public_key_file)
+        self._private = _KeyEntry(private_key_file, 'private', check_interval, private_key_pem)
+        self._public = _KeyEntry(public_key_file, 'public', check_interval, public_key_pem)
+
+    @property
+    def private_key(self):
+        """cryptography 私钥对象"""
+        return self._private.get()[1]
+
+    @property
+    def public_key(self):
+        """cryptography 公钥对象"""
+        return self._public.get()[1]
+
+    @property
+    def private_key_pem(self):
+        """PEM格式私钥（供 dg_sdk.MerConfig 使用）"""
+        return self._private.get()[0]
+
+    @property
+    def public_key_pem(self):
+        """PEM格式公钥（供 dg_sdk.MerConfig 使用）"""
+        return self._public.get()[0]
+
+    def sign(self, data):
+        """用商户私钥签名，返回 base64 签名"""
+        return rsa_sign(self._private.get()[1], data)
+
+    def verify(self, data, signature):
+        """用汇付公钥验签"""
+        return rsa_verify(self._public.get()[1], data, signature)
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(private_key_file=None, public_key_file=None):
+    """
+    按密钥文件路径获取共享的 KeyRegistry（同一对文件在进程内只解析一次）
+
+    :return: KeyRegistry 实例
+    """
+    private_key_file, public_key_file = _default_files(private_key_file, public_key_file)
+    key = (os.path.abspath(private_key_file), os.path.abspath(public_key_file))
+    registry = _registries.get(key)
+    if registry is None:
+        with _registries_lock:
+            registry = _registries.get(key)
+            if registry is None:
+                registry = KeyRegistry(private_key_file, public_key_file)
+                _registries[key] = registry
+    return registry
+
+
+def get_pem_registry(private_key_pem, public_key_pem):
+    """
+    按PEM文本获取共享的 KeyRegistry（多商户配置直接提供密钥文本时使用）
+
+    :return: KeyRegistry 实例
+    """
+    key = ("pem", private_key_pem, public_key_pem)
+    registry = _registries.get(key)
+    if registry is None:
+        with _registries_lock:
+            registry = _registries.get(key)
+            if registry is None:
+                registry = KeyRegistry(private_key_pem=private_key_pem, public_key_pem=public_key_pem)
+                _registries[key] = registry
+    return registry
+
+
+def default_registry():
+    """config 中配置的默认密钥文件（keys/private_key.txt、keys/public_key.txt）"""
+    return get_registry()
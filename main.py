@@ -6,7 +6,7 @@
 """
 
 import sys
-from huifu_sdk_api import HuifuSDKAPI
+from huifu_daemon import get_api
 
 
 def print_banner():
@@ -39,13 +39,22 @@ def main():
     
     # 初始化SDK API客户端
     try:
-        api = HuifuSDKAPI()
+        api = get_api()
     except ImportError as e:
         print(f"\n❌ 错误: {e}")
         print("\n请先安装汇付SDK:")
         print("  pip install dg-sdk==v2.0.10")
         sys.exit(1)
     
+    # 上次运行中未完成的订单（本地订单库，见 order_store.py）
+    if api.order_store is not None:
+        pending = api.order_store.pending(limit=5)
+        if pending:
+            print(f"\n📒 本地订单库中有未完成的订单（最近 {len(pending)} 笔）:")
+            for order in pending:
+                print(f"   {order['req_seq_id']}  {order['trans_amt']} 元  状态: {order['trans_stat'] or '结果未知'}")
+            print("   可使用 python query_order.py --id <请求流水号> 查询最新状态")
+    
     print("\n" + "="*60)
     print("【步骤 1】聚合正扫支付（支付宝NATIVE扫码支付）")
     print("="*60)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+商户配置
+
+每个 HuifuSDKAPI 实例持有自己的 MerchantConfig（商户号、系统号、产品号、用户ID、密钥），
+同一进程内可以同时服务多个商户：
+- 密钥按文件路径（或PEM文本）缓存在 key_registry 中，同一商户的多个客户端只解析一次
+- SDK 后端在发送时才把本商户的配置写入 dg_sdk.DGClient.mer_config（持锁，互不覆盖）
+
+使用方法：
+    merchant = MerchantConfig(
+        huifu_id="6666000109133323", sys_id="6666000108854952", product_id="PAYUN",
+        user_id="1435964137120268288",
+        private_key_file="keys/merchant_a/private_key.txt",
+        public_key_file="keys/merchant_a/public_key.txt",
+    )
+    api = HuifuSDKAPI(merchant=merchant)
+"""
+
+import json
+
+from config import get_settings
+from key_registry import get_pem_registry, get_registry
+
+
+class MerchantConfig:
+    """单个商户的身份与密钥"""
+
+    def __init__(self, huifu_id, sys_id, product_id, user_id,
+                 private_key_file=None, public_key_file=None,
+                 private_key_pem=None, public_key_pem=None):
+        """
+        :param huifu_id: 商户号
+        :param sys_id: 系统号
+        :param product_id: 产品号
+        :param user_id: 用户ID（包含在 req_seq_id 中）
+        :param private_key_file: 商户私钥文件，默认读取 config 中的 PRIVATE_KEY_FILE
+        :param public_key_file: 汇付公钥文件，默认读取 config 中的 PUBLIC_KEY_FILE
+        :param private_key_pem: 直接提供私钥PEM（与 public_key_pem 同时提供时优先于文件）
+        :param public_key_pem: 直接提供汇付公钥PEM
+        """
+        self.huifu_id = huifu_id
+        self.sys_id = sys_id
+        self.product_id = product_id
+        self.user_id = user_id
+        if private_key_file is None or public_key_file is None:
+            settings = get_settings()
+            private_key_file = private_key_file or settings.PRIVATE_KEY_FILE
+            public_key_file = public_key_file or settings.PUBLIC_KEY_FILE
+        self.private_key_file = private_key_file
+        self.public_key_file = public_key_file
+        self.private_key_pem = private_key_pem
+        self.public_key_pem = public_key_pem
+
+    @property
+    def keys(self):
+        """本商户的 KeyRegistry（进程内共享，密钥只解析一次）"""
+        if self.private_key_pem and self.public_key_pem:
+            return get_pem_registry(self.private_key_pem, self.public_key_pem)
+        return get_registry(self.private_key_file, self.public_key_file)
+
+    def __repr__(self):
+        return f"MerchantConfig(huifu_id={self.huifu_id!r}, sys_id={self.sys_id!r})"
+
+
+def default_merchant():
+    """config.py / 环境变量中配置的商户"""
+    settings = get_settings()
+    return MerchantConfig(settings.HUIFU_ID, settings.SYS_ID, settings.PRODUCT_ID, settings.USER_ID,
+                          settings.PRIVATE_KEY_FILE, settings.PUBLIC_KEY_FILE)
+
+
+def load_merchants(path):
+    """
+    从JSON文件读取多个商户配置
+
+    文件格式：[{"huifu_id": "...", "sys_id": "...", "product_id": "...", "user_id": "...",
+               "private_key_file": "...", "public_key_file": "..."}, ...]
+
+    :param path: JSON文件路径
+    :return: {huifu_id: MerchantConfig}
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        records = json.load(f)
+    merchants = {}
+    for record in records:
+        merchant = MerchantConfig(**record)
+        merchants[merchant.huifu_id] = merchant
+    return merchants
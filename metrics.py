@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+请求指标（Prometheus 文本格式）
+
+HuifuSDKAPI 内置的指标：
+- huifu_request_duration_seconds：各接口、各阶段（build / sign / serialize / network / verify / total）耗时直方图
+- huifu_responses_total：各接口按 resp_code、trans_stat 统计的响应数（发送异常记为 resp_code="error"）
+- huifu_requests_in_flight：各接口正在发送的请求数
+- huifu_payment_poll_iterations：wait_for_payment 每次等待的轮询次数直方图
+
+请求线程上只做计数和一次 deque.append（不加锁），直方图归并在导出时或后台线程中完成，
+请求路径上的额外开销见 python benchmark.py metrics。
+
+导出：
+    print(default_metrics().render())          # 函数调用
+    start_http_server(9108)                     # 本地HTTP：GET http://127.0.0.1:9108/metrics
+"""
+
+import bisect
+import collections
+import threading
+import time
+
+
+# 请求耗时分桶（秒）
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 轮询次数分桶
+POLL_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value) if value != int(value) or abs(value) >= 1e15 else str(int(value))
+    return str(value)
+
+
+class Counter:
+    """计数器（线程安全）"""
+
+    type = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield self.name, labels, None, value
+
+
+class Gauge:
+    """仪表：导出时调用 collect() 取当前值 {labels: value}"""
+
+    type = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), collect=None):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.collect = collect or dict
+
+    def samples(self):
+        for labels, value in sorted(self.collect().items()):
+            yield self.name, labels, None, value
+
+
+class Histogram:
+    """直方图（线程安全）"""
+
+    type = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}   # labels -> [各桶计数(最后一个为 +Inf), 总和, 次数]
+        self._lock = threading.Lock()
+
+    def _get(self, labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        return series
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._get(labels)
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def observe_many(self, labels, values):
+        """批量记录（归并时使用，只加一次锁）"""
+        buckets = self.buckets
+        indexes = collections.Counter(bisect.bisect_left(buckets, v) for v in values)
+        total = sum(values)
+        with self._lock:
+            series = self._get(labels)
+            for index, count in indexes.items():
+                series[0][index] += count
+            series[1] += total
+            series[2] += len(values)
+
+    def snapshot(self, labels):
+        """(各桶累计计数, 总和, 次数)，没有数据时返回 None"""
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                return None
+            counts, total, count = list(series[0]), series[1], series[2]
+        cumulative, running = [], 0
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return cumulative, total, count
+
+    def samples(self):
+        with self._lock:
+            keys = sorted(self._series)
+        for labels in keys:
+            cumulative, total, count = self.snapshot(labels)
+            for bound, value in zip(self.buckets + ("+Inf",), cumulative):
+                le = bound if bound == "+Inf" else _format_value(float(bound))
+                yield self.name + "_bucket", labels, f'le="{le}"', value
+            yield self.name + "_sum", labels, None, total
+            yield self.name + "_count", labels, None, count
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, func):
+        """导出前调用的函数（用于归并延迟记录的数据）"""
+        self._collectors.append(func)
+
+    def render(self):
+        """Prometheus 文本格式"""
+        for func in self._collectors:
+            func()
+        lines = []
+        for metric in list(self._metrics):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, extra, value in metric.samples():
+                lines.append(f"{name}{_format_labels(metric.labelnames, labels, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class RequestMetrics:
+    """
+    HuifuSDKAPI 的请求指标
+
+    请求线程：begin() / end() 只在线程自己的计数表上加一，并把 (接口, 耗时, 各阶段, 响应码, 状态)
+    追加到队列；归并线程每 flush_interval 秒（以及每次导出时）把队列归并进直方图和计数器。
+    """
+
+    PHASES = ("build", "sign", "serialize", "network", "verify")
+
+    def __init__(self, registry=None, flush_interval=1.0):
+        self.registry = registry or Registry()
+        self.latency = self.registry.register(Histogram(
+            "huifu_request_duration_seconds", "汇付接口请求耗时（秒），按接口和阶段", ("endpoint", "phase")))
+        self.responses = self.registry.register(Counter(
+            "huifu_responses_total", "汇付接口响应数，按响应码和交易状态", ("endpoint", "resp_code", "trans_stat")))
+        self.registry.register(Gauge(
+            "huifu_requests_in_flight", "正在发送的请求数", ("endpoint",), collect=self.in_flight))
+        self.polls = self.registry.register(Histogram(
+            "huifu_payment_poll_iterations", "wait_for_payment 每次等待的轮询次数", ("outcome",), POLL_BUCKETS))
+        self.registry.add_collector(self.flush)
+
+        self.flush_interval = flush_interval
+        self._samples = collections.deque()
+        self._flush_lock = threading.Lock()
+        self._local = threading.local()
+        self._shards = []   # 每个线程一张 {endpoint: [已开始, 已结束]}
+        self._shards_lock = threading.Lock()
+        self._flusher = None
+
+    # ---------- 请求线程 ----------
+
+    def _counts(self, endpoint):
+        """当前线程某接口的 [已开始, 已结束]（首次使用时登记）"""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True)
+                    self._flusher.start()
+        return shard.setdefault(endpoint, [0, 0])
+
+    def begin(self, endpoint):
+        """请求开始（在途数 +1）"""
+        try:
+            self._local.shard[endpoint][0] += 1
+        except (AttributeError, KeyError):
+            self._counts(endpoint)[0] += 1
+
+    def end(self, endpoint, elapsed, timings=None, resp_code="", trans_stat=""):
+        """
+        请求结束（在途数 -1，记录耗时与结果）
+
+        :param elapsed: 总耗时（秒）
+        :param timings: 各阶段耗时字典（原生后端提供；SDK 后端为 None）
+        """
+        self._local.shard[endpoint][1] += 1
+        self._samples.append((endpoint, elapsed, timings, resp_code, trans_stat))
+
+    def record_polls(self, iterations, outcome):
+        """记录一次 wait_for_payment 的轮询次数（outcome: S/F/C/timeout/notified）"""
+        self.polls.observe((outcome,), iterations)
+
+    # ---------- 归并与导出 ----------
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """把队列中的记录归并进直方图和计数器"""
+        with self._flush_lock:
+            samples = self._samples
+            batch = [samples.popleft() for _ in range(len(samples))]
+            if not batch:
+                return
+            latencies = collections.defaultdict(list)
+            outcomes = collections.Counter()
+            for endpoint, elapsed, timings, resp_code, trans_stat in batch:
+                latencies[(endpoint, "total")].append(elapsed)
+                if timings:
+                    for phase, seconds in timings.items():
+                        latencies[(endpoint, phase)].append(seconds)
+                outcomes[(endpoint, resp_code or "", trans_stat or "")] += 1
+            for labels, values in latencies.items():
+                self.latency.observe_many(labels, values)
+            for labels, count in outcomes.items():
+                self.responses.inc(labels, count)
+
+    def in_flight(self):
+        """{(endpoint,): 在途数}"""
+        totals = collections.Counter()
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for endpoint, (started, finished) in list(shard.items()):
+                totals[(endpoint,)] += started - finished
+        return dict(totals)
+
+    def render(self):
+        return self.registry.render()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_metrics():
+    """进程内共用的请求指标（所有 HuifuSDKAPI 实例默认记录到这里）"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = RequestMetrics()
+        return _default
+
+
+_servers = {}
+
+
+def start_http_server(port, host="127.0.0.1", metrics=None):
+    """
+    在后台线程启动本地HTTP服务，GET /metrics 返回 Prometheus 文本（同一端口只启动一次）
+
+    :param port: 端口（0 表示随机端口）
+    :param host: 监听地址，默认只监听本机
+    :param metrics: RequestMetrics，默认 default_metrics()
+    :return: ThreadingHTTPServer（server.server_address 为实际地址）
+    """
+    metrics = metrics or default_metrics()
+    key = (host, port)
+    if port and key in _servers:
+        return _servers[key]
+
+    # http.server 只在启动指标服务时导入，不拖慢客户端启动
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    if port:
+        _servers[key] = server
+    return server
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+本地异步通知模拟脚本
+向 notify_server.py 发送签名的支付结果通知，用于本地联调
+
+使用方法：
+1. 生成一对测试密钥（汇付的真实私钥无法获取，本地测试用自己的密钥对）：
+   python notify_sender.py --gen-keys keys/test
+
+2. 用测试公钥启动通知服务：
+   python notify_server.py --port 8080 --public-key-file keys/test_public.pem
+
+3. 发送通知（--repeat 可模拟汇付的重复通知）：
+   python notify_sender.py --url http://127.0.0.1:8080/notify --private-key-file keys/test_private.pem \\
+       --req-seq-id "1435964137120268288_20251106_309379_PAY" --hf-seq-id "002900TOP1A..." --trans-stat S --repeat 3
+"""
+
+import argparse
+import base64
+import json
+import sys
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+
+def generate_key_pair(prefix):
+    """生成测试用RSA密钥对：{prefix}_private.pem / {prefix}_public.pem"""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with open(f"{prefix}_private.pem", 'wb') as f:
+        f.write(private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        ))
+    with open(f"{prefix}_public.pem", 'wb') as f:
+        f.write(private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ))
+    print(f"✅ 已生成测试密钥: {prefix}_private.pem / {prefix}_public.pem")
+
+
+def build_notify_body(resp_data, private_key):
+    """
+    按汇付异步通知格式构造表单请求体
+
+    :param resp_data: 通知业务数据字典
+    :param private_key: 签名私钥对象
+    :return: 表单编码的请求体（bytes）
+    """
+    resp_data_str = json.dumps(resp_data, ensure_ascii=False, separators=(',', ':'))
+    sign = private_key.sign(resp_data_str.encode('utf-8'), padding.PKCS1v15(), hashes.SHA256())
+    return urlencode({
+        "resp_code": "00000000",
+        "resp_desc": "成功",
+        "resp_data": resp_data_str,
+        "sign": base64.b64encode(sign).decode('utf-8'),
+    }).encode('utf-8')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="发送签名的汇付异步通知（本地测试）")
+    parser.add_argument("--gen-keys", metavar="PREFIX", help="生成测试密钥对后退出")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/notify")
+    parser.add_argument("--private-key-file", help="签名私钥文件（PEM）")
+    parser.add_argument("--req-seq-id", default="")
+    parser.add_argument("--hf-seq-id", default="")
+    parser.add_argument("--party-order-id", default="")
+    parser.add_argument("--trans-stat", default="S", choices=["S", "F", "C", "P"])
+    parser.add_argument("--trans-amt", default="1.00")
+    parser.add_argument("--repeat", type=int, default=1, help="重复发送次数（模拟重复通知）")
+    args = parser.parse_args()
+
+    if args.gen_keys:
+        generate_key_pair(args.gen_keys)
+        return
+
+    if not args.private_key_file:
+        print("❌ 请通过 --private-key-file 指定签名私钥")
+        sys.exit(1)
+    if not args.req_seq_id and not args.hf_seq_id and not args.party_order_id:
+        print("❌ 至少需要提供一个订单标识（--req-seq-id、--hf-seq-id 或 --party-order-id）")
+        sys.exit(1)
+
+    with open(args.private_key_file, 'rb') as f:
+        private_key = serialization.load_pem_private_key(f.read(), password=None)
+
+    resp_data = {
+        "resp_code": "00000000",
+        "resp_desc": "交易成功" if args.trans_stat == "S" else "",
+        "req_seq_id": args.req_seq_id,
+        "hf_seq_id": args.hf_seq_id,
+        "party_order_id": args.party_order_id,
+        "trans_stat": args.trans_stat,
+        "trans_amt": args.trans_amt,
+    }
+    body = build_notify_body({k: v for k, v in resp_data.items() if v}, private_key)
+
+    for i in range(args.repeat):
+        request = Request(args.url, data=body, headers={"Content-Type": "application/x-www-form-urlencoded"})
+        try:
+            with urlopen(request, timeout=10) as resp:
+                print(f"[{i + 1}] HTTP {resp.status}: {resp.read().decode('utf-8')}")
+        except Exception as e:
+            print(f"[{i + 1}] ❌ 发送失败: {e}")
+
+
+if __name__ == "__main__":
+    main()
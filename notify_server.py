@@ -0,0 +1,409 @@
+# -*- coding: utf-8 -*-
+"""
+汇付异步通知接收服务（notify_url）
+
+汇付在交易完成后向 notify_url 发送 POST 通知（application/x-www-form-urlencoded）：
+    resp_code / resp_desc / resp_data（JSON字符串）/ sign
+sign 是汇付私钥对 resp_data 原文的 SHA256withRSA 签名，使用 HUIFU_PUBLIC_KEY 验签。
+处理成功后需返回 RECV_ORD_ID_ + req_seq_id，否则汇付会重复通知。
+
+收到通知后：
+- 验签失败的通知直接拒绝
+- 重复通知（同一订单、同一交易状态）只应答不重复处理
+- 立即唤醒正在 wait_for_payment / OrderWatcher 中等待的订单，轮询只作为兜底
+
+使用方法：
+    python notify_server.py --port 8080
+    python notify_server.py --port 8080 --public-key-file keys/test_public.pem
+"""
+
+import asyncio
+import json
+import threading
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+from key_registry import default_registry, load_public_key, rsa_verify
+
+
+# 交易终态：S = 成功, F = 失败, C = 关闭
+FINAL_STATS = ("S", "F", "C")
+
+
+class NotifyHub:
+    """
+    通知分发中心
+
+    把已验签的通知分发给同步等待者（wait_for_payment）和监听者（OrderWatcher等），
+    并对重复通知去重。线程安全：通知服务与同步等待者可以在不同线程中。
+    """
+
+    def __init__(self, dedup_size=100000, fallback_poll_interval=30):
+        """
+        :param dedup_size: 去重窗口大小（最近处理过的通知条数）
+        :param fallback_poll_interval: 接入通知后 wait_for_payment 的兜底轮询间隔（秒）
+        """
+        self.dedup_size = dedup_size
+        self.fallback_poll_interval = fallback_poll_interval
+        self._lock = threading.Lock()
+        self._seen = OrderedDict()       # (订单键, trans_stat) -> None
+        self._results = OrderedDict()    # 订单标识 -> 终态通知（供稍后开始等待的调用方使用）
+        self._waiters = {}               # 订单标识 -> {threading.Event}（同一订单可以有多个等待者）
+        self._async_waiters = {}         # 订单标识 -> {(事件循环, asyncio.Future)}
+        self._listeners = []
+
+        # 统计信息
+        self.received = 0
+        self.duplicates = 0
+
+    def add_listener(self, callback):
+        """
+        注册监听者
+
+        :param callback: callback(data)，data 为通知中的 resp_data 字典；在通知服务线程中调用
+        """
+        self._listeners.append(callback)
+        return callback
+
+    def attach_watcher(self, watcher):
+        """把通知接入 OrderWatcher：终态通知直接结束对应订单的轮询（需与通知服务在同一事件循环）"""
+        def on_notify(data):
+            for identifier in _identifiers(data):
+                if watcher.resolve(identifier, data):
+                    break
+        return self.add_listener(on_notify)
+
+    def publish(self, data):
+        """
+        分发一条已验签的通知
+
+        :param data: resp_data 字典
+        :return: 是否为新通知（重复通知返回 False）
+        """
+        identifiers = _identifiers(data)
+        trans_stat = data.get("trans_stat", "")
+        dedup_key = (identifiers[0] if identifiers else "", trans_stat)
+
+        with self._lock:
+            self.received += 1
+            if dedup_key in self._seen:
+                self.duplicates += 1
+                return False
+            self._seen[dedup_key] = None
+            if len(self._seen) > self.dedup_size:
+                self._seen.popitem(last=False)
+
+            events = set()
+            futures = set()
+            if trans_stat in FINAL_STATS:
+                for identifier in identifiers:
+                    self._results[identifier] = data
+                    events.update(self._waiters.pop(identifier, ()))
+                    futures.update(self._async_waiters.pop(identifier, ()))
+                while len(self._results) > self.dedup_size:
+                    self._results.popitem(last=False)
+
+        for event in events:
+            event.set()
+        for loop, future in futures:
+            loop.call_soon_threadsafe(_set_future_result, future, data)
+        for callback in self._listeners:
+            try:
+                callback(data)
+            except Exception as e:
+                print(f"⚠️ 通知监听者异常: {e}")
+        return True
+
+    def get_result(self, *identifiers):
+        """返回已收到的终态通知（任一标识命中即可），没有则返回 None"""
+        with self._lock:
+            for identifier in identifiers:
+                if identifier and identifier in self._results:
+                    return self._results[identifier]
+        return None
+
+    def wait(self, identifiers, timeout):
+        """
+        阻塞等待订单的终态通知
+
+        :param identifiers: 订单标识列表（req_seq_id / hf_seq_id / party_order_id）
+        :param timeout: 最长等待时间（秒）
+        :return: 终态通知字典，超时返回 None
+        """
+        identifiers = [i for i in identifiers if i]
+        with self._lock:
+            for identifier in identifiers:
+                if identifier in self._results:
+                    return self._results[identifier]
+            event = threading.Event()
+            _add_waiter(self._waiters, identifiers, event)
+
+        event.wait(timeout)
+
+        with self._lock:
+            _remove_waiter(self._waiters, identifiers, event)
+            return self._find_result(identifiers)
+
+    async def wait_async(self, identifiers, timeout):
+        """
+        wait() 的异步版本，等待期间不占用线程
+
+        :param identifiers: 订单标识列表
+        :param timeout: 最长等待时间（秒）
+        :return: 终态通知字典，超时返回 None
+        """
+        identifiers = [i for i in identifiers if i]
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        with self._lock:
+            for identifier in identifiers:
+                if identifier in self._results:
+                    return self._results[identifier]
+            _add_waiter(self._async_waiters, identifiers, waiter)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                _remove_waiter(self._async_waiters, identifiers, waiter)
+        # 超时的同时收到的通知：结果已记录，但唤醒还没送达事件循环
+        with self._lock:
+            return self._find_result(identifiers)
+
+    def _find_result(self, identifiers):
+        """已收到的终态通知（调用方持有锁）"""
+        for identifier in identifiers:
+            if identifier in self._results:
+                return self._results[identifier]
+        return None
+
+
+def _add_waiter(waiters, identifiers, waiter):
+    for identifier in identifiers:
+        waiters.setdefault(identifier, set()).add(waiter)
+
+
+def _remove_waiter(waiters, identifiers, waiter):
+    for identifier in identifiers:
+        pending = waiters.get(identifier)
+        if pending is not None:
+            pending.discard(waiter)
+            if not pending:
+                del waiters[identifier]
+
+
+def _set_future_result(future, data):
+    if not future.done():
+        future.set_result(data)
+
+
+def _identifiers(data):
+    """通知中的订单标识，按 hf_seq_id、req_seq_id、party_order_id 的优先级排列"""
+    return [data[k] for k in ("hf_seq_id", "req_seq_id", "party_order_id") if data.get(k)]
+
+
+class NotifyVerifier:
+    """通知验签器：公钥对象来自 key_registry，只解析一次"""
+
+    def __init__(self, public_key_pem=None):
+        """
+        :param public_key_pem: 汇付公钥（PEM），默认使用 keys/public_key.txt（文件更新后自动重新加载）
+        """
+        if public_key_pem is None:
+            registry = default_registry()
+            self._get_public_key = lambda: registry.public_key
+        else:
+            public_key = load_public_key(public_key_pem)
+            self._get_public_key = lambda: public_key
+        # 启动时即检查公钥配置，避免运行中才发现
+        self._get_public_key()
+
+    def verify(self, resp_data, sign):
+        """
+        验证通知签名
+
+        :param resp_data: 通知中的 resp_data 原文
+        :param sign: base64 签名
+        :return: 签名是否有效
+        """
+        return rsa_verify(self._get_public_key(), resp_data, sign)
+
+
+class NotifyServer:
+    """基于 asyncio 的轻量 HTTP 通知接收服务（无需额外Web框架）"""
+
+    MAX_BODY = 1024 * 1024
+
+    def __init__(self, hub, verifier=None, host="0.0.0.0", port=8080, path="/notify"):
+        """
+        :param hub: NotifyHub 实例
+        :param verifier: NotifyVerifier 实例（默认使用 config.HUIFU_PUBLIC_KEY）
+        :param host: 监听地址
+        :param port: 监听端口
+        :param path: 通知路径（与 notify_url 一致）
+        """
+        self.hub = hub
+        self.verifier = verifier or NotifyVerifier()
+        self.host = host
+        self.port = port
+        self.path = path
+        self._server = None
+
+        # 统计信息
+        self.rejected = 0
+
+    async def start(self):
+        """启动监听"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        if self.port == 0:
+            self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def handle_notify(self, body):
+        """
+        处理一条通知
+
+        :param body: 表单编码的请求体
+        :return: (HTTP状态码, 应答文本)
+        """
+        form = parse_qs(body.decode('utf-8'), keep_blank_values=True)
+        resp_data = form.get("resp_data", [""])[0]
+        sign = form.get("sign", [""])[0]
+
+        if not resp_data or not sign or not self.verifier.verify(resp_data, sign):
+            self.rejected += 1
+            return 400, "sign error"
+
+        try:
+            data = json.loads(resp_data)
+        except ValueError:
+            self.rejected += 1
+            return 400, "bad resp_data"
+
+        self.hub.publish(data)
+        # 重复通知同样需要应答，否则汇付会继续重发
+        return 200, f"RECV_ORD_ID_{data.get('req_seq_id', '')}"
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode('latin-1').partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                if length > self.MAX_BODY:
+                    status, text = 413, "too large"
+                    body = b""
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    if method != "POST" or target.split("?", 1)[0] != self.path:
+                        status, text = 404, "not found"
+                    else:
+                        status, text = self.handle_notify(body)
+
+                payload = text.encode('utf-8')
+                keep_alive = headers.get("connection", "").lower() != "close" and status != 413
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'ERROR'}\r\n"
+                    f"Content-Type: text/plain; charset=utf-8\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def start_in_thread(hub, verifier=None, host="127.0.0.1", port=8080, path="/notify"):
+    """
+    在后台线程中启动通知服务（供同步程序使用，例如配合 wait_for_payment）
+
+    :return: 已启动的 NotifyServer 实例
+    :raises OSError: 启动失败（例如端口已被占用），异常来自后台线程
+    """
+    server = NotifyServer(hub, verifier, host, port, path)
+    started = threading.Event()
+    failure = []
+
+    def run():
+        async def main():
+            try:
+                await server.start()
+            except BaseException as e:
+                failure.append(e)
+                raise
+            finally:
+                # 启动成功或失败都唤醒调用方，不会一直等待
+                started.set()
+            await server.serve_forever()
+        try:
+            asyncio.run(main())
+        except Exception:
+            if not failure:
+                raise
+
+    threading.Thread(target=run, name="huifu-notify", daemon=True).start()
+    started.wait()
+    if failure:
+        raise failure[0]
+    return server
+
+
+def main():
+    """命令行启动通知服务"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="汇付异步通知接收服务")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--path", default="/notify")
+    parser.add_argument("--public-key-file", help="验签公钥文件（默认使用 keys/public_key.txt）")
+    args = parser.parse_args()
+
+    public_key_pem = None
+    if args.public_key_file:
+        from config import load_key_file
+        public_key_pem = load_key_file(args.public_key_file, key_type='public')
+
+    hub = NotifyHub()
+    hub.add_listener(lambda data: print(
+        f"📩 收到通知: {data.get('req_seq_id', '')} {data.get('hf_seq_id', '')} 交易状态: {data.get('trans_stat', '')}"
+    ))
+    server = NotifyServer(hub, NotifyVerifier(public_key_pem), args.host, args.port, args.path)
+    print(f"✅ 通知服务已启动: http://{args.host}:{args.port}{args.path}")
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        print("\n通知服务已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+# -*- coding: utf-8 -*-
+"""
+本地订单库（SQLite，WAL 模式）
+
+记录每一笔支付 / 退款的请求与响应，重启后仍可查到未完成的订单，
+退款、查询时只需提供任意一个订单标识即可在本地补全原交易信息：
+- 按 req_seq_id（唯一）、hf_seq_id、party_order_id、req_date 建索引
+- 写入经由后台线程批量提交：队列中积压的写操作合并为一个事务
+- 支付 / 退款发送前的请求记录（record_request）等待所在事务提交后才返回：
+  发送之后进程即使立即崩溃，这笔订单也已经在库中；提交失败时抛出 OrderStoreError，请求不会发出。
+  多个线程同时下单时它们的记录合并在同一个事务中提交
+- 响应、查询状态回写是异步的，调用方不等待磁盘；需要立即读到这些记录时先调用 flush()
+- WAL 模式下读写互不阻塞：每个线程使用自己的只读连接查询
+
+使用方法：
+    store = get_store("orders.db")
+    order = store.find("002900TOP1A251106141456P102ac139caf00000")
+"""
+
+import atexit
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+from api_log import logger
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    req_seq_id TEXT NOT NULL UNIQUE,
+    req_date TEXT,
+    kind TEXT,
+    huifu_id TEXT,
+    hf_seq_id TEXT,
+    party_order_id TEXT,
+    trans_amt TEXT,
+    trans_stat TEXT,
+    resp_code TEXT,
+    resp_desc TEXT,
+    org_req_seq_id TEXT,
+    org_req_date TEXT,
+    org_hf_seq_id TEXT,
+    request TEXT,
+    response TEXT,
+    created_at REAL,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_hf_seq_id ON orders (hf_seq_id) WHERE hf_seq_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_orders_party_order_id ON orders (party_order_id) WHERE party_order_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_orders_req_date ON orders (req_date);
+CREATE INDEX IF NOT EXISTS idx_orders_pending ON orders (kind, created_at) WHERE trans_stat IS NULL OR trans_stat = 'P';
+"""
+
+COLUMNS = ("req_seq_id", "req_date", "kind", "huifu_id", "hf_seq_id", "party_order_id", "trans_amt",
+           "trans_stat", "resp_code", "resp_desc", "org_req_seq_id", "org_req_date", "org_hf_seq_id",
+           "request", "response", "created_at", "updated_at")
+
+# 同一流水号再次写入时：新值非空才覆盖，created_at 保留首次写入的时间
+_UPSERT_SQL = "INSERT INTO orders ({}) VALUES ({}) ON CONFLICT (req_seq_id) DO UPDATE SET {}".format(
+    ", ".join(COLUMNS),
+    ", ".join("?" * len(COLUMNS)),
+    ", ".join(f"{c} = COALESCE(excluded.{c}, {c})" for c in COLUMNS if c not in ("req_seq_id", "created_at")),
+)
+
+# 查询结果回写原支付订单：按任意一个标识定位
+_UPDATE_STAT_SQL = """
+UPDATE orders SET trans_stat = ?, hf_seq_id = COALESCE(hf_seq_id, ?),
+    party_order_id = COALESCE(party_order_id, ?), updated_at = ?
+WHERE req_seq_id = (
+    SELECT req_seq_id FROM orders WHERE req_seq_id = ? AND kind = 'pay'
+    UNION ALL SELECT req_seq_id FROM orders WHERE hf_seq_id = ? AND kind = 'pay'
+    UNION ALL SELECT req_seq_id FROM orders WHERE party_order_id = ? AND kind = 'pay'
+    LIMIT 1
+)
+"""
+
+# 退款查询结果回写退款订单（只更新已记录的退款）
+_UPDATE_REFUND_SQL = """
+UPDATE orders SET trans_stat = ?, hf_seq_id = COALESCE(hf_seq_id, ?), resp_code = ?, resp_desc = ?, updated_at = ?
+WHERE req_seq_id = ? AND kind = 'refund'
+"""
+
+# 各接口记录为哪类订单
+KINDS = {"jspay": "pay", "scanpay_refund": "refund"}
+
+_STOP = object()
+
+
+class OrderStoreError(Exception):
+    """发送前的请求记录没有落库（请求未发送）"""
+
+
+class _Commit:
+    """等待一次写操作所在的事务提交"""
+
+    __slots__ = ("_event", "error")
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.error = None
+
+    def set(self, error=None):
+        self.error = error
+        self._event.set()
+
+    def wait(self, writer, timeout):
+        """
+        :param writer: 写线程（线程退出后不再等待）
+        :param timeout: 最多等待的秒数
+        """
+        deadline = time.monotonic() + timeout
+        while not self._event.wait(0.5):
+            if not writer.is_alive():
+                raise OrderStoreError("订单库写线程已退出，请求未发送")
+            if time.monotonic() >= deadline:
+                raise OrderStoreError(f"订单库 {timeout:g} 秒内没有提交，请求未发送")
+        if self.error is not None:
+            raise OrderStoreError(f"订单库写入失败，请求未发送: {self.error}") from self.error
+
+
+def fields_of(request, extend_infos=None):
+    """
+    请求对象上设置的字段与 extend_infos 合并为一个字典
+
+    :param request: dg_sdk 请求对象或 huifu_backend.NativeRequest
+    :param extend_infos: 非必填字段字典
+    """
+    fields = dict(extend_infos or {})
+    for key, value in vars(request).items():
+        if not key.startswith("_") and value not in (None, ""):
+            fields[key] = value
+    return fields
+
+
+class OrderStore:
+    """本地订单库（线程安全）"""
+
+    def __init__(self, path, batch_size=512, commit_timeout=35.0):
+        """
+        :param path: 数据库文件路径
+        :param batch_size: 单个事务最多合并的写操作数
+        :param commit_timeout: 发送前的请求记录最多等待提交的秒数（应大于 SQLite 的锁等待时间 30 秒）
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.commit_timeout = commit_timeout
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._closed = False
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        conn.commit()
+        self._writer_conn = conn
+        self._writer = threading.Thread(target=self._write_loop, name="order-store-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        # WAL 下 NORMAL 已能保证进程崩溃不丢已提交的事务（仅断电可能丢失最后几个事务）
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self):
+        """当前线程的只读连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            conn.execute("PRAGMA query_only=1")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    # ---------- 写入 ----------
+
+    def _write_loop(self):
+        conn = self._writer_conn
+        while True:
+            ops = [self._queue.get()]
+            while len(ops) < self.batch_size:
+                try:
+                    ops.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(op is _STOP for op in ops)
+            commits = [op[2] for op in ops if op is not _STOP and op[2] is not None]
+            error = None
+            try:
+                with conn:
+                    # 连续的同类写操作合并为一次 executemany，保持先后顺序
+                    sql, rows = None, []
+                    for op in ops:
+                        if op is _STOP:
+                            continue
+                        if op[0] != sql and rows:
+                            conn.executemany(sql, rows)
+                            rows = []
+                        sql = op[0]
+                        rows.append(op[1])
+                    if rows:
+                        conn.executemany(sql, rows)
+            except sqlite3.Error as e:
+                error = e
+                # 发送前的记录由调用方收到 OrderStoreError；响应、状态回写的失败只能记录日志
+                logger.error("订单库写入失败 ops=%d path=%s error=%s", len(ops), self.path, e)
+            finally:
+                # 事务已提交（或失败）：唤醒等待落库的发送方
+                for commit in commits:
+                    commit.set(error)
+                for _ in ops:
+                    self._queue.task_done()
+            if stop:
+                conn.close()
+                return
+
+    def _submit(self, sql, row, durable=False):
+        """
+        提交写操作
+
+        :param durable: 是否等待所在事务提交后再返回
+        :raises OrderStoreError: durable 时订单库已关闭、写线程已退出、提交超时或失败
+        """
+        if self._closed:
+            if durable:
+                raise OrderStoreError("订单库已关闭，请求未发送")
+            return
+        if not durable:
+            self._queue.put((sql, row, None))
+            return
+        commit = _Commit()
+        self._queue.put((sql, row, commit))
+        commit.wait(self._writer, self.commit_timeout)
+
+    def upsert(self, durable=False, **values):
+        """
+        写入或更新一笔订单（未提供的字段保持原值）
+
+        :param durable: 是否等待落库后再返回
+        """
+        now = time.time()
+        values.setdefault("created_at", now)
+        values.setdefault("updated_at", now)
+        self._submit(_UPSERT_SQL, tuple(values.get(c) for c in COLUMNS), durable)
+
+    def record_request(self, endpoint, fields):
+        """
+        发送前记录请求（之后没有响应的订单即为结果未知），落库后才返回
+
+        :param endpoint: 接口名称（huifu_backend.ENDPOINTS 的键）
+        :param fields: 请求字段（见 fields_of）
+        :raises OrderStoreError: 记录没有落库（调用方不应发送请求）
+        """
+        kind = KINDS.get(endpoint)
+        if kind is None or not fields.get("req_seq_id"):
+            return
+        self.upsert(
+            req_seq_id=fields["req_seq_id"],
+            req_date=fields.get("req_date"),
+            kind=kind,
+            huifu_id=fields.get("huifu_id"),
+            party_order_id=fields.get("party_order_id") if kind == "pay" else None,
+            trans_amt=fields.get("trans_amt") or fields.get("ord_amt"),
+            org_req_seq_id=fields.get("org_req_seq_id"),
+            org_req_date=fields.get("org_req_date"),
+            org_hf_seq_id=fields.get("org_hf_seq_id"),
+            request=json.dumps(fields, ensure_ascii=False),
+            durable=True,
+        )
+
+    def record_response(self, endpoint, fields, response):
+        """
+        记录响应：支付 / 退款更新本笔订单，查询把交易状态回写到原订单，退款查询回写到退款订单
+
+        :param endpoint: 接口名称
+        :param fields: 请求字段（见 fields_of）
+        :param response: 响应字典
+        """
+        if not isinstance(response, dict):
+            return
+        resp_code = response.get("resp_code", "")
+        if endpoint == "scanpay_query":
+            if not resp_code.startswith("0000") or not response.get("trans_stat"):
+                return
+            req_seq_id = fields.get("req_seq_id") or fields.get("org_req_seq_id")
+            hf_seq_id = fields.get("hf_seq_id") or fields.get("org_hf_seq_id")
+            party_order_id = fields.get("party_order_id") or fields.get("out_ord_id")
+            self._submit(_UPDATE_STAT_SQL, (
+                response["trans_stat"], response.get("hf_seq_id") or None, response.get("party_order_id") or None,
+                time.time(), req_seq_id, hf_seq_id, party_order_id,
+            ))
+            return
+        if endpoint == "scanpay_refundquery":
+            # 结果未知的退款经查询确认后，订单库中的状态与网关一致
+            if not resp_code.startswith("0000") or not response.get("trans_stat") or not fields.get("org_req_seq_id"):
+                return
+            self._submit(_UPDATE_REFUND_SQL, (
+                response["trans_stat"], response.get("hf_seq_id") or response.get("org_hf_seq_id") or None,
+                resp_code, response.get("resp_desc") or None, time.time(), fields["org_req_seq_id"],
+            ))
+            return
+        kind = KINDS.get(endpoint)
+        if kind is None or not fields.get("req_seq_id"):
+            return
+        self.upsert(
+            req_seq_id=fields["req_seq_id"],
+            kind=kind,
+            hf_seq_id=response.get("hf_seq_id") or None,
+            party_order_id=(response.get("party_order_id") or None) if kind == "pay" else None,
+            trans_stat=response.get("trans_stat") or ("S" if kind == "refund" and resp_code.startswith("0000") else None),
+            resp_code=resp_code or None,
+            resp_desc=response.get("resp_desc") or None,
+            response=json.dumps(response, ensure_ascii=False),
+        )
+
+    def flush(self):
+        """等待已提交的写操作全部落库"""
+        self._queue.join()
+
+    def close(self):
+        """落库并停止写线程（可重复调用）"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._writer.join()
+
+    # ---------- 查询 ----------
+
+    def _row(self, row):
+        if row is None:
+            return None
+        order = dict(row)
+        for key in ("request", "response"):
+            if order.get(key):
+                order[key] = json.loads(order[key])
+        return order
+
+    def get(self, req_seq_id):
+        """按请求流水号查询"""
+        row = self._reader().execute("SELECT * FROM orders WHERE req_seq_id = ?", (req_seq_id,)).fetchone()
+        return self._row(row)
+
+    def find(self, identifier, kind=None):
+        """
+        按任意一个订单标识（req_seq_id / hf_seq_id / party_order_id）查询
+
+        :param identifier: 订单标识
+        :param kind: 只查某类订单（"pay" / "refund"），默认不限
+        :return: 订单字典，没有记录时返回 None
+        """
+        if not identifier:
+            return None
+        conn = self._reader()
+        for column in ("req_seq_id", "hf_seq_id", "party_order_id"):
+            if kind is None:
+                row = conn.execute(f"SELECT * FROM orders WHERE {column} = ? LIMIT 1", (identifier,)).fetchone()
+            else:
+                row = conn.execute(f"SELECT * FROM orders WHERE {column} = ? AND kind = ? LIMIT 1",
+                                   (identifier, kind)).fetchone()
+            if row is not None:
+                return self._row(row)
+        return None
+
+    def by_date(self, req_date, kind=None):
+        """某一天的全部订单（按写入时间排序）"""
+        sql = "SELECT * FROM orders WHERE req_date = ?"
+        params = [req_date]
+        if kind is not None:
+            sql += " AND kind = ?"
+            params.append(kind)
+        rows = self._reader().execute(sql + " ORDER BY created_at", params).fetchall()
+        return [self._row(row) for row in rows]
+
+    def pending(self, kind="pay", limit=100):
+        """
+        未完成的订单：已发送但没有响应，或交易状态仍为处理中
+
+        :return: 订单字典列表（最近的在前）
+        """
+        rows = self._reader().execute(
+            "SELECT * FROM orders WHERE (trans_stat IS NULL OR trans_stat = 'P') AND kind = ? "
+            "ORDER BY created_at DESC LIMIT ?", (kind, limit)).fetchall()
+        return [self._row(row) for row in rows]
+
+    def count(self):
+        return self._reader().execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path):
+    """同一数据库文件在进程内共用一个 OrderStore（只有一个写线程）"""
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None or store._closed:
+            store = _stores[path] = OrderStore(path)
+        return store
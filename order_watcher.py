@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""
+订单状态监控调度器
+
+用一个事件循环同时监控大量处理中（P）的订单，替代每笔订单一个
+wait_for_payment 阻塞线程的做法：
+
+    watcher = OrderWatcher(AsyncHuifuAPI(), max_qps=50)
+    watcher.watch(hf_seq_id="...", deadline=300)
+    asyncio.create_task(watcher.run())
+    async for event in watcher.events():
+        print(event.key, event.old_stat, "->", event.new_stat)
+
+调度方式：
+- 最小堆保存每笔订单的下次查询时间，只需一个定时器
+- 首次查询时间在一个轮询间隔内随机打散，之后间隔带抖动并逐步退避，避免查询突发
+- 全局查询速率上限（max_qps）与在途查询上限（max_in_flight）
+- 订单进入终态（S/F/C）或超过截止时间后立即移出，内存随在途订单数线性增长并有上限
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+
+
+# 交易终态：S = 成功, F = 失败, C = 关闭
+FINAL_STATS = ("S", "F", "C")
+
+
+class OrderEvent:
+    """订单状态变化事件"""
+
+    __slots__ = ("key", "old_stat", "new_stat", "response", "timed_out")
+
+    def __init__(self, key, old_stat, new_stat, response=None, timed_out=False):
+        self.key = key
+        self.old_stat = old_stat
+        self.new_stat = new_stat
+        self.response = response
+        self.timed_out = timed_out
+
+    def __repr__(self):
+        if self.timed_out:
+            return f"OrderEvent({self.key!r}, timeout)"
+        return f"OrderEvent({self.key!r}, {self.old_stat!r} -> {self.new_stat!r})"
+
+
+class _WatchedOrder:
+    """被监控订单的内部状态（__slots__ 控制单笔订单的内存开销）"""
+
+    __slots__ = ("key", "req_seq_id", "req_date", "hf_seq_id", "party_order_id",
+                 "deadline", "interval", "trans_stat", "polls", "ticket")
+
+    def __init__(self, key, req_seq_id, req_date, hf_seq_id, party_order_id, deadline, interval):
+        self.key = key
+        self.req_seq_id = req_seq_id
+        self.req_date = req_date
+        self.hf_seq_id = hf_seq_id
+        self.party_order_id = party_order_id
+        self.deadline = deadline
+        self.interval = interval
+        self.trans_stat = "P"
+        self.polls = 0
+        self.ticket = 0
+
+
+class OrderWatcher:
+    """共享轮询调度器：一个事件循环监控上万笔待支付订单"""
+
+    def __init__(self, api, max_qps=20, max_in_flight=32, max_orders=20000,
+                 poll_interval=3, max_poll_interval=30, backoff=1.5, jitter=0.2,
+                 event_queue_size=10000):
+        """
+        初始化调度器
+
+        :param api: AsyncHuifuAPI 实例（使用其 query_order 查询）
+        :param max_qps: 全局查询速率上限（次/秒）
+        :param max_in_flight: 同时在途的查询上限
+        :param max_orders: 同时监控的订单上限
+        :param poll_interval: 初始轮询间隔（秒）
+        :param max_poll_interval: 退避后的最大轮询间隔（秒）
+        :param backoff: 每次仍为处理中时轮询间隔的放大倍数
+        :param jitter: 轮询间隔的随机抖动比例（0.2 表示 ±20%）
+        :param event_queue_size: events() 事件队列长度，满时丢弃最早的事件
+        """
+        self.api = api
+        self.max_qps = max_qps
+        self.max_in_flight = max_in_flight
+        self.max_orders = max_orders
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.event_queue_size = event_queue_size
+
+        self._orders = {}        # key -> _WatchedOrder
+        self._index = {}         # 任一订单标识 -> key
+        self._heap = []          # (下次查询时间, ticket, key)
+        self._tickets = itertools.count(1)
+        self._callbacks = []
+        self._queue = None
+        self._wakeup = None
+        self._in_flight = None
+        self._tasks = set()
+        self._next_slot = 0.0
+        self._running = False
+
+        # 统计信息
+        self.queries = 0
+        self.poll_errors = 0
+        self.dropped_events = 0
+
+    def __len__(self):
+        return len(self._orders)
+
+    # ------------------------------------------------------------------
+    # 注册 / 注销
+    # ------------------------------------------------------------------
+
+    def watch(self, req_seq_id=None, req_date=None, hf_seq_id=None, party_order_id=None, deadline=300):
+        """
+        注册一笔待监控订单
+
+        :param req_seq_id: 请求流水号（可选）
+        :param req_date: 请求日期（YYYYMMDD格式）
+        :param hf_seq_id: 汇付流水号（推荐使用）
+        :param party_order_id: 商户单号（可选）
+        :param deadline: 最长监控时间（秒），超时后产生 timeout 事件
+        :return: 订单键（优先使用 hf_seq_id）
+        """
+        key = hf_seq_id or req_seq_id or party_order_id
+        if not key:
+            raise ValueError("至少需要提供一个订单标识（req_seq_id、hf_seq_id 或 party_order_id）")
+        if key in self._orders:
+            return key
+        if len(self._orders) >= self.max_orders:
+            raise RuntimeError(f"监控订单数已达上限: {self.max_orders}")
+
+        now = time.monotonic()
+        order = _WatchedOrder(key, req_seq_id, req_date, hf_seq_id, party_order_id,
+                              now + deadline, self.poll_interval)
+        self._orders[key] = order
+        for identifier in (req_seq_id, hf_seq_id, party_order_id):
+            if identifier:
+                self._index[identifier] = key
+
+        # 首次查询在一个轮询间隔内随机打散，避免批量注册时集中查询
+        self._schedule(order, now + random.uniform(0, self.poll_interval))
+        return key
+
+    def unwatch(self, key):
+        """
+        取消监控（堆中的旧条目会在弹出时被忽略）
+
+        :param key: watch() 返回的订单键或任一订单标识
+        :return: 被移除的订单是否存在
+        """
+        key = self._index.get(key, key)
+        order = self._orders.pop(key, None)
+        if order is None:
+            return False
+        for identifier in (order.req_seq_id, order.hf_seq_id, order.party_order_id):
+            if identifier:
+                self._index.pop(identifier, None)
+        return True
+
+    def find(self, identifier):
+        """根据任一订单标识查找订单键，未监控时返回 None"""
+        return self._index.get(identifier)
+
+    def resolve(self, identifier, response):
+        """
+        由外部来源（如异步通知）直接确认订单状态，无需等待下一次轮询
+
+        :param identifier: 任一订单标识
+        :param response: 包含 trans_stat 的响应或通知字典
+        :return: 是否结束了一笔被监控的订单
+        """
+        key = self._index.get(identifier)
+        order = self._orders.get(key) if key else None
+        trans_stat = response.get("trans_stat", "")
+        if order is None or trans_stat not in FINAL_STATS:
+            return False
+        self._finish(order, trans_stat, response)
+        return True
+
+    def _schedule(self, order, at):
+        """把订单的下次查询时间压入最小堆"""
+        order.ticket = next(self._tickets)
+        heapq.heappush(self._heap, (min(at, order.deadline), order.ticket, order.key))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # ------------------------------------------------------------------
+    # 事件输出
+    # ------------------------------------------------------------------
+
+    def on_event(self, callback):
+        """
+        注册事件回调
+
+        :param callback: callback(event)，在事件循环线程中同步调用
+        """
+        self._callbacks.append(callback)
+        return callback
+
+    async def events(self):
+        """以异步迭代器的形式逐个产出事件，调度器停止且事件取尽后结束"""
+        queue = self._get_queue()
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            yield event
+
+    def _get_queue(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    def _emit(self, event):
+        for callback in self._callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"⚠️ 订单事件回调异常: {e}")
+
+        if self._queue is not None:
+            # 队列有界：消费者跟不上时丢弃最早的事件
+            if self._queue.qsize() >= self.event_queue_size:
+                self._queue.get_nowait()
+                self.dropped_events += 1
+            self._queue.put_nowait(event)
+
+    def _finish(self, order, new_stat, response=None, timed_out=False):
+        """订单离开监控：终态或超时"""
+        old_stat = order.trans_stat
+        order.trans_stat = new_stat
+        self.unwatch(order.key)
+        self._emit(OrderEvent(order.key, old_stat, new_stat, response, timed_out))
+
+    # ------------------------------------------------------------------
+    # 调度主循环
+    # ------------------------------------------------------------------
+
+    async def run(self):
+        """调度主循环，直到 stop() 被调用"""
+        self._running = True
+        self._wakeup = asyncio.Event()
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._get_queue()
+
+        try:
+            while self._running:
+                if not self._heap:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                at, ticket, key = self._heap[0]
+                delay = at - time.monotonic()
+                if delay > 0:
+                    # 等待最近一笔到期，期间有新注册会提前唤醒
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                heapq.heappop(self._heap)
+                order = self._orders.get(key)
+                if order is None or order.ticket != ticket:
+                    # 已取消或已重新调度的旧条目
+                    continue
+
+                if time.monotonic() >= order.deadline:
+                    self._finish(order, order.trans_stat, timed_out=True)
+                    continue
+
+                await self._pace()
+                await self._in_flight.acquire()
+                task = asyncio.ensure_future(self._poll(order))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        finally:
+            self._running = False
+            if self._queue is not None:
+                self._queue.put_nowait(None)
+
+    async def stop(self):
+        """停止调度并等待在途查询完成"""
+        self._running = False
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _pace(self):
+        """按 max_qps 均匀分配查询时隙（允许 5ms 内的微小突发，避免过细的 sleep）"""
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + 1.0 / self.max_qps
+        if slot - now > 0.005:
+            await asyncio.sleep(slot - now)
+
+    async def _poll(self, order):
+        """查询一次订单并处理状态变化；查询或事件回调出错时也会重新调度，订单总会进入终态或超时"""
+        try:
+            try:
+                self.queries += 1
+                order.polls += 1
+                response = await self.api.query_order(
+                    order.req_seq_id, order.req_date, order.hf_seq_id, order.party_order_id
+                )
+            finally:
+                self._in_flight.release()
+
+            if self._orders.get(order.key) is not order:
+                # 查询期间已被取消或已由其他来源确认终态
+                return
+
+            if response and response.get("resp_code", "").startswith("0000"):
+                trans_stat = response.get("trans_stat", "")
+                if trans_stat in FINAL_STATS:
+                    self._finish(order, trans_stat, response)
+                    return
+                if trans_stat and trans_stat != order.trans_stat:
+                    old_stat = order.trans_stat
+                    order.trans_stat = trans_stat
+                    self._emit(OrderEvent(order.key, old_stat, trans_stat, response))
+        except Exception as e:
+            self.poll_errors += 1
+            print(f"⚠️ 订单 {order.key} 查询异常: {e}")
+        finally:
+            # 仍在监控中（处理中、查询失败或出错）：加抖动后重新调度，并逐步退避
+            if self._orders.get(order.key) is order:
+                spread = order.interval * self.jitter
+                self._schedule(order, time.monotonic() + order.interval + random.uniform(-spread, spread))
+                order.interval = min(order.interval * self.backoff, self.max_poll_interval)
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+二维码渲染
+
+- qr_matrix()：编码结果按链接缓存（LRU），同一个 qr_code 重复显示/下载时不再重新编码
+- render_terminal()：半块字符（▀ ▄ █）每行显示两行模块，输出约为每模块两个整块字符的 1/4
+- render_png() / render_svg()：在内存中生成 PNG / SVG 字节，可直接作为HTTP响应返回（不写临时文件）
+
+只有编码依赖 qrcode 库（首次使用时导入）；PNG/SVG 由标准库生成，不需要 PIL。
+
+使用方法：
+    print(render_terminal(qr_code))
+    body = render_png(qr_code, scale=8)        # Content-Type: PNG_CONTENT_TYPE
+    body = render_svg(qr_code)                 # Content-Type: SVG_CONTENT_TYPE
+"""
+
+import functools
+import re
+import struct
+import zlib
+from importlib.util import find_spec
+
+QRCODE_AVAILABLE = find_spec("qrcode") is not None
+
+# 缓存的编码结果数（每个约 1-2KB）
+CACHE_SIZE = 256
+
+PNG_CONTENT_TYPE = "image/png"
+SVG_CONTENT_TYPE = "image/svg+xml"
+
+# 上半/下半模块 → 字符：0 空，1 下半，2 上半，3 整块
+_HALF_BLOCKS = {0: " ", 1: "▄", 2: "▀", 3: "█"}
+_HALF_BLOCKS_INVERTED = {0: "█", 1: "▀", 2: "▄", 3: " "}
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def qr_matrix(data):
+    """
+    编码二维码（纠错等级 L，自动选择版本；不含留白）
+
+    :param data: 二维码内容（如 jspay 响应中的 qr_code 链接）
+    :return: 模块矩阵，每行一个 bytes（1 = 深色模块）
+    """
+    import qrcode
+
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, border=0)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return tuple(bytes(row) for row in qr.get_matrix())
+
+
+def _bordered(data, border):
+    """加上 border 个模块宽的留白"""
+    matrix = qr_matrix(data)
+    if not border:
+        return matrix
+    blank = bytes(len(matrix[0]) + 2 * border)
+    side = bytes(border)
+    return (blank,) * border + tuple(side + row + side for row in matrix) + (blank,) * border
+
+
+def render_terminal(data, border=1, invert=False, compact=True):
+    """
+    渲染为终端文本
+
+    :param border: 留白（模块数）
+    :param invert: 反色（浅色背景的终端使用）
+    :param compact: True 使用半块字符（每行两行模块），False 每个模块两个整块字符（旧格式）
+    :return: 多行字符串（不含末尾换行）
+    """
+    rows = _bordered(data, border)
+    if not compact:
+        dark, light = ("  ", "██") if invert else ("██", "  ")
+        table = {0: light, 1: dark}
+        return "\n".join(row.decode("latin-1").translate(table) for row in rows)
+
+    # 每个字节只有 0/1：上一行左移一位后与下一行相加不会进位，两行合成一行（0-3）
+    width = len(rows[0])
+    if len(rows) % 2:
+        rows = rows + (bytes(width),)
+    table = _HALF_BLOCKS_INVERTED if invert else _HALF_BLOCKS
+    lines = []
+    for i in range(0, len(rows), 2):
+        pair = (int.from_bytes(rows[i], "big") << 1) + int.from_bytes(rows[i + 1], "big")
+        lines.append(pair.to_bytes(width, "big").decode("latin-1").translate(table))
+    return "\n".join(lines)
+
+
+def _png_chunk(kind, payload):
+    return struct.pack(">I", len(payload)) + kind + payload + struct.pack(">I", zlib.crc32(kind + payload))
+
+
+def render_png(data, scale=8, border=4):
+    """
+    渲染为 PNG（1位灰度）
+
+    :param scale: 每个模块的像素数
+    :param border: 留白（模块数，标准要求至少 4）
+    :return: PNG 文件内容（bytes）
+    """
+    rows = _bordered(data, border)
+    size = len(rows[0]) * scale
+    padding = -size % 8
+    # 灰度 1 位：1 = 白（浅色模块），0 = 黑（深色模块）；每个模块展开为 scale 个像素
+    table = {0: "1" * scale, 1: "0" * scale}
+    raw = []
+    for row in rows:
+        bits = row.decode("latin-1").translate(table) + "0" * padding
+        line = b"\x00" + int(bits, 2).to_bytes(len(bits) // 8, "big")
+        raw.append(line * scale)
+    header = struct.pack(">IIBBBBB", size, size, 1, 0, 0, 0, 0)
+    return b"".join((b"\x89PNG\r\n\x1a\n", _png_chunk(b"IHDR", header),
+                     _png_chunk(b"IDAT", zlib.compress(b"".join(raw), 9)), _png_chunk(b"IEND", b"")))
+
+
+_RUN = re.compile("\x01+")
+
+
+def render_svg(data, scale=8, border=4):
+    """
+    渲染为 SVG（同一行相邻的深色模块合并为一个矩形）
+
+    :param scale: 每个模块的显示尺寸（像素）
+    :param border: 留白（模块数）
+    :return: SVG 文件内容（UTF-8 bytes）
+    """
+    matrix = qr_matrix(data)
+    size = len(matrix[0]) + 2 * border
+    path = []
+    for y, row in enumerate(matrix, border):
+        for run in _RUN.finditer(row.decode("latin-1")):
+            length = run.end() - run.start()
+            path.append(f"M{run.start() + border} {y}h{length}v1h-{length}z")
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{size * scale}" height="{size * scale}" '
+            f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+            f'<rect width="{size}" height="{size}" fill="#fff"/>'
+            f'<path d="{"".join(path)}" fill="#000"/></svg>').encode("utf-8")
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+订单查询结果缓存
+
+交易状态为 S（成功）/ F（失败）/ C（关闭）的订单状态不会再变化，查询结果可以一直使用；
+P（处理中）只短时间缓存，避免轮询、重试在极短时间内重复查询同一笔订单。
+
+- 任意一个订单标识（req_seq_id / hf_seq_id / party_order_id）都能命中同一条缓存
+- 按估算的内存占用上限做 LRU 淘汰
+- 线程安全，记录命中/未命中次数
+
+使用方法：
+    cache = QueryCache(max_bytes=16 * 1024 * 1024, pending_ttl=2)
+    response = cache.get(hf_seq_id=hf_seq_id)
+    if response is None:
+        response = ...  # 查询网关
+        cache.put(response, hf_seq_id=hf_seq_id)
+"""
+
+import collections
+import threading
+import time
+
+
+# 不会再变化的交易状态
+TERMINAL_STATS = ("S", "F", "C")
+
+# 响应中可以作为订单标识的字段
+_RESPONSE_ID_FIELDS = ("hf_seq_id", "org_hf_seq_id", "req_seq_id", "org_req_seq_id", "party_order_id")
+
+# 每条缓存、每个标识索引的固定开销估算（字节）
+_ENTRY_OVERHEAD = 400
+_KEY_OVERHEAD = 120
+
+
+def estimate_size(response, keys):
+    """估算一条缓存占用的内存（字节）"""
+    size = _ENTRY_OVERHEAD + _KEY_OVERHEAD * len(keys)
+    for key, value in response.items():
+        size += 50 + len(key) + len(str(value))
+    return size
+
+
+class _Entry:
+    __slots__ = ("response", "expires_at", "size", "keys")
+
+    def __init__(self, response, expires_at, size, keys):
+        self.response = response
+        self.expires_at = expires_at
+        self.size = size
+        self.keys = keys
+
+
+class QueryCache:
+    """订单查询结果缓存（线程安全）"""
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, pending_ttl=2.0):
+        """
+        :param max_bytes: 缓存占用内存上限（估算值，字节），超出时淘汰最久未使用的订单
+        :param pending_ttl: P（处理中）状态的缓存时间（秒），0 表示不缓存
+        """
+        self.max_bytes = max_bytes
+        self.pending_ttl = pending_ttl
+        self._entries = collections.OrderedDict()   # id(entry) -> entry，按最近使用排序
+        self._index = {}                            # 订单标识 -> entry
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _ttl(self, trans_stat):
+        """缓存时间：None 表示永久，0 表示不缓存"""
+        if trans_stat in TERMINAL_STATS:
+            return None
+        if trans_stat == "P":
+            return self.pending_ttl
+        return 0
+
+    def get(self, req_seq_id=None, hf_seq_id=None, party_order_id=None):
+        """
+        按任意一个订单标识取缓存的查询结果
+
+        :return: 响应字典（副本），未命中或已过期时返回 None
+        """
+        now = time.monotonic()
+        with self._lock:
+            for identifier in (req_seq_id, hf_seq_id, party_order_id):
+                entry = self._index.get(identifier) if identifier else None
+                if entry is None:
+                    continue
+                if entry.expires_at is not None and entry.expires_at <= now:
+                    self._remove(entry)
+                    continue
+                self._entries.move_to_end(id(entry))
+                self.hits += 1
+                return dict(entry.response)
+            self.misses += 1
+            return None
+
+    def put(self, response, req_seq_id=None, hf_seq_id=None, party_order_id=None):
+        """
+        缓存一次查询结果（查询失败或状态未知的响应不缓存）
+
+        :param response: 网关返回的响应字典
+        :param req_seq_id / hf_seq_id / party_order_id: 本次查询使用的订单标识
+        :return: 是否已缓存
+        """
+        if not isinstance(response, dict) or not response.get("resp_code", "").startswith("0000"):
+            return False
+        ttl = self._ttl(response.get("trans_stat"))
+        if ttl == 0:
+            return False
+
+        keys = {k for k in (req_seq_id, hf_seq_id, party_order_id) if k}
+        keys.update(response[f] for f in _RESPONSE_ID_FIELDS if response.get(f))
+        if not keys:
+            return False
+        response = dict(response)
+        entry = _Entry(response, None if ttl is None else time.monotonic() + ttl,
+                       estimate_size(response, keys), tuple(keys))
+        if entry.size > self.max_bytes:
+            return False
+
+        with self._lock:
+            # 同一订单的旧结果（任一标识相同）先移除
+            for key in entry.keys:
+                old = self._index.get(key)
+                if old is not None:
+                    self._remove(old)
+            for key in entry.keys:
+                self._index[key] = entry
+            self._entries[id(entry)] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes:
+                _, oldest = self._entries.popitem(last=False)
+                self._drop_keys(oldest)
+                self.evictions += 1
+        return True
+
+    def invalidate(self, identifier):
+        """移除某笔订单的缓存（例如收到异步通知后）"""
+        with self._lock:
+            entry = self._index.get(identifier)
+            if entry is not None:
+                self._remove(entry)
+
+    def _remove(self, entry):
+        if self._entries.pop(id(entry), None) is not None:
+            self._drop_keys(entry)
+
+    def _drop_keys(self, entry):
+        self._bytes -= entry.size
+        for key in entry.keys:
+            if self._index.get(key) is entry:
+                del self._index[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._index.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """命中统计：{"hits", "misses", "hit_rate", "entries", "bytes", "evictions"}"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+            }
@@ -12,19 +12,32 @@
 
 3. 使用请求流水号查询：
    python query_order.py --req-seq-id "1435964137120268288_20251106_309379_PAY"
+
+4. 只提供一个订单标识（从本地订单库补全其余标识和日期，见 order_store.py）：
+   python query_order.py --id "03242511065129633711868"
+
+5. 批量查询（文件或标准输入，每行一个标识，结果以JSONL输出，详见 bulk_query.py）：
+   python query_order.py --bulk hf_ids.txt --concurrency 16 > results.jsonl
+
+本地常驻服务（python huifu_daemon.py）运行时，查询转发给常驻服务执行，不再在本进程内初始化客户端。
 """
 
 import sys
-from huifu_sdk_api import HuifuSDKAPI
+from huifu_daemon import get_api
 
 def main():
     """主函数"""
+    if "--bulk" in sys.argv[1:]:
+        from bulk_query import main as bulk_main
+        bulk_main(sys.argv[1:])
+        return
+    
     print("="*60)
     print(" " * 15 + "订单查询工具")
     print("="*60)
     
     try:
-        api = HuifuSDKAPI()
+        api = get_api()
     except Exception as e:
         print(f"\n❌ 错误: {e}")
         sys.exit(1)
@@ -34,6 +47,7 @@ def main():
     hf_seq_id = None
     party_order_id = None
     req_date = None
+    identifier = None
     
     # 简单的命令行参数解析
     args = sys.argv[1:]
@@ -51,9 +65,23 @@ def main():
         elif args[i] == "--req-date" and i + 1 < len(args):
             req_date = args[i + 1]
             i += 2
+        elif args[i] == "--id" and i + 1 < len(args):
+            identifier = args[i + 1]
+            i += 2
         else:
             i += 1
     
+    # 只提供了一个订单标识：从本地订单库查出其余标识
+    if identifier:
+        order = api.resolve_order(identifier)
+        if order is None:
+            print(f"❌ 本地订单库中没有找到订单: {identifier}")
+            sys.exit(1)
+        req_seq_id = order["req_seq_id"]
+        req_date = order["req_date"]
+        hf_seq_id = order["hf_seq_id"]
+        party_order_id = order["party_order_id"]
+    
     # 如果没有命令行参数，则交互式输入
     if not req_seq_id and not hf_seq_id and not party_order_id:
         print("\n请选择查询方式:")
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+请求限速
+
+TokenBucket：令牌桶，限制每秒请求数（线程安全）。
+令牌不足时先预约再等待，多个线程按到达顺序依次放行，不会同时醒来争抢。
+
+AdaptiveLimiter：AIMD 并发窗口。延迟明显升高或网关限流时窗口按比例缩小（乘性减），
+恢复正常后每完成一个窗口的请求加 1（加性增），吞吐稳定在网关的实际处理能力附近。
+
+RequestLimiter：HuifuSDKAPI 每次发送前经过的限流层，按 (huifu_id, 接口) 各自一个令牌桶和并发窗口；
+在截止时间内拿不到许可时立即抛出 LimitExceeded，而不是排队到超时。
+"""
+
+import threading
+import time
+
+
+class LimitExceeded(Exception):
+    """在截止时间内无法获得发送许可（令牌不足或并发窗口已满）"""
+
+
+class TokenBucket:
+    """令牌桶限速器"""
+
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: 每秒放行的请求数
+        :param burst: 允许的突发请求数（桶容量），默认 max(1, rate)
+        """
+        if rate <= 0:
+            raise ValueError(f"rate 必须大于 0: {rate}")
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self, tokens, max_wait=None):
+        """预约令牌，返回需要等待的秒数；需要等待超过 max_wait 秒时不预约，返回 None"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            remaining = self._tokens - tokens
+            wait = -remaining / self.rate if remaining < 0 else 0.0
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._tokens = remaining
+            return wait
+
+    def acquire(self, tokens=1, timeout=None):
+        """
+        获取令牌，不足时阻塞等待
+
+        :param tokens: 需要的令牌数
+        :param timeout: 最多等待的秒数（None 不限）；需要等待更久时立即抛出 LimitExceeded，不占用令牌
+        :return: 实际等待的秒数
+        """
+        wait = self._reserve(tokens, timeout)
+        if wait is None:
+            raise LimitExceeded(f"令牌不足：{timeout:.3f} 秒内无法获得 {tokens} 个令牌（速率 {self.rate:g}/秒）")
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def release(self, tokens=1):
+        """归还已获取但没有用于发送的令牌（如拿到令牌后等不到并发名额）"""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def try_acquire(self, tokens=1):
+        """
+        获取令牌，不足时不等待（用于限流：超出速率的请求直接拒绝）
+
+        :return: 是否获取成功
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens < tokens:
+                return False
+            self._tokens -= tokens
+            return True
+
+    def set_rate(self, rate):
+        """调整速率（已预约的令牌不受影响）"""
+        if rate <= 0:
+            raise ValueError(f"rate 必须大于 0: {rate}")
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self.rate = float(rate)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD 并发窗口（线程安全）
+
+    - 请求完成后报告耗时和是否被限流
+    - 被限流，或耗时超过基线的 latency_tolerance 倍：窗口乘以 backoff；缩小时已在途的请求
+      之后返回的信号不再计入，避免同一批请求把窗口连续压到底
+    - 否则窗口占满时每完成 limit 个请求加 1（空闲时不增长）
+    - 基线取观察到的低延迟：新样本更低时立即下调，更高时缓慢上调（网络条件变化后能跟上）
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=64, backoff=0.7, latency_tolerance=2.0, min_delay=0.01):
+        """
+        :param initial: 初始并发数
+        :param min_limit: 最小并发数
+        :param max_limit: 最大并发数
+        :param backoff: 乘性减的比例
+        :param latency_tolerance: 耗时超过基线多少倍视为拥塞
+        :param min_delay: 耗时比基线多出不到该秒数时不视为拥塞（基线很低时避免抖动误判）
+        """
+        if not 0 < backoff < 1:
+            raise ValueError(f"backoff 必须在 0-1 之间: {backoff}")
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.min_delay = min_delay
+        self.baseline = None
+        self.in_flight = 0
+        self.throttled = 0
+        self.decreases = 0
+        self._ignore = 0             # 缩小窗口时已在途、之后不计入的请求数
+        self._cond = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """
+        占用一个并发名额，窗口已满时等待
+
+        :param timeout: 最多等待的秒数（None 不限，0 表示不等待）
+        :raises LimitExceeded: 超时仍没有空闲名额
+        """
+        with self._cond:
+            if self.in_flight >= int(self.limit):
+                deadline = None if timeout is None else time.monotonic() + timeout
+                while self.in_flight >= int(self.limit):
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise LimitExceeded(f"并发窗口已满（{self.in_flight}/{int(self.limit)}）")
+                    self._cond.wait(remaining)
+            self.in_flight += 1
+
+    def release(self, latency=None, throttled=False):
+        """
+        释放名额并按结果调整窗口
+
+        :param latency: 请求耗时（秒）；None 表示请求未完成（如连接失败），只释放名额
+        :param throttled: 网关是否返回了限流
+        """
+        with self._cond:
+            self.in_flight -= 1
+            congested = throttled
+            if latency is not None and not throttled:
+                baseline = self.baseline
+                if baseline is None or latency < baseline:
+                    self.baseline = latency
+                else:
+                    congested = latency > max(baseline * self.latency_tolerance, baseline + self.min_delay)
+                    self.baseline = baseline + (latency - baseline) * 0.01
+            if throttled:
+                self.throttled += 1
+            if self._ignore:
+                self._ignore -= 1
+            elif congested:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+                self.decreases += 1
+                self._ignore = self.in_flight
+            elif latency is not None and self.in_flight + 1 >= int(self.limit) and self.limit < self.max_limit:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            # 窗口增大到下一个整数时多出一个名额，多唤醒一个等待者
+            self._cond.notify(2)
+
+
+class _Permit:
+    """RequestLimiter.acquire() 返回的发送许可"""
+
+    __slots__ = ("_window", "_start")
+
+    def __init__(self, window):
+        self._window = window
+        self._start = time.perf_counter()
+
+    def release(self, throttled=False, completed=True):
+        """
+        :param throttled: 网关是否返回了限流
+        :param completed: 是否收到了响应（连接失败等没有可参考的耗时）
+        """
+        if self._window is not None:
+            latency = time.perf_counter() - self._start if completed else None
+            self._window.release(latency, throttled)
+            self._window = None
+
+
+class RequestLimiter:
+    """
+    按 (huifu_id, 接口) 限流：令牌桶（每秒请求数上限）+ AIMD 并发窗口
+
+    使用方法：
+        permit = limiter.acquire(huifu_id, endpoint)     # 可能阻塞，或抛出 LimitExceeded
+        try:
+            response = send()
+        except Exception:
+            permit.release(completed=False)
+            raise
+        permit.release(throttled=limiter.is_throttled(response))
+    """
+
+    def __init__(self, rate=None, rates=None, burst=None, max_concurrency=64, initial_concurrency=4,
+                 timeout=None, throttle_codes=("429",)):
+        """
+        :param rate: 每个 (huifu_id, 接口) 每秒最多发送的请求数（None 不限速）
+        :param rates: 按接口单独设置速率，如 {"scanpay_query": 50}（优先于 rate）
+        :param burst: 令牌桶容量，默认等于速率
+        :param max_concurrency: 每个 (huifu_id, 接口) 的最大并发数（0 不限制并发）
+        :param initial_concurrency: 并发窗口的初始值
+        :param timeout: 获取许可最多等待的秒数（None 一直等待，0 拿不到立即拒绝）
+        :param throttle_codes: 表示限流的响应码（resp_code）
+        """
+        self.rate = rate
+        self.rates = dict(rates or {})
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.initial_concurrency = initial_concurrency
+        self.timeout = timeout
+        self.throttle_codes = frozenset(throttle_codes)
+        self.rejected = 0
+        self._limits = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        limits = self._limits.get(key)
+        if limits is None:
+            with self._lock:
+                limits = self._limits.get(key)
+                if limits is None:
+                    rate = self.rates.get(key[1], self.rate)
+                    bucket = TokenBucket(rate, self.burst) if rate else None
+                    window = (AdaptiveLimiter(self.initial_concurrency, max_limit=self.max_concurrency)
+                              if self.max_concurrency else None)
+                    limits = self._limits[key] = (bucket, window)
+        return limits
+
+    def acquire(self, huifu_id, endpoint, timeout=None):
+        """
+        获取一次发送许可：先等令牌，再等并发名额，两者共用同一个截止时间
+
+        :param timeout: 本次最多等待的秒数，默认使用构造时的 timeout
+        :return: 许可对象，请求结束后调用 permit.release()
+        :raises LimitExceeded: 截止时间内拿不到许可
+        """
+        bucket, window = self._get((huifu_id, endpoint))
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            if bucket is not None:
+                waited = bucket.acquire(timeout=timeout)
+                if timeout is not None:
+                    timeout = max(0.0, timeout - waited)
+            if window is not None:
+                try:
+                    window.acquire(timeout)
+                except LimitExceeded:
+                    # 请求没有发出，令牌还给桶，不占用之后请求的速率
+                    if bucket is not None:
+                        bucket.release()
+                    raise
+        except LimitExceeded:
+            with self._lock:
+                self.rejected += 1
+            raise
+        return _Permit(window)
+
+    def is_throttled(self, response=None, error=None):
+        """响应码或异常（HTTP 429 / 503）是否表示网关限流"""
+        if error is not None:
+            message = str(error)
+            return message.startswith("HTTP 429") or message.startswith("HTTP 503")
+        return response is not None and response.get("resp_code") in self.throttle_codes
+
+    def stats(self):
+        """{(huifu_id, 接口): {"limit": 并发窗口, "in_flight": 在途数, "throttled": 限流次数, "decreases": 缩小次数}}"""
+        result = {}
+        for key, (_, window) in list(self._limits.items()):
+            if window is not None:
+                result[key] = {"limit": round(window.limit, 2), "in_flight": window.in_flight,
+                               "throttled": window.throttled, "decreases": window.decreases}
+        return result
@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+紧凑的订单记录
+
+网关响应是包含几十个字符串字段的字典，但调用方只读其中几个（流水号、日期、状态、金额、响应码）。
+长时间运行的轮询（上万笔订单）或对账（一天的订单）保留原始响应时，内存主要花在这些不用的字段上。
+
+- OrderRecord：__slots__ 记录，只保留常用字段；金额为整数（分），交易状态为 TransStat 枚举；
+  日期、响应码、响应描述等重复值共用同一个字符串对象。
+  保留 get() / [] / keys()，按字典读取的调用方不用修改（trans_stat、trans_amt 仍返回原来的字符串）。
+  原始响应只在 keep_raw=True 时以 JSON 字节保存，访问 record.raw 时才解析。
+- RecordBatch：列式存储（array + 连续字节），每笔订单几十字节，适合对账时一次持有上百万笔。
+
+HuifuSDKAPI(records=True)（或 HUIFU_RECORDS=1）时 aggregate_pay / query_order / refund 返回 OrderRecord。
+
+使用方法：
+    record = OrderRecord.from_response(response)
+    record.stat is TransStat.S, record.amount_cents, record["hf_seq_id"]
+    batch = RecordBatch()
+    batch.append(response)
+    batch.stat_counts(), batch.sum_cents(TransStat.S)
+"""
+
+import enum
+import json
+from array import array
+
+
+class TransStat(enum.IntEnum):
+    """交易状态：P 处理中、S 成功、F 失败、C 关闭；UNKNOWN 表示响应中没有状态（下单失败、退款等）"""
+
+    UNKNOWN = 0
+    P = 1
+    S = 2
+    F = 3
+    C = 4
+
+    @classmethod
+    def of(cls, trans_stat):
+        """响应中的 trans_stat 字符串 → 枚举（无法识别的为 UNKNOWN）"""
+        return _STATS.get(trans_stat, cls.UNKNOWN)
+
+    @property
+    def letter(self):
+        """响应中的写法（UNKNOWN 为空字符串）"""
+        return self.name if self else ""
+
+
+_STATS = {stat.name: stat for stat in TransStat if stat}
+
+# 金额未知（响应中没有金额字段）
+NO_AMOUNT = -1
+
+# 重复值（日期、响应码、响应描述）共用的字符串；不同值超过上限后不再加入
+_SHARED_LIMIT = 4096
+_shared = {}
+
+
+def _share(value):
+    if not value:
+        return ""
+    shared = _shared.get(value)
+    if shared is not None:
+        return shared
+    if len(_shared) < _SHARED_LIMIT:
+        _shared[value] = value
+    return value
+
+
+def to_cents(amount):
+    """金额字符串（元，如 "1.00"、"0.5"）→ 整数分；空值返回 NO_AMOUNT"""
+    if amount in (None, ""):
+        return NO_AMOUNT
+    yuan, _, fen = str(amount).strip().partition(".")
+    negative = yuan.startswith("-")
+    try:
+        cents = abs(int(yuan or "0")) * 100 + int((fen + "00")[:2])
+    except ValueError:
+        return NO_AMOUNT
+    return -cents if negative else cents
+
+
+def format_cents(cents):
+    """整数分 → 金额字符串（元，两位小数）；NO_AMOUNT 返回空字符串"""
+    if cents == NO_AMOUNT:
+        return ""
+    sign = "-" if cents < 0 else ""
+    yuan, fen = divmod(abs(cents), 100)
+    return f"{sign}{yuan}.{fen:02d}"
+
+
+# 字典键 → 读取方式（查询响应的原交易字段与下单响应的字段对应同一个属性）
+_FIELDS = {
+    "req_seq_id": "req_seq_id", "org_req_seq_id": "req_seq_id",
+    "req_date": "req_date", "org_req_date": "req_date",
+    "hf_seq_id": "hf_seq_id", "org_hf_seq_id": "hf_seq_id",
+    "party_order_id": "party_order_id",
+    "resp_code": "resp_code", "resp_desc": "resp_desc", "qr_code": "qr_code",
+    "trans_stat": "trans_stat", "trans_amt": "trans_amt", "ord_amt": "trans_amt",
+}
+
+# keys() 返回的键（与下单响应的字段名一致）
+_KEYS = ("req_seq_id", "req_date", "hf_seq_id", "party_order_id", "resp_code", "resp_desc", "trans_stat", "trans_amt")
+
+
+class OrderRecord:
+    """订单记录（一次下单 / 查询 / 退款的结果）"""
+
+    __slots__ = ("req_seq_id", "req_date", "hf_seq_id", "party_order_id", "resp_code", "resp_desc",
+                 "stat", "amount_cents", "qr_code", "_raw")
+
+    def __init__(self, req_seq_id="", req_date="", hf_seq_id="", party_order_id="", resp_code="", resp_desc="",
+                 stat=TransStat.UNKNOWN, amount_cents=NO_AMOUNT, qr_code=None, raw=None):
+        """
+        :param stat: TransStat
+        :param amount_cents: 金额（分），NO_AMOUNT 表示未知
+        :param qr_code: 二维码链接（只有下单响应有）
+        :param raw: 原始响应的 JSON 字节（可选）
+        """
+        self.req_seq_id = req_seq_id
+        self.req_date = req_date
+        self.hf_seq_id = hf_seq_id
+        self.party_order_id = party_order_id
+        self.resp_code = resp_code
+        self.resp_desc = resp_desc
+        self.stat = stat
+        self.amount_cents = amount_cents
+        self.qr_code = qr_code
+        self._raw = raw
+
+    @classmethod
+    def from_response(cls, response, keep_raw=False):
+        """
+        从网关响应字典创建记录
+
+        :param response: 响应字典（下单、查询、退款均可）
+        :param keep_raw: 是否保留原始响应（JSON 字节，record.raw 访问时解析）
+        """
+        get = response.get
+        return cls(
+            get("req_seq_id") or get("org_req_seq_id") or "",
+            _share(get("req_date") or get("org_req_date")),
+            get("hf_seq_id") or get("org_hf_seq_id") or "",
+            get("party_order_id") or "",
+            _share(get("resp_code")),
+            _share(get("resp_desc")),
+            TransStat.of(get("trans_stat")),
+            to_cents(get("trans_amt") or get("ord_amt")),
+            get("qr_code") or None,
+            json.dumps(response, ensure_ascii=False, separators=(",", ":")).encode("utf-8") if keep_raw else None,
+        )
+
+    @property
+    def trans_stat(self):
+        """交易状态字符串（P / S / F / C，没有状态时为空）"""
+        return self.stat.letter
+
+    @property
+    def trans_amt(self):
+        """金额字符串（元，两位小数）"""
+        return format_cents(self.amount_cents)
+
+    @property
+    def succeeded(self):
+        """请求成功（响应码 0000 开头）"""
+        return self.resp_code.startswith("0000")
+
+    @property
+    def raw(self):
+        """原始响应字典（每次访问时解析；创建时未保留则为 None）"""
+        return json.loads(self._raw) if self._raw is not None else None
+
+    # ------------------------------------------------------------------
+    # 按字典读取（兼容原来使用响应字典的调用方）
+    # ------------------------------------------------------------------
+
+    def get(self, key, default=None):
+        """与 dict.get 相同；常用字段之外的键从原始响应中读取（未保留时返回 default）"""
+        name = _FIELDS.get(key)
+        if name is not None:
+            value = getattr(self, name)
+            return value if value not in (None, "") else default
+        if self._raw is not None:
+            return self.raw.get(key, default)
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def keys(self):
+        """有值的常用字段（dict(record) 得到这些字段）"""
+        return [key for key in _KEYS if self.get(key) is not None] + (["qr_code"] if self.qr_code else [])
+
+    def to_dict(self):
+        """原始响应（保留时）或常用字段组成的字典"""
+        raw = self.raw
+        return raw if raw is not None else {key: self[key] for key in self.keys()}
+
+    def __eq__(self, other):
+        if not isinstance(other, OrderRecord):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return (f"OrderRecord({self.req_seq_id or self.hf_seq_id!r}, {self.resp_code!r}, "
+                f"trans_stat={self.trans_stat!r}, trans_amt={self.trans_amt!r})")
+
+
+_MISSING = object()
+
+
+class _TextColumn:
+    """字符串列：所有值编码后连续存放，offsets 记录每个值的结束位置"""
+
+    __slots__ = ("data", "offsets")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array("Q", [0])
+
+    def append(self, value):
+        self.data += (value or "").encode("utf-8")
+        self.offsets.append(len(self.data))
+
+    def __getitem__(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+
+    def nbytes(self):
+        return len(self.data) + self.offsets.itemsize * len(self.offsets)
+
+
+class _CodeColumn:
+    """重复值很多的字符串列（日期、响应码、响应描述）：保存取值表的下标"""
+
+    __slots__ = ("codes", "values", "_lookup")
+
+    def __init__(self):
+        self.codes = array("I")
+        self.values = []
+        self._lookup = {}
+
+    def append(self, value):
+        value = value or ""
+        code = self._lookup.get(value)
+        if code is None:
+            code = self._lookup[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def __getitem__(self, i):
+        return self.values[self.codes[i]]
+
+    def nbytes(self):
+        return self.codes.itemsize * len(self.codes) + sum(len(v) for v in self.values)
+
+
+class RecordBatch:
+    """
+    列式订单记录（对账等一次持有大量订单的场景）
+
+    只追加；batch[i] 返回 OrderRecord（不含原始响应和二维码）。
+    """
+
+    def __init__(self, records=()):
+        """
+        :param records: 初始内容（响应字典或 OrderRecord 的可迭代对象）
+        """
+        self.req_seq_id = _TextColumn()
+        self.hf_seq_id = _TextColumn()
+        self.party_order_id = _TextColumn()
+        self.req_date = _CodeColumn()
+        self.resp_code = _CodeColumn()
+        self.resp_desc = _CodeColumn()
+        self.stat = array("b")
+        self.amount_cents = array("q")
+        for record in records:
+            self.append(record)
+
+    def append(self, record):
+        """
+        追加一笔订单
+
+        :param record: OrderRecord 或响应字典
+        """
+        if not isinstance(record, OrderRecord):
+            record = OrderRecord.from_response(record)
+        self.req_seq_id.append(record.req_seq_id)
+        self.hf_seq_id.append(record.hf_seq_id)
+        self.party_order_id.append(record.party_order_id)
+        self.req_date.append(record.req_date)
+        self.resp_code.append(record.resp_code)
+        self.resp_desc.append(record.resp_desc)
+        self.stat.append(record.stat)
+        self.amount_cents.append(record.amount_cents)
+
+    def __len__(self):
+        return len(self.stat)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return OrderRecord(self.req_seq_id[i], self.req_date[i], self.hf_seq_id[i], self.party_order_id[i],
+                           self.resp_code[i], self.resp_desc[i], TransStat(self.stat[i]), self.amount_cents[i])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def stat_counts(self):
+        """各交易状态的订单数：{"S": n, "P": n, ...}（没有状态的记为 ""）"""
+        counts = [0] * len(TransStat)
+        for stat in self.stat:
+            counts[stat] += 1
+        return {TransStat(code).letter: n for code, n in enumerate(counts) if n}
+
+    def sum_cents(self, stat=None):
+        """金额合计（分），stat 指定时只统计该状态的订单；金额未知的不计入"""
+        if stat is None:
+            return sum(c for c in self.amount_cents if c != NO_AMOUNT)
+        return sum(c for s, c in zip(self.stat, self.amount_cents) if s == stat and c != NO_AMOUNT)
+
+    def nbytes(self):
+        """各列占用的字节数（估算）"""
+        columns = (self.req_seq_id, self.hf_seq_id, self.party_order_id, self.req_date, self.resp_code, self.resp_desc)
+        return (sum(column.nbytes() for column in columns)
+                + self.stat.itemsize * len(self.stat) + self.amount_cents.itemsize * len(self.amount_cents))
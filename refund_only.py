@@ -7,21 +7,32 @@
 1. 交互式运行：python refund_only.py
 2. 命令行参数：
    python refund_only.py --req-seq-id "xxx" --req-date "20251106" --hf-seq-id "xxx" --refund-amt "1.00"
+3. 只提供一个订单标识（本地订单库中有记录时自动补全原交易信息，见 order_store.py）：
+   python refund_only.py --id "002900TOP1A251106141456P102ac139caf00000"
+4. 批量退款（CSV/JSONL，并发+限速+断点续跑，详见 bulk_refund.py）：
+   python refund_only.py --bulk orders.csv --concurrency 8 --rate 20
+
+本地常驻服务（python huifu_daemon.py）运行时，退款转发给常驻服务执行，不再在本进程内初始化客户端。
 """
 
 import sys
-from huifu_sdk_api import HuifuSDKAPI
+from huifu_daemon import get_api
 
 
 def main():
     """独立退款主函数"""
+    if "--bulk" in sys.argv[1:]:
+        from bulk_refund import main as bulk_main
+        bulk_main(sys.argv[1:])
+        return
+
     print("\n" + "="*60)
     print(" " * 20 + "汇付交易退款工具（SDK版本）")
     print("="*60)
     
     try:
         # 初始化SDK API客户端
-        api = HuifuSDKAPI()
+        api = get_api()
     except Exception as e:
         print(f"\n❌ 错误: {e}")
         sys.exit(1)
@@ -32,6 +43,7 @@ def main():
     org_hf_seq_id = None
     party_order_id = None
     refund_amt = None
+    identifier = None
     
     args = sys.argv[1:]
     i = 0
@@ -51,9 +63,25 @@ def main():
         elif args[i] == "--refund-amt" and i + 1 < len(args):
             refund_amt = args[i + 1]
             i += 2
+        elif args[i] == "--id" and i + 1 < len(args):
+            identifier = args[i + 1]
+            i += 2
         else:
             i += 1
     
+    # 只提供了一个订单标识：从本地订单库查出原交易
+    if identifier:
+        order = api.resolve_order(identifier)
+        if order is None:
+            print(f"❌ 本地订单库中没有找到订单: {identifier}")
+            sys.exit(1)
+        org_req_seq_id = order["req_seq_id"]
+        org_req_date = order["req_date"]
+        org_hf_seq_id = order["hf_seq_id"]
+        party_order_id = order["party_order_id"]
+        refund_amt = refund_amt or order["trans_amt"]
+        print(f"📒 本地订单库: {org_req_seq_id}（金额 {order['trans_amt']} 元，状态 {order['trans_stat'] or '未知'}）")
+    
     # 如果传入了req_seq_id但没有req_date，自动提取日期
     if org_req_seq_id and not org_req_date:
         parts = org_req_seq_id.split("_")
@@ -86,18 +114,18 @@ def main():
             if not org_hf_seq_id:
                 print("❌ 汇付流水号不能为空！")
                 sys.exit(1)
-            org_req_date = input("请输入原交易请求日期 (YYYYMMDD): ").strip()
-            if not org_req_date:
-                print("❌ 请求日期不能为空！")
+            org_req_date = input("请输入原交易请求日期 (YYYYMMDD，本地订单库有记录时可留空): ").strip()
+            if not org_req_date and api.resolve_order(org_hf_seq_id) is None:
+                print("❌ 请求日期不能为空！（本地订单库中没有这笔订单）")
                 sys.exit(1)
         elif choice == "3":
             party_order_id = input("\n请输入商户单号: ").strip()
             if not party_order_id:
                 print("❌ 商户单号不能为空！")
                 sys.exit(1)
-            org_req_date = input("请输入原交易请求日期 (YYYYMMDD): ").strip()
-            if not org_req_date:
-                print("❌ 请求日期不能为空！")
+            org_req_date = input("请输入原交易请求日期 (YYYYMMDD，本地订单库有记录时可留空): ").strip()
+            if not org_req_date and api.resolve_order(party_order_id) is None:
+                print("❌ 请求日期不能为空！（本地订单库中没有这笔订单）")
                 sys.exit(1)
         else:
             print("❌ 无效选项")
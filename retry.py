@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+支付 / 退款的幂等重试
+
+每次发送的结果分为五类：
+- success：响应码 0000 开头，结束
+- final：业务失败（余额不足、参数错误、超额退款等），重发也不会成功，结束
+- retryable：网关明确没有受理（HTTP 429/503、retry_codes 中的响应码），可以直接重发
+- not_sent：请求没有发出（熔断中、等不到发送许可、发送前的订单库记录没有落库），可以直接重发
+- unknown：结果未知（超时、连接中断、HTTP 5xx、响应验签失败），网关可能已经受理；
+  网关以“流水号重复”拒绝重发的请求（duplicate_codes）也归为此类：之前的某次发送已被受理，需查询确认
+
+重发时沿用同一个 req_seq_id / req_date（同一个请求对象），汇付按流水号防重，不会产生第二笔扣款或退款。
+结果未知时，如果提供了 confirm（支付：按流水号查询订单；退款：按退款流水号查询退款），先确认网关是否已受理：
+- 已受理：直接返回查询结果
+- 网关没有这笔交易（not_found_codes 中的响应码）：立即重发
+- 查询也失败（超时、异常、其他响应码）：结果仍未知，退避后再次查询，确认之前不重发；
+  始终无法确认时抛出最后一次发送的异常（流水号重复时抛出 ResultUnknown），由调用方按流水号对账
+
+重试间隔按指数退避（base_delay × 2^n，不超过 max_delay），并加入随机抖动，
+避免大量调用方在网关恢复的同一时刻一起重发。
+
+使用方法：
+    policy = RetryPolicy(attempts=3)
+    response = policy.call(lambda: api._post(request, extend_infos), confirm=confirm_pay)
+"""
+
+import random
+import time
+
+from circuit_breaker import CircuitOpen
+from order_store import OrderStoreError
+from rate_limit import LimitExceeded
+
+SUCCESS = "success"
+FINAL = "final"
+RETRYABLE = "retryable"
+NOT_SENT = "not_sent"
+UNKNOWN = "unknown"
+
+# 重试提示中的原因
+REASONS = {RETRYABLE: "网关未受理", NOT_SENT: "请求未发出", UNKNOWN: "结果未知"}
+
+
+class ResultUnknown(RuntimeError):
+    """网关以流水号重复拒绝，且无法查询确认之前的发送是否已受理（不能按失败处理）"""
+
+
+class RetryPolicy:
+    """重试策略（线程安全：统计计数之外没有可变状态）"""
+
+    def __init__(self, attempts=3, base_delay=0.2, max_delay=5.0, retry_codes=("429",), not_found_codes=("23000001",),
+                 duplicate_codes=("23000004",)):
+        """
+        :param attempts: 最多发送的次数（含第一次），1 表示不重试；结果未知时最多查询确认的次数与之相同
+        :param base_delay: 第一次重试前的等待秒数（之后每次加倍）
+        :param max_delay: 单次等待的上限（秒）
+        :param retry_codes: 表示网关未受理、可以重发的响应码（resp_code）
+        :param not_found_codes: 确认查询中表示网关没有这笔交易的响应码（只有这些响应码允许重发）
+        :param duplicate_codes: 表示请求流水号重复（之前的发送已被受理）的响应码，按结果未知处理并查询确认
+        """
+        if attempts < 1:
+            raise ValueError(f"attempts 必须大于 0: {attempts}")
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_codes = frozenset(retry_codes)
+        self.not_found_codes = frozenset(not_found_codes)
+        self.duplicate_codes = frozenset(duplicate_codes)
+        self.retries = 0      # 重发次数
+        self.confirmed = 0    # 结果未知、经查询确认已受理的次数
+        self.unconfirmed = 0  # 结果未知、查询始终失败而放弃重发的次数
+        self.exhausted = 0    # 最终仍失败的次数（用完重试次数，或结果未知且无法确认）
+        self._random = random.Random()
+
+    def classify(self, response=None, error=None):
+        """
+        一次发送的结果分类
+
+        :param response: 响应字典
+        :param error: 发送时抛出的异常
+        :return: SUCCESS / FINAL / RETRYABLE / NOT_SENT / UNKNOWN
+        """
+        if error is not None:
+            if isinstance(error, (CircuitOpen, LimitExceeded, OrderStoreError)):
+                return NOT_SENT
+            message = str(error)
+            if message.startswith("HTTP 429") or message.startswith("HTTP 503"):
+                return RETRYABLE
+            return UNKNOWN
+        resp_code = (response or {}).get("resp_code", "")
+        if resp_code.startswith("0000"):
+            return SUCCESS
+        if resp_code in self.retry_codes:
+            return RETRYABLE
+        if resp_code in self.duplicate_codes:
+            return UNKNOWN
+        return FINAL
+
+    def backoff(self, attempt):
+        """第 attempt 次发送失败后的等待秒数：指数退避的一半固定、一半随机"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay / 2 + self._random.uniform(0, delay / 2)
+
+    def call(self, send, confirm=None, on_retry=None):
+        """
+        发送，必要时重发
+
+        :param send: 发送函数（无参数，每次调用发送同一个请求），返回响应字典
+        :param confirm: 结果未知时的确认函数（无参数）：网关已受理时返回响应字典，确认没有这笔交易时返回 None，
+                        查询失败（结果仍未知）时抛出异常
+        :param on_retry: 重发前的回调 on_retry(attempt, outcome, detail, delay)
+        :return: 响应字典（成功、业务失败、确认结果，或用完次数后的最后一次响应）
+        :raises: 用完次数或无法确认时最后一次发送的异常
+        """
+        for attempt in range(1, self.attempts + 1):
+            try:
+                response, error = send(), None
+            except Exception as e:
+                response, error = None, e
+            outcome = self.classify(response, error)
+            if outcome in (SUCCESS, FINAL):
+                return response
+
+            delay = self.backoff(attempt)
+            if outcome == UNKNOWN and confirm is not None:
+                known, confirmed = self._confirm(confirm, attempt)
+                if confirmed is not None:
+                    self.confirmed += 1
+                    return confirmed
+                if not known:
+                    # 查询始终失败：网关可能已受理，不能重发
+                    self.unconfirmed += 1
+                    break
+                delay = 0.0
+            if attempt == self.attempts:
+                break
+            self.retries += 1
+            if on_retry is not None:
+                on_retry(attempt, outcome, error if error is not None else response.get("resp_desc", ""), delay)
+            time.sleep(delay)
+
+        self.exhausted += 1
+        return self._give_up(response, error)
+
+    async def call_async(self, send, confirm=None, on_retry=None):
+        """call() 的 asyncio 版本：send / confirm 为协程函数，等待期间不占用线程"""
+        import asyncio
+
+        for attempt in range(1, self.attempts + 1):
+            try:
+                response, error = await send(), None
+            except Exception as e:
+                response, error = None, e
+            outcome = self.classify(response, error)
+            if outcome in (SUCCESS, FINAL):
+                return response
+
+            delay = self.backoff(attempt)
+            if outcome == UNKNOWN and confirm is not None:
+                known, confirmed = await self._confirm_async(confirm, attempt)
+                if confirmed is not None:
+                    self.confirmed += 1
+                    return confirmed
+                if not known:
+                    self.unconfirmed += 1
+                    break
+                delay = 0.0
+            if attempt == self.attempts:
+                break
+            self.retries += 1
+            if on_retry is not None:
+                on_retry(attempt, outcome, error if error is not None else response.get("resp_desc", ""), delay)
+            await asyncio.sleep(delay)
+
+        self.exhausted += 1
+        return self._give_up(response, error)
+
+    def _give_up(self, response, error):
+        """放弃重发：抛出最后一次发送的异常；流水号重复时不能返回拒绝响应（调用方会误以为失败）"""
+        if error is not None:
+            raise error
+        if (response or {}).get("resp_code", "") in self.duplicate_codes:
+            raise ResultUnknown(f"网关提示流水号重复，未能确认之前的发送是否已受理: {response.get('resp_desc', '')}")
+        return response
+
+    def _confirm(self, confirm, attempt):
+        """
+        结果未知时查询确认：每次查询前退避，查询失败（结果仍未知）时退避后再查，最多查到第 attempts 次
+
+        :return: (是否已确认, 网关已受理时的响应字典)
+        """
+        for check in range(attempt, self.attempts + 1):
+            time.sleep(self.backoff(check))
+            try:
+                return True, confirm()
+            except Exception:
+                continue
+        return False, None
+
+    async def _confirm_async(self, confirm, attempt):
+        """_confirm() 的 asyncio 版本"""
+        import asyncio
+
+        for check in range(attempt, self.attempts + 1):
+            await asyncio.sleep(self.backoff(check))
+            try:
+                return True, await confirm()
+            except Exception:
+                continue
+        return False, None
+
+    def stats(self):
+        return {"retries": self.retries, "confirmed": self.confirmed, "unconfirmed": self.unconfirmed,
+                "exhausted": self.exhausted}
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+请求流水号（req_seq_id）生成器
+
+格式（考核要求必须包含用户ID和请求日期）:
+    {USER_ID}_{YYYYMMDD}_{当日毫秒(8位)}{工作节点号(4位)}{序号(6位)}_{前缀}
+    例: 1435964137120268288_20251106_500937120042000017_PAY
+
+唯一性保证:
+- 工作节点号区分不同进程/主机，每个进程通过租约（每个节点号一个锁文件）独占一个节点号：
+  * 同一主机的进程在 HUIFU_WORKER_LEASE_DIR（默认系统临时目录下的 huifu_worker_ids）中领取空闲节点号，
+    进程退出（包括崩溃）时操作系统自动释放锁
+  * 多主机部署时为每台主机配置互不重叠的节点号范围 HUIFU_WORKER_ID=100-199，
+    或为每个进程配置固定的 HUIFU_WORKER_ID=7
+  * 节点号已被其他进程占用、范围内没有空闲节点号时直接报错，不会退而使用可能重复的节点号
+- 同一节点内，时间基准（毫秒）+ 单调递增序号，序号用完（每个基准100万个）后
+  换用新的时间基准；新基准永远大于旧基准，时钟回拨时沿用逻辑时钟继续递增
+- 线程安全：序号由 itertools.count 产生（CPython 中原子），只有切换基准时加锁
+"""
+
+import itertools
+import os
+import socket
+import threading
+import time
+import weakref
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+SEQ_DIGITS = 6
+SEQ_LIMIT = 10 ** SEQ_DIGITS
+WORKER_LIMIT = 10000
+
+
+class WorkerIdUnavailable(RuntimeError):
+    """没有可用的工作节点号（已被其他进程占用，或范围内没有空闲节点号）"""
+
+
+def _worker_range():
+    """HUIFU_WORKER_ID 配置的节点号范围：未配置为 0-9999，"7" 为固定节点号，"100-199" 为范围"""
+    value = os.getenv("HUIFU_WORKER_ID", "").strip()
+    if not value:
+        return 0, WORKER_LIMIT - 1
+    first, _, last = value.partition("-")
+    first = int(first)
+    last = int(last) if last else first
+    if not 0 <= first <= last < WORKER_LIMIT:
+        raise ValueError(f"HUIFU_WORKER_ID 必须是 0-{WORKER_LIMIT - 1} 之间的节点号或范围: {value}")
+    return first, last
+
+
+def _lease_dir():
+    directory = os.getenv("HUIFU_WORKER_LEASE_DIR", "")
+    if not directory:
+        import tempfile
+        directory = os.path.join(tempfile.gettempdir(), "huifu_worker_ids")
+    return directory
+
+
+def _try_lock(fd):
+    """非阻塞地给租约文件加排他锁，已被其他进程持有时返回 False"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _lease(worker_id, directory):
+    """
+    领取一个节点号的租约
+
+    :return: 持有锁的文件描述符（进程存活期间保持打开），已被占用时返回 None
+    """
+    fd = os.open(os.path.join(directory, f"{worker_id:04d}.lock"), os.O_RDWR | os.O_CREAT, 0o666)
+    if not _try_lock(fd):
+        os.close(fd)
+        return None
+    # 记录持有者，便于排查（锁本身才是租约）
+    os.ftruncate(fd, 0)
+    os.write(fd, f"{socket.gethostname()} {os.getpid()}\n".encode('utf-8'))
+    return fd
+
+
+# 当前进程持有的租约：(进程号, 节点号, 文件描述符)；fork 出的子进程进程号不同，会重新领取
+_held = None
+_held_lock = threading.Lock()
+
+
+def default_worker_id():
+    """
+    当前进程的工作节点号（进程内只领取一次）
+
+    在 HUIFU_WORKER_ID 配置的范围内（默认 0-9999）领取一个没有被其他进程占用的节点号。
+
+    :raises WorkerIdUnavailable: 固定节点号已被占用，或范围内没有空闲节点号
+    """
+    global _held
+    pid = os.getpid()
+    with _held_lock:
+        if _held is not None and _held[0] == pid:
+            return _held[1]
+        first, last = _worker_range()
+        directory = _lease_dir()
+        os.makedirs(directory, exist_ok=True)
+        size = last - first + 1
+        # 从进程号对应的位置开始找，同时启动的进程不会都争抢第一个节点号
+        for i in range(size):
+            worker_id = first + (pid + i) % size
+            fd = _lease(worker_id, directory)
+            if fd is not None:
+                _held = (pid, worker_id, fd)
+                return worker_id
+    if size == 1:
+        raise WorkerIdUnavailable(f"HUIFU_WORKER_ID={first} 已被其他进程占用（租约目录: {directory}）")
+    raise WorkerIdUnavailable(f"节点号 {first}-{last} 已全部被占用（租约目录: {directory}），"
+                              f"请扩大 HUIFU_WORKER_ID 范围或减少进程数")
+
+
+class ReqSeqIdGenerator:
+    """请求流水号生成器（线程安全）"""
+
+    def __init__(self, user_id, worker_id=None):
+        """
+        :param user_id: 用户ID（考核要求包含在流水号中）
+        :param worker_id: 工作节点号（0-9999），默认 default_worker_id()（按租约领取）
+        """
+        self._auto_worker = worker_id is None
+        if worker_id is None:
+            worker_id = default_worker_id()
+        if not 0 <= worker_id < WORKER_LIMIT:
+            raise ValueError(f"worker_id 必须在 0-{WORKER_LIMIT - 1} 之间: {worker_id}")
+        self.user_id = user_id
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._last_base = 0      # 上一个时间基准（epoch毫秒）
+        # (流水号前缀, 序号计数器, 基准失效时间戳[次日零点])
+        self._state = self._new_state()
+        _generators.add(self)
+
+    def _new_state(self):
+        """切换到新的时间基准（调用方持有锁或处于初始化阶段）"""
+        now_ms = int(time.time() * 1000)
+        if now_ms <= self._last_base:
+            # 同一毫秒内序号用完，或发生了时钟回拨：沿用逻辑时钟继续递增，保证基准单调
+            base = self._last_base + 1
+        else:
+            base = now_ms
+        self._last_base = base
+
+        local = time.localtime(base // 1000)
+        ms_of_day = ((local.tm_hour * 60 + local.tm_min) * 60 + local.tm_sec) * 1000 + base % 1000
+        date_str = time.strftime("%Y%m%d", local)
+        next_midnight = time.mktime((local.tm_year, local.tm_mon, local.tm_mday + 1, 0, 0, 0, 0, 0, -1))
+
+        head = f"{self.user_id}_{date_str}_{ms_of_day:08d}{self.worker_id:04d}"
+        return head, itertools.count(), next_midnight
+
+    def next_id(self, prefix="PAY"):
+        """
+        生成一个请求流水号
+
+        :param prefix: 流水号后缀（PAY / REFUND 等）
+        :return: req_seq_id
+        """
+        state = self._state
+        head, counter, expires = state
+        n = next(counter)
+        if n < SEQ_LIMIT and time.time() < expires:
+            return f"{head}{n:06d}_{prefix}"
+        self._rotate(state)
+        return self.next_id(prefix)
+
+    __call__ = next_id
+
+    def next_ids(self, count, prefix="PAY"):
+        """
+        批量生成请求流水号（批量退款/压测等场景，比逐个调用更快）
+
+        每批独占一个新的时间基准，不与 next_id 共用序号，因此无需逐个加锁；
+        适合一次领取大量流水号，不要用来代替单个调用。
+
+        :param count: 数量
+        :param prefix: 流水号后缀
+        :return: req_seq_id 列表
+        """
+        ids = []
+        while len(ids) < count:
+            with self._lock:
+                head, _, _ = self._new_state()
+            take = min(count - len(ids), SEQ_LIMIT)
+            ids.extend([f"{head}{n:06d}_{prefix}" for n in range(take)])
+        return ids
+
+    def _rotate(self, state):
+        """序号用完或跨天时切换时间基准"""
+        with self._lock:
+            # 其他线程可能已经切换过基准
+            if self._state is state:
+                self._state = self._new_state()
+
+    def reset_after_fork(self, worker_id=None):
+        """
+        fork 后在子进程中调用：换用新的工作节点号并重新取时间基准
+
+        :param worker_id: 子进程的工作节点号，默认重新领取
+        """
+        self.worker_id = default_worker_id() if worker_id is None else worker_id
+        self._lock = threading.Lock()
+        self._state = self._new_state()
+
+
+# 自动领取节点号的生成器在 fork 出的子进程中重新领取，避免父子进程重号
+_generators = weakref.WeakSet()
+
+
+def _after_fork_in_child():
+    global _held, _held_lock
+    # 父进程的租约留给父进程：关闭继承来的描述符（不影响父进程持有的锁），子进程重新领取
+    _held_lock = threading.Lock()
+    if _held is not None:
+        os.close(_held[2])
+        _held = None
+    for generator in list(_generators):
+        if generator._auto_worker:
+            generator.reset_after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def get_generator(user_id):
+    """
+    按用户ID获取进程内共享的生成器
+
+    同一用户ID、同一节点号的两个生成器可能在同一毫秒取到相同的时间基准而重号，
+    同一进程内的多个客户端（如多商户）应共用一个生成器。
+    """
+    generator = _shared.get(user_id)
+    if generator is None:
+        with _shared_lock:
+            generator = _shared.get(user_id)
+            if generator is None:
+                generator = ReqSeqIdGenerator(user_id)
+                _shared[user_id] = generator
+    return generator
+
+
+def req_date_of(req_seq_id):
+    """从请求流水号中提取请求日期（格式：user_id_YYYYMMDD_xxx）"""
+    parts = req_seq_id.split("_")
+    return parts[1] if len(parts) >= 2 else None
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+并发请求合并（single flight）
+
+同一时刻对同一个键的多次调用只执行一次，其余调用方等待并共享这次的结果（或异常）。
+调用结束后键即释放，之后的调用会重新执行（结果复用交给 query_cache）。
+
+- SingleFlight：多线程版本，等待方阻塞在 threading.Event 上
+- AsyncSingleFlight：asyncio 版本，等待方挂起在同一个 Future 上，不占用线程
+
+使用方法：
+    flights = SingleFlight()
+    response = flights.do(hf_seq_id, send_query)
+"""
+
+import copy
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """多线程请求合并（线程安全）"""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.executed = 0   # 实际执行次数
+        self.shared = 0     # 共享了他人结果的调用次数
+
+    def do(self, key, func, *args, **kwargs):
+        """
+        执行 func(*args, **kwargs)；同一键已有调用在执行时等待其结果
+
+        :param key: 合并键（None 表示不合并）
+        :return: func 的返回值（等待方拿到的字典结果为副本）
+        """
+        if key is None:
+            return func(*args, **kwargs)
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self.executed += 1
+            else:
+                leader = False
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise _clone_error(call.error)
+            return _copy(call.result)
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self):
+        """正在执行的键数"""
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """asyncio 请求合并（只在同一个事件循环内使用）"""
+
+    def __init__(self):
+        self._calls = {}
+        self.executed = 0
+        self.shared = 0
+
+    async def do(self, key, func, *args, **kwargs):
+        """
+        await func(*args, **kwargs)；同一键已有调用在执行时等待其结果
+
+        :param key: 合并键（None 表示不合并）
+        :param func: 协程函数
+        """
+        import asyncio   # 同步客户端用不到，导入较慢，首次调用时才导入
+
+        if key is None:
+            return await func(*args, **kwargs)
+        future = self._calls.get(key)
+        if future is not None:
+            self.shared += 1
+            try:
+                # shield：某个等待方被取消时不影响执行中的请求和其他等待方
+                return _copy(await asyncio.shield(future))
+            except asyncio.CancelledError:
+                raise
+            except BaseException as e:
+                raise _clone_error(e) from None
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.executed += 1
+        try:
+            result = await func(*args, **kwargs)
+        except BaseException as e:
+            if not future.cancelled():
+                future.set_exception(e)
+                future.exception()   # 没有等待方时不报 "exception was never retrieved"
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+
+def _clone_error(error):
+    """
+    等待方抛出异常的副本（类型、参数相同）：多个线程同时抛出同一个异常对象时，
+    各自的调用栈会不断追加到同一个 __traceback__ 上
+    """
+    try:
+        clone = copy.copy(error)
+    except Exception:
+        return error
+    clone.__traceback__ = None
+    clone.__cause__ = error.__cause__
+    return clone
+
+
+def _copy(result):
+    """等待方拿到字典副本，调用方修改结果互不影响"""
+    return dict(result) if isinstance(result, dict) else result
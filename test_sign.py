@@ -9,59 +9,25 @@
 
 from config import PRIVATE_KEY, HUIFU_PUBLIC_KEY
 from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.asymmetric import padding
-import base64
+from key_registry import load_private_key, load_public_key, rsa_sign, rsa_verify
 
 
 def sign_data(data: str, private_key_pem: str) -> str:
-    """使用私钥签名数据"""
+    """使用私钥签名数据（私钥对象按PEM缓存，不会重复解析）"""
+    private_key = load_private_key(private_key_pem)
     try:
-        private_key = serialization.load_pem_private_key(
-            private_key_pem.encode('utf-8'),
-            password=None,
-            backend=default_backend()
-        )
-        
-        signature = private_key.sign(
-            data.encode('utf-8'),
-            padding.PKCS1v15(),
-            hashes.SHA256()
-        )
-        
-        return base64.b64encode(signature).decode('utf-8')
-    except ValueError as e:
-        error_msg = str(e)
-        if "Could not deserialize key data" in error_msg or "unsupported" in error_msg.lower():
-            raise ValueError("私钥格式错误：无法解析私钥数据。请检查密钥格式是否正确。") from e
-        elif "password" in error_msg.lower():
-            raise ValueError("私钥可能需要密码，但当前不支持密码保护的私钥。") from e
-        else:
-            raise ValueError(f"私钥解析失败：{error_msg}") from e
+        return rsa_sign(private_key, data)
     except Exception as e:
         raise ValueError(f"签名失败：{str(e)}") from e
 
 
 def verify_signature(data: str, signature: str, public_key_pem: str) -> bool:
-    """使用公钥验证签名"""
+    """使用公钥验证签名（公钥对象按PEM缓存，不会重复解析）"""
     try:
-        public_key = serialization.load_pem_public_key(
-            public_key_pem.encode('utf-8'),
-            backend=default_backend()
-        )
-        
-        signature_bytes = base64.b64decode(signature)
-        
-        public_key.verify(
-            signature_bytes,
-            data.encode('utf-8'),
-            padding.PKCS1v15(),
-            hashes.SHA256()
-        )
-        return True
+        public_key = load_public_key(public_key_pem)
     except Exception:
         return False
+    return rsa_verify(public_key, data, signature)
 
 
 def test_sign():
@@ -139,12 +105,8 @@ def test_sign():
             print("\n从您的私钥中提取公钥进行自验证...")
             
             try:
-                # 加载私钥
-                private_key = serialization.load_pem_private_key(
-                    PRIVATE_KEY.encode('utf-8'),
-                    password=None,
-                    backend=default_backend()
-                )
+                # 加载私钥（复用签名时已解析的私钥对象）
+                private_key = load_private_key(PRIVATE_KEY)
                 
                 # 从私钥提取公钥
                 public_key = private_key.public_key()